@@ -27,6 +27,66 @@ MAX_CHANNELS_PER_BOT = int(os.getenv('MAX_CHANNELS_PER_BOT', '10'))
 WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '89.223.125.102')
 WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
 
+# Шардирование рабочих ботов по процессам (0 - все боты в основном процессе)
+WORKER_SHARDS = int(os.getenv('WORKER_SHARDS', '0'))
+SHARD_SOCKET_DIR = os.getenv('SHARD_SOCKET_DIR', '/tmp/subscription_bot')
+
+# Спящий режим простаивающих рабочих ботов (секунды, 0 - отключен)
+WORKER_IDLE_TIMEOUT = int(os.getenv('WORKER_IDLE_TIMEOUT', '3600'))
+WORKER_DORMANT_POLL_INTERVAL = int(os.getenv('WORKER_DORMANT_POLL_INTERVAL', '60'))
+
+# Как часто фоновая задача перепроверяет токены ботов через getMe (часы, 0 - отключено)
+TOKEN_REVALIDATE_HOURS = int(os.getenv('TOKEN_REVALIDATE_HOURS', '24'))
+
+# Polling без ответа getUpdates дольше этого считается зависшим и перезапускается (секунды, 0 - отключено)
+WORKER_STALL_TIMEOUT = int(os.getenv('WORKER_STALL_TIMEOUT', '180'))
+
+# Общий HTTP-пул к api.telegram.org для всех ботов процесса.
+# Каждый бот в long polling держит одно соединение, поэтому лимит
+# должен быть больше числа одновременно опрашивающих ботов (0 - без лимита)
+TELEGRAM_HTTP_LIMIT = int(os.getenv('TELEGRAM_HTTP_LIMIT', '1000'))
+TELEGRAM_HTTP_KEEPALIVE = float(os.getenv('TELEGRAM_HTTP_KEEPALIVE', '60'))
+TELEGRAM_DNS_CACHE_TTL = int(os.getenv('TELEGRAM_DNS_CACHE_TTL', '300'))
+
+# Ограничение обработки апдейтов одного рабочего бота:
+# размер очереди (лишние апдейты сбрасываются с ответом «повторите позже»)
+# и число одновременно работающих обработчиков
+WORKER_UPDATE_QUEUE_SIZE = int(os.getenv('WORKER_UPDATE_QUEUE_SIZE', '100'))
+WORKER_HANDLER_CONCURRENCY = int(os.getenv('WORKER_HANDLER_CONCURRENCY', '8'))
+# Сколько секунд при остановке бота ждать завершения работающих обработчиков
+WORKER_DRAIN_TIMEOUT = float(os.getenv('WORKER_DRAIN_TIMEOUT', '10'))
+
+# Ограничение частоты апдейтов от одного пользователя бота:
+# апдейтов в секунду (0 - отключено) и допустимая пачка подряд
+WORKER_THROTTLE_RATE = float(os.getenv('WORKER_THROTTLE_RATE', '0.5'))
+WORKER_THROTTLE_BURST = int(os.getenv('WORKER_THROTTLE_BURST', '4'))
+
+# Бюджет исходящих сообщений одного бота (лимит Telegram ~30 в секунду):
+# сообщений в секунду (0 - без ограничения) и сколько из них фоновые рассылки
+# (напоминания) оставляют под ответы пользователям
+WORKER_SEND_RATE = float(os.getenv('WORKER_SEND_RATE', '25'))
+WORKER_SEND_RESERVE = int(os.getenv('WORKER_SEND_RESERVE', '5'))
+
+# Как часто (секунды) рабочий бот сверяет версию своих настроек с БД
+WORKER_CONFIG_CHECK_INTERVAL = float(os.getenv('WORKER_CONFIG_CHECK_INTERVAL', '10'))
+
+# Загружать изображение бота в Telegram при запуске бота (1 - включено), а не при
+# первом /start. file_id можно получить только отправкой, поэтому при каждом запуске
+# бота без закэшированного file_id фото отправляется владельцу без звука и удаляется
+WORKER_PREWARM_IMAGES = int(os.getenv('WORKER_PREWARM_IMAGES', '0'))
+
+# Изображения ботов при загрузке: лимит исходного файла (байты), большая сторона после
+# уменьшения (пиксели), целевой размер файла (байты) и формат (JPEG или WEBP);
+# сохранять ли исходник (1 - да)
+BOT_IMAGE_MAX_INPUT_BYTES = int(os.getenv('BOT_IMAGE_MAX_INPUT_BYTES', str(10 * 1024 * 1024)))
+BOT_IMAGE_MAX_SIDE = int(os.getenv('BOT_IMAGE_MAX_SIDE', '1280'))
+BOT_IMAGE_TARGET_BYTES = int(os.getenv('BOT_IMAGE_TARGET_BYTES', str(300 * 1024)))
+BOT_IMAGE_FORMAT = os.getenv('BOT_IMAGE_FORMAT', 'JPEG').upper()
+BOT_IMAGE_KEEP_ORIGINAL = int(os.getenv('BOT_IMAGE_KEEP_ORIGINAL', '0'))
+
+# Как часто (часы) удаляются изображения, на которые не ссылается ни один бот (0 - отключено)
+MEDIA_GC_INTERVAL_HOURS = int(os.getenv('MEDIA_GC_INTERVAL_HOURS', '6'))
+
 # Валидация обязательных переменных
 if not BOT_TOKEN:
     raise ValueError("❌ BOT_TOKEN не установлен в .env файле")
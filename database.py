@@ -1,10 +1,20 @@
 # database.py
 import aiosqlite
 import logging
+import sqlite3
+from contextlib import closing
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+async def _ensure_column(db, table: str, column: str, definition: str):
+    """Добавляет колонку в существующую таблицу, если ее еще нет (миграция старых БД)"""
+    cursor = await db.execute(f'PRAGMA table_info({table})')
+    columns = [row[1] for row in await cursor.fetchall()]
+    if column not in columns:
+        await db.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        logger.info(f"🔧 В таблицу {table} добавлена колонка {column}")
+
 async def init_db():
     """Инициализация базы данных"""
     try:
@@ -39,9 +49,17 @@ async def init_db():
                     image_filename TEXT DEFAULT '',
                     material_sent_at TIMESTAMP,  -- НОВОЕ ПОЛЕ: дата рассылки материала
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    bot_telegram_id INTEGER,  -- Telegram ID бота (из getMe при добавлении)
+                    token_validated_at TIMESTAMP,  -- последняя успешная проверка токена
                     FOREIGN KEY (user_id) REFERENCES users (id)
                 )
             ''')
+            await _ensure_column(db, 'bots', 'bot_telegram_id', 'INTEGER')
+            await _ensure_column(db, 'bots', 'token_validated_at', 'TIMESTAMP')
+            await _ensure_column(db, 'bots', 'reminder_policy', 'TEXT')  # JSON, см. worker_bot/reminder_policy.py
+            await _ensure_column(db, 'bots', 'config_version', 'INTEGER DEFAULT 0')
+            # file_unique_id файла владельца - ключ кэша file_id в рабочих ботах (см. worker_bot/media_cache.py)
+            await _ensure_column(db, 'bots', 'file_unique_id', "TEXT DEFAULT ''")
 
             # Таблица платежей
             await db.execute('''
@@ -73,6 +91,140 @@ async def init_db():
                 )
             ''')
 
+            # Таблица напоминаний неподписавшимся пользователям
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS reminders (
+                    bot_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    due_at REAL NOT NULL,  -- unix-время следующей отправки
+                    last_message_id INTEGER,  -- сообщение, которое удалим при следующей отправке
+                    attempt INTEGER DEFAULT 0,  -- сколько напоминаний уже отправлено
+                    PRIMARY KEY (bot_id, user_id),
+                    FOREIGN KEY (bot_id) REFERENCES bots (id)
+                )
+            ''')
+            await db.execute('CREATE INDEX IF NOT EXISTS idx_reminders_due_at ON reminders (due_at)')
+
+            # Апдейты, подтвержденные в Telegram до того, как их успели обработать
+            # (см. worker_bot/polling.py) - обрабатываются при следующем запуске бота
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS pending_updates (
+                    bot_id INTEGER NOT NULL,
+                    update_id INTEGER NOT NULL,
+                    payload TEXT NOT NULL,  -- JSON апдейта
+                    PRIMARY KEY (bot_id, update_id),
+                    FOREIGN KEY (bot_id) REFERENCES bots (id)
+                )
+            ''')
+
+            # Таблица пользователей, заблокировавших рабочих ботов
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS blocked_users (
+                    bot_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    blocked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (bot_id, user_id),
+                    FOREIGN KEY (bot_id) REFERENCES bots (id)
+                )
+            ''')
+
+            # Очередь отправки материалов подписавшимся пользователям
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS material_deliveries (
+                    bot_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    due_at REAL NOT NULL,  -- time.time() отправки
+                    status TEXT DEFAULT 'pending',  -- pending, sent, not_subscribed, dead, cancelled
+                    attempts INTEGER DEFAULT 0,
+                    release TEXT,  -- bots.material_sent_at, для которой поставлена отправка
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (bot_id, user_id),
+                    FOREIGN KEY (bot_id) REFERENCES bots (id)
+                )
+            ''')
+            await _ensure_column(db, 'material_deliveries', 'release', 'TEXT')
+            await db.execute('CREATE INDEX IF NOT EXISTS idx_material_deliveries_status_due ON material_deliveries (status, due_at)')
+
+            # Попытки отправки материалов с классом итога
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS delivery_attempts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    bot_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    attempt INTEGER NOT NULL,
+                    outcome TEXT NOT NULL,  -- sent, forbidden, not_subscribed, bad_request, transient_error
+                    error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (bot_id) REFERENCES bots (id)
+                )
+            ''')
+            await db.execute('CREATE INDEX IF NOT EXISTS idx_delivery_attempts_bot_created ON delivery_attempts (bot_id, created_at)')
+
+            # Материалы, которые не удалось доставить окончательно
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS material_dead_letters (
+                    bot_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    outcome TEXT NOT NULL,
+                    error TEXT,
+                    attempts INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (bot_id, user_id),
+                    FOREIGN KEY (bot_id) REFERENCES bots (id)
+                )
+            ''')
+
+            # file_id медиа владельца в рабочих ботах (file_id привязан к боту)
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS media_cache (
+                    bot_id INTEGER NOT NULL,
+                    media_hash TEXT NOT NULL,
+                    file_id TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (bot_id, media_hash),
+                    FOREIGN KEY (bot_id) REFERENCES bots (id)
+                )
+            ''')
+
+            # Рассылки материалов: одна на (бот, дата рассылки), с контрольными точками
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS material_broadcasts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    bot_id INTEGER NOT NULL,
+                    release TEXT NOT NULL,  -- material_sent_at бота на момент рассылки
+                    status TEXT DEFAULT 'running',  -- running, done
+                    sent INTEGER DEFAULT 0,
+                    skipped INTEGER DEFAULT 0,
+                    failed INTEGER DEFAULT 0,
+                    report_message_id INTEGER,  -- сообщение владельцу с ходом рассылки
+                    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    finished_at TIMESTAMP,
+                    UNIQUE (bot_id, release),
+                    FOREIGN KEY (bot_id) REFERENCES bots (id)
+                )
+            ''')
+
+            # Версия настроек бота растет при любом изменении того, что видят пользователи
+            # рабочего бота (текст, медиа, каналы) - по ней рабочие боты сбрасывают кэш
+            await db.execute('''
+                CREATE TRIGGER IF NOT EXISTS trg_bots_config_version
+                AFTER UPDATE OF message, button_url, file_id, file_type, image_filename,
+                                material_sent_at, is_active, reminder_policy ON bots
+                BEGIN
+                    UPDATE bots SET config_version = config_version + 1 WHERE id = NEW.id;
+                END
+            ''')
+            for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+                await db.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_channels_{event.lower()}_config_version
+                    AFTER {event} ON channels
+                    BEGIN
+                        UPDATE bots SET config_version = config_version + 1 WHERE id = {row}.bot_id;
+                    END
+                ''')
+
             await db.commit()
             logger.info("✅ База данных инициализирована")
             
@@ -150,7 +302,8 @@ async def update_user_bot_limit(telegram_id: int, new_limit: int):
 
 # ===== БОТЫ =====
 
-async def add_bot_to_db(bot_token: str, bot_username: str, bot_name: str, telegram_id: int, message: str = ""):
+async def add_bot_to_db(bot_token: str, bot_username: str, bot_name: str, telegram_id: int, message: str = "",
+                        bot_telegram_id: int = None):
     """Добавление бота в базу данных"""
     async with aiosqlite.connect('subscription_bot.db') as db:
         cursor = await db.execute("SELECT id FROM users WHERE telegram_id = ?", (telegram_id,))
@@ -170,9 +323,11 @@ async def add_bot_to_db(bot_token: str, bot_username: str, bot_name: str, telegr
             logging.warning(f"⚠️ Бот с токеном уже существует (ID: {existing_bot[0]})")
             return existing_bot[0]
         
+        # Токен только что проверен через getMe
         cursor = await db.execute(
-            'INSERT INTO bots (bot_token, bot_username, bot_name, user_id, message) VALUES (?, ?, ?, ?, ?)',
-            (bot_token, bot_username, bot_name, user_db_id, message)
+            '''INSERT INTO bots (bot_token, bot_username, bot_name, user_id, message, bot_telegram_id, token_validated_at)
+               VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)''',
+            (bot_token, bot_username, bot_name, user_db_id, message, bot_telegram_id)
         )
         await db.commit()
         
@@ -266,6 +421,44 @@ async def get_all_active_bots():
         bots = await cursor.fetchall()
         return bots
 
+async def get_bot_identity(bot_id: int):
+    """Сохраненные Telegram ID и username бота: (bot_telegram_id, bot_username) или None"""
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        cursor = await db.execute('SELECT bot_telegram_id, bot_username FROM bots WHERE id = ?', (bot_id,))
+        return await cursor.fetchone()
+
+async def update_bot_identity(bot_id: int, bot_telegram_id: int, bot_username: str, bot_name: str):
+    """Обновление данных бота из getMe и отметка об успешной проверке токена"""
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        await db.execute('''
+            UPDATE bots
+            SET bot_telegram_id = ?, bot_username = ?, bot_name = ?, token_validated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (bot_telegram_id, bot_username, bot_name, bot_id))
+        await db.commit()
+
+async def get_bot_config_version(bot_id: int):
+    """Версия настроек активного бота (None - бот не найден или выключен)"""
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        cursor = await db.execute(
+            'SELECT config_version FROM bots WHERE id = ? AND is_active = TRUE', (bot_id,)
+        )
+        row = await cursor.fetchone()
+        return row[0] if row else None
+
+async def get_bots_for_token_validation(max_age_hours: int, limit: int = 100):
+    """Активные боты, чей токен не проверялся дольше max_age_hours (самые давние первыми)"""
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        cursor = await db.execute('''
+            SELECT id, bot_token, bot_username
+            FROM bots
+            WHERE is_active = TRUE
+              AND (token_validated_at IS NULL OR token_validated_at < datetime('now', ?))
+            ORDER BY token_validated_at IS NOT NULL, token_validated_at
+            LIMIT ?
+        ''', (f'-{max_age_hours} hours', limit))
+        return await cursor.fetchall()
+
 async def toggle_bot_status(bot_id: int, telegram_id: int, is_active: bool):
     """Включение/выключение бота"""
     async with aiosqlite.connect('subscription_bot.db') as db:
@@ -277,13 +470,34 @@ async def toggle_bot_status(bot_id: int, telegram_id: int, is_active: bool):
         await db.commit()
         logging.info(f"🔄 Статус бота {bot_id} изменен: {'активен' if is_active else 'неактивен'}")
 
+async def deactivate_bot(bot_id: int):
+    """Выключение бота системой (например, токен отозван в BotFather)"""
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        await db.execute('UPDATE bots SET is_active = FALSE WHERE id = ?', (bot_id,))
+        await db.commit()
+        logging.info(f"🔄 Бот {bot_id} выключен системой")
+
 async def delete_bot(bot_id: int, telegram_id: int):
     """Удаление бота"""
     async with aiosqlite.connect('subscription_bot.db') as db:
-        await db.execute('''
+        cursor = await db.execute('SELECT image_filename FROM bots WHERE id = ?', (bot_id,))
+        result = await cursor.fetchone()
+        image_filename = result[0] if result else None
+        
+        cursor = await db.execute('''
             DELETE FROM bots 
             WHERE id = ? AND user_id = (SELECT id FROM users WHERE telegram_id = ?)
         ''', (bot_id, telegram_id))
+        if cursor.rowcount:
+            await db.execute('DELETE FROM reminders WHERE bot_id = ?', (bot_id,))
+            await db.execute('DELETE FROM pending_updates WHERE bot_id = ?', (bot_id,))
+            await db.execute('DELETE FROM blocked_users WHERE bot_id = ?', (bot_id,))
+            await db.execute('DELETE FROM material_deliveries WHERE bot_id = ?', (bot_id,))
+            await db.execute('DELETE FROM material_broadcasts WHERE bot_id = ?', (bot_id,))
+            await db.execute('DELETE FROM delivery_attempts WHERE bot_id = ?', (bot_id,))
+            await db.execute('DELETE FROM material_dead_letters WHERE bot_id = ?', (bot_id,))
+            await db.execute('DELETE FROM media_cache WHERE bot_id = ?', (bot_id,))
+            await _release_bot_image(db, bot_id, image_filename)
         await db.commit()
         logging.info(f"🗑️ Бот {bot_id} удален")
 
@@ -329,14 +543,14 @@ async def remove_bot_button_url(bot_id: int, telegram_id: int):
         await db.commit()
         logging.info(f"🔘 Кнопка бота {bot_id} удалена")
 
-async def update_bot_file(bot_id: int, telegram_id: int, file_id: str, file_type: str):
+async def update_bot_file(bot_id: int, telegram_id: int, file_id: str, file_type: str, file_unique_id: str = ""):
     """Обновление файла бота"""
     async with aiosqlite.connect('subscription_bot.db') as db:
         await db.execute('''
             UPDATE bots 
-            SET file_id = ?, file_type = ? 
+            SET file_id = ?, file_type = ?, file_unique_id = ? 
             WHERE id = ? AND user_id = (SELECT id FROM users WHERE telegram_id = ?)
-        ''', (file_id, file_type, bot_id, telegram_id))
+        ''', (file_id, file_type, file_unique_id, bot_id, telegram_id))
         await db.commit()
         logging.info(f"📎 Файл бота {bot_id} обновлен (тип: {file_type})")
 
@@ -345,12 +559,21 @@ async def remove_bot_file(bot_id: int, telegram_id: int):
     async with aiosqlite.connect('subscription_bot.db') as db:
         await db.execute('''
             UPDATE bots 
-            SET file_id = '', file_type = '' 
+            SET file_id = '', file_type = '', file_unique_id = '' 
             WHERE id = ? AND user_id = (SELECT id FROM users WHERE telegram_id = ?)
         ''', (bot_id, telegram_id))
         await db.commit()
         logging.info(f"📎 Файл бота {bot_id} удален")
 
+async def get_file_unique_id(file_id: str):
+    """file_unique_id файла владельца по file_id основного бота (None - не сохранен)"""
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        cursor = await db.execute(
+            "SELECT file_unique_id FROM bots WHERE file_id = ? AND file_unique_id != '' LIMIT 1", (file_id,)
+        )
+        row = await cursor.fetchone()
+        return row[0] if row else None
+
 # картинка для бота
 
 async def update_bot_image(bot_id: int, telegram_id: int, filename: str):
@@ -366,12 +589,18 @@ async def update_bot_image(bot_id: int, telegram_id: int, filename: str):
         if not bot:
             raise Exception("Бот не найден или нет прав доступа")
         
+        cursor = await db.execute('SELECT image_filename FROM bots WHERE id = ?', (bot_id,))
+        result = await cursor.fetchone()
+        old_filename = result[0] if result else None
+        
         # Обновляем имя файла изображения
         await db.execute(
             "UPDATE bots SET image_filename = ? WHERE id = ?",
             (filename, bot_id)
         )
         await db.commit()
+        if old_filename != filename:
+            await _release_bot_image(db, bot_id, old_filename)
         logging.info(f"🖼️ Изображение бота {bot_id} обновлено: {filename}")
 
 async def remove_bot_image(bot_id: int, telegram_id: int):
@@ -399,13 +628,27 @@ async def remove_bot_image(bot_id: int, telegram_id: int):
         )
         await db.commit()
         
-        # Удаляем физический файл
-        if filename:
-            from main_bot.file_utils import delete_bot_image
-            delete_bot_image(bot_id, filename)
+        # Удаляем физический файл (если он больше ни у кого не используется)
+        await _release_bot_image(db, bot_id, filename)
         
         logging.info(f"🖼️ Изображение бота {bot_id} удалено")
 
+async def _release_bot_image(db, bot_id: int, filename: str):
+    """Удаляет файл изображения, если на него не ссылается ни один бот"""
+    if not filename:
+        return
+    cursor = await db.execute('SELECT COUNT(*) FROM bots WHERE image_filename = ?', (filename,))
+    if (await cursor.fetchone())[0]:
+        return
+    from main_bot.file_utils import delete_bot_image
+    await delete_bot_image(bot_id, filename)
+
+async def get_bot_image_filenames():
+    """Изображения всех ботов: {bot_id: image_filename} (для сборки мусора медиа)"""
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        cursor = await db.execute('SELECT id, image_filename FROM bots')
+        return {bot_id: filename for bot_id, filename in await cursor.fetchall()}
+
 async def get_bot_image_filename(bot_id: int):
     """Получение имени файла изображения бота"""
     async with aiosqlite.connect('subscription_bot.db') as db:
@@ -413,6 +656,35 @@ async def get_bot_image_filename(bot_id: int):
         result = await cursor.fetchone()
         return result[0] if result and result[0] else None
 
+# ===== КЭШ МЕДИА РАБОЧИХ БОТОВ =====
+
+async def get_media_cache_file_id(bot_id: int, media_hash: str):
+    """file_id медиа в рабочем боте"""
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        cursor = await db.execute(
+            'SELECT file_id FROM media_cache WHERE bot_id = ? AND media_hash = ?', (bot_id, media_hash)
+        )
+        row = await cursor.fetchone()
+        return row[0] if row else None
+
+async def save_media_cache_file_id(bot_id: int, media_hash: str, file_id: str):
+    """Сохраняет file_id медиа в рабочем боте"""
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        await db.execute('''
+            INSERT INTO media_cache (bot_id, media_hash, file_id) VALUES (?, ?, ?)
+            ON CONFLICT (bot_id, media_hash) DO UPDATE SET file_id = excluded.file_id
+        ''', (bot_id, media_hash, file_id))
+        await db.commit()
+
+async def delete_media_cache_file_id(bot_id: int, media_hash: str, file_id: str):
+    """Удаляет file_id медиа в рабочем боте (если его еще не заменил новый)"""
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        await db.execute(
+            'DELETE FROM media_cache WHERE bot_id = ? AND media_hash = ? AND file_id = ?',
+            (bot_id, media_hash, file_id)
+        )
+        await db.commit()
+
 # ===== ДАТА РАССЫЛКИ МАТЕРИАЛА =====
 
 async def update_material_sent_date(bot_id: int, telegram_id: int = None):
@@ -439,12 +711,21 @@ async def update_material_sent_date(bot_id: int, telegram_id: int = None):
 async def update_material_sent_date_custom(bot_id: int, telegram_id: int, custom_date: datetime):
     """Обновляет дату рассылки материала для бота с кастомной датой"""
     async with aiosqlite.connect('subscription_bot.db') as db:
-        await db.execute('''
+        cursor = await db.execute('''
             UPDATE bots 
             SET material_sent_at = ? 
             WHERE id = ? AND user_id = (SELECT id FROM users WHERE telegram_id = ?)
         ''', (custom_date.isoformat(), bot_id, telegram_id))
         
+        # Ожидающие и отмененные (при очистке даты) отправки переносим на новую дату
+        if cursor.rowcount:
+            await db.execute('''
+                UPDATE material_deliveries
+                SET due_at = ?, release = ?, status = 'pending', attempts = 0,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE bot_id = ? AND status IN ('pending', 'cancelled')
+            ''', (custom_date.timestamp(), custom_date.isoformat(), bot_id))
+        
         await db.commit()
         logging.info(f"📅 Дата рассылки материала для бота {bot_id} установлена: {custom_date}")
 
@@ -470,26 +751,368 @@ async def get_bots_with_material_sent_date():
         return bots
 
 async def clear_material_sent_date(bot_id: int, telegram_id: int = None):
-    """Очищает дату рассылки материала для бота"""
+    """Очищает дату рассылки материала для бота (ожидающие отправки материалы отменяются)"""
     async with aiosqlite.connect('subscription_bot.db') as db:
         if telegram_id:
             # С проверкой владельца
-            await db.execute('''
+            cursor = await db.execute('''
                 UPDATE bots 
                 SET material_sent_at = NULL 
                 WHERE id = ? AND user_id = (SELECT id FROM users WHERE telegram_id = ?)
             ''', (bot_id, telegram_id))
         else:
             # Без проверки владельца
-            await db.execute('''
+            cursor = await db.execute('''
                 UPDATE bots 
                 SET material_sent_at = NULL 
                 WHERE id = ?
             ''', (bot_id,))
         
+        if cursor.rowcount:
+            await db.execute('''
+                UPDATE material_deliveries
+                SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
+                WHERE bot_id = ? AND status = 'pending'
+            ''', (bot_id,))
+        
         await db.commit()
         logging.info(f"📅 Дата рассылки материала для бота {bot_id} очищена")
 
+# ===== ОТПРАВКА МАТЕРИАЛОВ =====
+
+async def add_material_delivery(bot_id: int, user_id: int, due_at: float, release: str = None):
+    """
+    Ставит отправку материалов пользователю в очередь.
+    Уже получившему материалы этой даты рассылки (release) повторно не отправляем.
+    """
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        await db.execute('''
+            INSERT INTO material_deliveries (bot_id, user_id, due_at, release)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (bot_id, user_id) DO UPDATE SET
+                due_at = excluded.due_at, release = excluded.release, status = 'pending',
+                attempts = 0, updated_at = CURRENT_TIMESTAMP
+            WHERE material_deliveries.status != 'sent'
+               OR material_deliveries.release IS NOT excluded.release
+        ''', (bot_id, user_id, due_at, release))
+        await db.commit()
+
+async def get_bots_with_due_material_deliveries(due_before: float):
+    """Активные боты, у которых есть наступившие отправки материалов: [(bot_id, count), ...]"""
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        cursor = await db.execute('''
+            SELECT d.bot_id, COUNT(*)
+            FROM material_deliveries d
+            JOIN bots b ON b.id = d.bot_id
+            WHERE d.status = 'pending' AND d.due_at <= ? AND b.is_active = TRUE
+            GROUP BY d.bot_id
+        ''', (due_before,))
+        return await cursor.fetchall()
+
+async def get_bot_due_material_deliveries(bot_id: int, due_before: float, after_user_id: int = 0, limit: int = 100):
+    """Страница наступивших отправок материалов бота: [(user_id, attempts), ...]"""
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        cursor = await db.execute('''
+            SELECT user_id, attempts
+            FROM material_deliveries
+            WHERE bot_id = ? AND status = 'pending' AND due_at <= ? AND user_id > ?
+            ORDER BY user_id
+            LIMIT ?
+        ''', (bot_id, due_before, after_user_id, limit))
+        return await cursor.fetchall()
+
+async def start_material_broadcast(bot_id: int, release: str):
+    """
+    Создает (или возобновляет после сбоя) рассылку материалов бота для даты release
+
+    Returns:
+        tuple: (id, sent, skipped, failed, report_message_id)
+    """
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        await db.execute('''
+            INSERT INTO material_broadcasts (bot_id, release)
+            VALUES (?, ?)
+            ON CONFLICT (bot_id, release) DO UPDATE SET
+                status = 'running', finished_at = NULL, updated_at = CURRENT_TIMESTAMP
+        ''', (bot_id, release))
+        cursor = await db.execute('''
+            SELECT id, sent, skipped, failed, report_message_id
+            FROM material_broadcasts WHERE bot_id = ? AND release = ?
+        ''', (bot_id, release))
+        row = await cursor.fetchone()
+        await db.commit()
+        return row
+
+async def save_material_broadcast_progress(broadcast_id: int, finished: list, retries: list,
+                                           attempts: list, dead_letters: list,
+                                           sent: int, skipped: int, failed: int,
+                                           report_message_id: int = None, done: bool = False):
+    """
+    Контрольная точка рассылки: итоги отправок, журнал попыток и счетчики
+    пишутся одной транзакцией
+
+    Args:
+        finished: [(status, bot_id, user_id), ...] - завершенные отправки
+        retries: [(due_at, bot_id, user_id), ...] - отправки, перенесенные на повтор
+        attempts: [(bot_id, user_id, attempt, outcome, error), ...] - журнал попыток
+        dead_letters: [(bot_id, user_id, outcome, error, attempts), ...] - недоставленные окончательно
+    """
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        await db.executemany('''
+            INSERT INTO delivery_attempts (bot_id, user_id, attempt, outcome, error)
+            VALUES (?, ?, ?, ?, ?)
+        ''', attempts)
+        await db.executemany('''
+            INSERT OR REPLACE INTO material_dead_letters (bot_id, user_id, outcome, error, attempts)
+            VALUES (?, ?, ?, ?, ?)
+        ''', dead_letters)
+        await db.executemany('''
+            UPDATE material_deliveries
+            SET status = ?, attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE bot_id = ? AND user_id = ? AND status = 'pending'
+        ''', finished)
+        await db.executemany('''
+            UPDATE material_deliveries
+            SET due_at = ?, attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE bot_id = ? AND user_id = ? AND status = 'pending'
+        ''', retries)
+        await db.execute(f'''
+            UPDATE material_broadcasts
+            SET sent = ?, skipped = ?, failed = ?, report_message_id = ?,
+                status = ?, updated_at = CURRENT_TIMESTAMP
+                {", finished_at = CURRENT_TIMESTAMP" if done else ""}
+            WHERE id = ?
+        ''', (sent, skipped, failed, report_message_id, 'done' if done else 'running', broadcast_id))
+        await db.commit()
+
+async def get_material_delivery_summary(bot_id: int, hours: int = 24):
+    """
+    Сводка отправки материалов бота для владельца
+
+    Returns:
+        dict: {'statuses': {status: count}, 'outcomes': {outcome: count} за hours часов,
+               'dead_letters': {outcome: count}}
+    """
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        cursor = await db.execute('''
+            SELECT status, COUNT(*) FROM material_deliveries WHERE bot_id = ? GROUP BY status
+        ''', (bot_id,))
+        statuses = dict(await cursor.fetchall())
+        
+        cursor = await db.execute('''
+            SELECT outcome, COUNT(*) FROM delivery_attempts
+            WHERE bot_id = ? AND created_at >= datetime('now', ?)
+            GROUP BY outcome
+        ''', (bot_id, f'-{hours} hours'))
+        outcomes = dict(await cursor.fetchall())
+        
+        cursor = await db.execute('''
+            SELECT outcome, COUNT(*) FROM material_dead_letters WHERE bot_id = ? GROUP BY outcome
+        ''', (bot_id,))
+        dead_letters = dict(await cursor.fetchall())
+        
+        return {'statuses': statuses, 'outcomes': outcomes, 'dead_letters': dead_letters}
+
+async def prune_delivery_attempts(days: int = 30):
+    """Удаляет журнал попыток отправки старше days дней"""
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        await db.execute(
+            "DELETE FROM delivery_attempts WHERE created_at < datetime('now', ?)", (f'-{days} days',)
+        )
+        await db.commit()
+
+async def get_bot_owner_telegram_id(bot_id: int):
+    """Telegram ID владельца бота"""
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        cursor = await db.execute('''
+            SELECT u.telegram_id FROM bots b JOIN users u ON b.user_id = u.id WHERE b.id = ?
+        ''', (bot_id,))
+        row = await cursor.fetchone()
+        return row[0] if row else None
+
+# ===== НАПОМИНАНИЯ =====
+
+async def get_bot_reminder_policy(bot_id: int):
+    """Политика напоминаний бота (JSON) или None - политика по умолчанию"""
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        cursor = await db.execute('SELECT reminder_policy FROM bots WHERE id = ?', (bot_id,))
+        result = await cursor.fetchone()
+        return result[0] if result else None
+
+async def update_bot_reminder_policy(bot_id: int, telegram_id: int, reminder_policy: str = None) -> bool:
+    """
+    Установка политики напоминаний бота (JSON, None - политика по умолчанию).
+    Проверяет политику worker_bot.reminder_manager.set_bot_reminder_policy
+
+    Returns:
+        bool: False, если бот не найден или нет прав доступа
+    """
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        cursor = await db.execute('''
+            UPDATE bots 
+            SET reminder_policy = ? 
+            WHERE id = ? AND user_id = (SELECT id FROM users WHERE telegram_id = ?)
+        ''', (reminder_policy, bot_id, telegram_id))
+        await db.commit()
+        if not cursor.rowcount:
+            return False
+        logging.info(f"⏰ Политика напоминаний бота {bot_id} обновлена")
+        return True
+
+async def save_reminders_batch(upserts: list, deletes: list):
+    """
+    Сохраняет изменения напоминаний одной транзакцией
+    
+    Args:
+        upserts: [(bot_id, user_id, due_at, last_message_id, attempt)]
+        deletes: [(bot_id, user_id)]
+    """
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        if upserts:
+            await db.executemany('''
+                INSERT INTO reminders (bot_id, user_id, due_at, last_message_id, attempt)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (bot_id, user_id) DO UPDATE SET
+                    due_at = excluded.due_at,
+                    last_message_id = excluded.last_message_id,
+                    attempt = excluded.attempt
+            ''', upserts)
+        if deletes:
+            await db.executemany('DELETE FROM reminders WHERE bot_id = ? AND user_id = ?', deletes)
+        await db.commit()
+
+async def add_reminder(bot_id: int, user_id: int, due_at: float, last_message_id: int = None) -> bool:
+    """
+    Создает напоминание, если у пользователя его еще нет (существующее не трогает)
+    
+    Returns:
+        bool: True если напоминание создано
+    """
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        cursor = await db.execute('''
+            INSERT INTO reminders (bot_id, user_id, due_at, last_message_id, attempt)
+            VALUES (?, ?, ?, ?, 0)
+            ON CONFLICT (bot_id, user_id) DO NOTHING
+        ''', (bot_id, user_id, due_at, last_message_id))
+        await db.commit()
+        return cursor.rowcount > 0
+
+async def update_reminder_message_id(bot_id: int, user_id: int, last_message_id: int):
+    """Меняет сообщение, которое удалит следующее напоминание"""
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        await db.execute(
+            'UPDATE reminders SET last_message_id = ? WHERE bot_id = ? AND user_id = ?',
+            (last_message_id, bot_id, user_id)
+        )
+        await db.commit()
+
+async def count_reminders(bot_id: int = None, due_before: float = None) -> int:
+    """
+    Количество запланированных напоминаний
+    
+    Args:
+        bot_id: ID бота (None - всех ботов)
+        due_before: Считать только напоминания со сроком не позже (unix-время)
+    """
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        cursor = await db.execute('''
+            SELECT COUNT(*) FROM reminders
+            WHERE (? IS NULL OR bot_id = ?) AND (? IS NULL OR due_at <= ?)
+        ''', (bot_id, bot_id, due_before, due_before))
+        return (await cursor.fetchone())[0]
+
+def get_stored_reminder_keys_sync(keys: list) -> set:
+    """
+    Какие из напоминаний (bot_id, user_id) есть в БД. Синхронный запрос по первичному
+    ключу - для синхронного API напоминаний, которому нужны напоминания вне памяти
+    """
+    if not keys:
+        return set()
+    with closing(sqlite3.connect('subscription_bot.db', timeout=1)) as db:
+        return {
+            key for key in keys
+            if db.execute('SELECT 1 FROM reminders WHERE bot_id = ? AND user_id = ?', key).fetchone()
+        }
+
+def count_reminders_sync(bot_id: int = None) -> int:
+    """Количество запланированных напоминаний (синхронно, см. get_stored_reminder_keys_sync)"""
+    with closing(sqlite3.connect('subscription_bot.db', timeout=1)) as db:
+        return db.execute(
+            'SELECT COUNT(*) FROM reminders WHERE (? IS NULL OR bot_id = ?)', (bot_id, bot_id)
+        ).fetchone()[0]
+
+async def get_due_reminders(due_before: float, after: tuple = None, limit: int = 500):
+    """
+    Страница напоминаний активных ботов со сроком не позже due_before
+    
+    Args:
+        due_before: Граница срока (unix-время)
+        after: Ключ (due_at, bot_id, user_id) последней строки предыдущей страницы
+        limit: Размер страницы
+        
+    Returns:
+        list: [(bot_id, user_id, due_at, last_message_id, attempt)] по возрастанию due_at
+    """
+    after = after or (float('-inf'), 0, 0)
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        cursor = await db.execute('''
+            SELECT r.bot_id, r.user_id, r.due_at, r.last_message_id, r.attempt
+            FROM reminders r
+            JOIN bots b ON b.id = r.bot_id
+            WHERE r.due_at <= ? AND (r.due_at, r.bot_id, r.user_id) > (?, ?, ?)
+              AND b.is_active = TRUE
+            ORDER BY r.due_at, r.bot_id, r.user_id
+            LIMIT ?
+        ''', (due_before, *after, limit))
+        return await cursor.fetchall()
+
+# ===== НЕОБРАБОТАННЫЕ АПДЕЙТЫ =====
+
+async def save_pending_updates(upserts: list, deletes: list):
+    """
+    Сохраняет и удаляет необработанные апдейты одной транзакцией
+
+    Args:
+        upserts: [(bot_id, update_id, payload)]
+        deletes: [(bot_id, update_id)]
+    """
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        if upserts:
+            await db.executemany('''
+                INSERT OR REPLACE INTO pending_updates (bot_id, update_id, payload) VALUES (?, ?, ?)
+            ''', upserts)
+        if deletes:
+            await db.executemany('DELETE FROM pending_updates WHERE bot_id = ? AND update_id = ?', deletes)
+        await db.commit()
+
+async def get_pending_updates(bot_id: int):
+    """Необработанные апдейты бота по порядку: [(update_id, payload)]"""
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        cursor = await db.execute('''
+            SELECT update_id, payload FROM pending_updates WHERE bot_id = ? ORDER BY update_id
+        ''', (bot_id,))
+        return await cursor.fetchall()
+
+# ===== ЗАБЛОКИРОВАВШИЕ ПОЛЬЗОВАТЕЛИ =====
+
+async def get_blocked_users(bot_id: int):
+    """Telegram ID пользователей, заблокировавших бота"""
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        cursor = await db.execute('SELECT user_id FROM blocked_users WHERE bot_id = ?', (bot_id,))
+        return [row[0] for row in await cursor.fetchall()]
+
+async def add_blocked_user(bot_id: int, user_id: int):
+    """Отметка о блокировке бота пользователем"""
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        await db.execute('INSERT OR IGNORE INTO blocked_users (bot_id, user_id) VALUES (?, ?)', (bot_id, user_id))
+        await db.commit()
+
+async def remove_blocked_user(bot_id: int, user_id: int):
+    """Снятие отметки о блокировке бота пользователем"""
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        await db.execute('DELETE FROM blocked_users WHERE bot_id = ? AND user_id = ?', (bot_id, user_id))
+        await db.commit()
+
 # ===== КАНАЛЫ =====
 
 async def add_channel_to_bot(bot_id: int, channel_link: str, description: str, telegram_id: int = None):
@@ -4,6 +4,7 @@ import logging
 import sys
 import os
 import signal
+import re
 
 # Настройка логирования
 logging.basicConfig(
@@ -24,9 +25,13 @@ from yookassa_service import YooKassaService
 from payment_manager import PaymentManager
 from webhook_server import webhook_server  # ИСПРАВЛЕНО: импортируем экземпляр
 
+# Формат токена BotFather: <id бота>:<секрет>
+TOKEN_FORMAT = re.compile(r'^\d+:[\w-]{30,}$')
+
 # Глобальные переменные
 payment_manager = None
 webhook_runner = None
+shard_supervisor = None
 shutdown_event = asyncio.Event()
 
 def signal_handler(signum, frame):
@@ -39,6 +44,11 @@ async def graceful_shutdown():
     logger.info("🛑 Корректное завершение работы...")
     
     try:
+        # В режиме супервизора сначала останавливаем процессы-шарды
+        if shard_supervisor:
+            logger.info("🛑 Остановка шардов рабочих ботов...")
+            await shard_supervisor.stop()
+        
         # Сначала останавливаем всех воркер-ботов
         try:
             from worker_bot.bot_manager import stop_all_worker_bots
@@ -67,13 +77,20 @@ async def graceful_shutdown():
         await asyncio.sleep(2.0)  # Даем время на корректную остановку
         logger.info("✅ Основной бот остановлен")
         
+        # Общий HTTP-пул рабочих ботов закрываем последним
+        from worker_bot.http_session import close_shared_session
+        await close_shared_session()
+        
     except Exception as e:
         logger.error(f"❌ Ошибка при завершении работы: {e}")
     
     logger.info("👋 Завершение работы...")
 
 async def validate_bot_tokens(active_bots):
-    """Валидирует токены ботов перед запуском"""
+    """
+    Отбирает ботов для запуска без запросов к Telegram: токены проверены при добавлении
+    и перепроверяются фоновой задачей, отозванный токен выключит бота при первом polling
+    """
     valid_bots = []
     
     for bot_data in active_bots:
@@ -82,18 +99,12 @@ async def validate_bot_tokens(active_bots):
             
             if not bot_token or not is_active:
                 continue
-                
-            try:
-                from aiogram import Bot
-                test_bot = Bot(token=bot_token)
-                bot_info = await test_bot.get_me()
-                await test_bot.session.close()
-                
-                valid_bots.append(bot_data)
-                logger.info(f"✅ Токен бота @{bot_username} валиден")
-                
-            except Exception as e:
-                logger.error(f"❌ Невалидный токен бота ID {bot_id}: {e}")
+            
+            if not TOKEN_FORMAT.match(bot_token):
+                logger.error(f"❌ Невалидный токен бота ID {bot_id}: неверный формат")
+                continue
+            
+            valid_bots.append(bot_data)
     
     return valid_bots
 
@@ -122,6 +133,59 @@ async def start_worker_bots(valid_bots):
         except Exception as e:
             logger.error(f"❌ Ошибка запуска бота ID {bot_id}: {e}")
 
+async def start_shard_supervisor(valid_bots):
+    """Запускает процессы-шарды и распределяет по ним рабочих ботов"""
+    global shard_supervisor
+    from config import WORKER_SHARDS
+    from supervisor import ShardSupervisor, set_supervisor
+    
+    shard_supervisor = ShardSupervisor(WORKER_SHARDS)
+    set_supervisor(shard_supervisor)
+    await shard_supervisor.start()
+    
+    logger.info("▶️ Распределение рабочих ботов по шардам...")
+    for bot_data in valid_bots:
+        bot_id, bot_token, bot_username, bot_name, is_active = bot_data
+        if not await shard_supervisor.start_bot(bot_id):
+            logger.error(f"❌ Не удалось запустить бота ID {bot_id} (@{bot_username}) на шарде")
+
+async def run_shard(shard_index: int):
+    """Точка входа процесса-шарда: только рабочие боты и IPC-сервер"""
+    logger.info(f"🧩 Запуск шарда {shard_index}...")
+    
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+    
+    from config import BOT_TOKEN
+    from supervisor import serve_shard_commands
+    from worker_bot.main_bot_client import init_main_bot
+    from worker_bot.bot_manager import stop_all_worker_bots
+    
+    server = None
+    try:
+        await init_db()
+        # Основной бот нужен шарду только для проверки подписок (без polling)
+        await init_main_bot(BOT_TOKEN)
+        server = await serve_shard_commands(shard_index)
+        await shutdown_event.wait()
+    except Exception as e:
+        logger.error(f"💥 Ошибка шарда {shard_index}: {e}")
+        raise
+    finally:
+        if server:
+            server.close()
+            await server.wait_closed()
+        await stop_all_worker_bots()
+        
+        from worker_bot.main_bot_client import get_main_bot
+        main_bot_client = get_main_bot()
+        if main_bot_client:
+            await main_bot_client.close()
+        
+        from worker_bot.http_session import close_shared_session
+        await close_shared_session()
+        logger.info(f"👋 Шард {shard_index} завершен")
+
 async def main():
     """Главная функция запуска"""
     global payment_manager, webhook_runner
@@ -188,8 +252,20 @@ async def main():
         except Exception as e:
             logger.error(f"❌ Ошибка инициализации основного бота для проверки подписок: {e}")
         
-        # ПОТОМ запускаем рабочих ботов
-        await start_worker_bots(valid_bots)
+        # ПОТОМ запускаем рабочих ботов (в процессах-шардах, если они включены)
+        from config import WORKER_SHARDS
+        if WORKER_SHARDS > 0:
+            await start_shard_supervisor(valid_bots)
+        else:
+            await start_worker_bots(valid_bots)
+        
+        # Фоновая перепроверка токенов (вместо getMe для каждого бота при старте)
+        from worker_bot.token_validation import start_token_validation
+        start_token_validation()
+        
+        # Сборка мусора в хранилище изображений ботов
+        from main_bot.media_store import start_media_gc
+        start_media_gc()
         
         # Ждем либо завершения основного бота, либо сигнала shutdown
         shutdown_task = asyncio.create_task(shutdown_event.wait())
@@ -218,7 +294,11 @@ async def main():
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        # Процесс-шард запускается супервизором: main.py --shard N
+        if len(sys.argv) >= 3 and sys.argv[1] == '--shard':
+            asyncio.run(run_shard(int(sys.argv[2])))
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("👋 Завершение по Ctrl+C")
     except Exception as e:
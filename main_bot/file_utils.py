@@ -1,13 +1,16 @@
 """
 main_bot/file_utils.py
-Утилиты для работы с файлами в основном боте
+Утилиты для работы с файлами в основном боте.
+Функции, обращающиеся к диску, асинхронные: работа с файлами идет в пуле потоков media_store.
 """
 
 import os
-import uuid
 import logging
-from pathlib import Path
 from aiogram.types import Message
+from .media_store import (
+    is_blob_filename, get_blob_path, save_blob, delete_blob,
+    run_media_io, media_exists, unindex_media_file
+)
 
 # Базовая папка для медиа
 MEDIA_BASE = "media"
@@ -21,40 +24,52 @@ def ensure_directories():
 
 async def save_bot_image_from_main_bot(bot_id: int, message: Message) -> str:
     """
-    Сохраняет изображение бота на сервер (только через основной бот)
+    Сохраняет изображение бота на сервер (только через основной бот).
+    Изображение уменьшается и пережимается (см. image_processing) и попадает в общее
+    хранилище (см. media_store): одинаковые изображения разных ботов хранятся один раз.
+    Исходный файл сохраняется только при BOT_IMAGE_KEEP_ORIGINAL.
     
     Args:
         bot_id: ID бота
         message: Сообщение с изображением из основного бота
         
     Returns:
-        str: Имя файла на сервере
+        str: Имя файла в хранилище
+        
+    Raises:
+        ImageTooLargeError: Файл больше BOT_IMAGE_MAX_INPUT_BYTES
+        ImageProcessingError: Файл не удалось декодировать или пережать
     """
-    ensure_directories()
+    from .image_processing import LimitedBuffer, ImageTooLargeError, process_image
+    from .media_store import save_blob
+    from config import BOT_IMAGE_MAX_INPUT_BYTES, BOT_IMAGE_KEEP_ORIGINAL
     
-    # Создаем папку для бота
-    bot_dir = f"{BOT_IMAGES_DIR}/bot_{bot_id}"
-    os.makedirs(bot_dir, exist_ok=True)
+    await run_media_io(ensure_directories)
     
     if message.photo:
         # Берем самое большое фото
-        photo = message.photo[-1]
-        file_info = await message.bot.get_file(photo.file_id)
+        media = message.photo[-1]
         file_ext = ".jpg"
     elif message.document:
-        file_info = await message.bot.get_file(message.document.file_id)
+        media = message.document
         file_ext = os.path.splitext(message.document.file_name or "image.jpg")[1]
     else:
         raise ValueError("Сообщение не содержит изображение")
     
-    # Генерируем уникальное имя файла
-    filename = f"image_{uuid.uuid4().hex}{file_ext}"
-    file_path = f"{bot_dir}/{filename}"
+    # Заявленный размер проверяем до скачивания, фактический - по ходу скачивания
+    if media.file_size and media.file_size > BOT_IMAGE_MAX_INPUT_BYTES:
+        raise ImageTooLargeError(f"Изображение больше {BOT_IMAGE_MAX_INPUT_BYTES // (1024 * 1024)} МБ")
+    file_info = await message.bot.get_file(media.file_id)
+    buffer = LimitedBuffer(BOT_IMAGE_MAX_INPUT_BYTES)
+    await message.bot.download_file(file_info.file_path, buffer)
+    original = buffer.getvalue()
+    
+    data, ext = await process_image(original, file_ext)
     
-    # Скачиваем файл
-    await message.bot.download_file(file_info.file_path, file_path)
+    # Имя файла - хэш содержимого
+    filename = await save_blob(data, ext, original if BOT_IMAGE_KEEP_ORIGINAL else None, file_ext)
     
-    logging.info(f"💾 Изображение сохранено основным ботом: {file_path}")
+    logging.info(f"💾 Изображение бота {bot_id} сохранено основным ботом: {filename}")
     return filename
 
 def get_bot_image_path(bot_id: int, filename: str) -> str:
@@ -68,11 +83,37 @@ def get_bot_image_path(bot_id: int, filename: str) -> str:
     Returns:
         str: Полный путь к файлу
     """
+    if is_blob_filename(filename):
+        return get_blob_path(filename)
+    # Изображение, сохраненное до общего хранилища
     return f"{BOT_IMAGES_DIR}/bot_{bot_id}/{filename}"
 
-def delete_bot_image(bot_id: int, filename: str) -> bool:
+async def find_bot_image(bot_id: int, filename: str):
+    """
+    Путь к изображению бота, если файл есть (по индексу медиа, см. media_exists)
+    
+    Args:
+        bot_id: ID бота
+        filename: Имя файла (может быть пустым)
+        
+    Returns:
+        str: Полный путь к файлу или None
+    """
+    if not filename:
+        return None
+    image_path = get_bot_image_path(bot_id, filename)
+    return image_path if await media_exists(image_path) else None
+
+def _remove_file(file_path: str) -> bool:
+    if not os.path.exists(file_path):
+        return False
+    os.remove(file_path)
+    return True
+
+async def delete_bot_image(bot_id: int, filename: str) -> bool:
     """
-    Удаляет изображение бота
+    Удаляет изображение бота. Файл общего хранилища удаляется, только когда
+    на него не ссылается ни один бот (проверяет вызывающий) и он не сохранен только что.
     
     Args:
         bot_id: ID бота
@@ -81,17 +122,26 @@ def delete_bot_image(bot_id: int, filename: str) -> bool:
     Returns:
         bool: Успешно ли удаление
     """
+    if is_blob_filename(filename):
+        return await delete_blob(filename)
+    
     file_path = get_bot_image_path(bot_id, filename)
     try:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        removed = await run_media_io(_remove_file, file_path)
+        unindex_media_file(file_path)
+        if removed:
             logging.info(f"🗑️ Удалено изображение: {file_path}")
             return True
     except Exception as e:
         logging.error(f"❌ Ошибка удаления изображения: {e}")
     return False
 
-def get_bot_images_list(bot_id: int) -> list:
+def _list_files(directory: str) -> list:
+    if not os.path.exists(directory):
+        return []
+    return [f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f))]
+
+async def get_bot_images_list(bot_id: int) -> list:
     """
     Возвращает список изображений бота
     
@@ -101,13 +151,9 @@ def get_bot_images_list(bot_id: int) -> list:
     Returns:
         list: Список имен файлов
     """
-    bot_dir = f"{BOT_IMAGES_DIR}/bot_{bot_id}"
-    if not os.path.exists(bot_dir):
-        return []
-    
-    return [f for f in os.listdir(bot_dir) if os.path.isfile(os.path.join(bot_dir, f))]
+    return await run_media_io(_list_files, f"{BOT_IMAGES_DIR}/bot_{bot_id}")
 
-def cleanup_old_images(bot_id: int, keep_filename: str = None):
+async def cleanup_old_images(bot_id: int, keep_filename: str = None):
     """
     Удаляет старые изображения бота, оставляя только указанное
     
@@ -115,8 +161,8 @@ def cleanup_old_images(bot_id: int, keep_filename: str = None):
         bot_id: ID бота
         keep_filename: Имя файла, который нужно сохранить
     """
-    images = get_bot_images_list(bot_id)
+    images = await get_bot_images_list(bot_id)
     for filename in images:
         if filename != keep_filename:
-            delete_bot_image(bot_id, filename)
+            await delete_bot_image(bot_id, filename)
             logging.info(f"🗑️ Удалено старое изображение: {filename}")
@@ -59,6 +59,11 @@ async def setup_handlers(dp: Dispatcher, yookassa_service=None):
         await setup_material_date_handlers(router)
         logger.info("✅ Обработчики управления датой рассылки настроены")
         
+        # Настройка напоминаний
+        from main_bot.handlers.reminder_management import setup_reminder_management_handlers
+        await setup_reminder_management_handlers(router)
+        logger.info("✅ Обработчики настройки напоминаний настроены")
+        
         # Платежи
         if yookassa_service:
             from main_bot.handlers.payment_handlers import setup_payment_handlers
@@ -107,22 +107,23 @@ async def setup_bot_management_handlers(router: Router):
     async def process_bot_token(message: Message, state: FSMContext):
         """Обработка токена бота"""
         from aiogram import Bot
+        from worker_bot.http_session import get_shared_session
         
         try:
             bot_token = message.text.strip()
             
-            # Проверяем токен
-            test_bot = Bot(token=bot_token)
+            # Проверяем токен (через общий HTTP-пул)
+            test_bot = Bot(token=bot_token, session=get_shared_session())
             bot_info = await test_bot.get_me()
             bot_username = bot_info.username
             bot_name = bot_info.first_name
-            await test_bot.session.close()
             
             # Сохраняем данные бота в состоянии
             await state.update_data(
                 bot_token=bot_token,
                 bot_username=bot_username,
-                bot_name=bot_name
+                bot_name=bot_name,
+                bot_telegram_id=bot_info.id
             )
             
             # Запрашиваем кастомное сообщение
@@ -168,7 +169,8 @@ async def setup_bot_management_handlers(router: Router):
                 bot_username=bot_username,
                 bot_name=bot_name,
                 telegram_id=message.from_user.id,
-                message=user_message
+                message=user_message,
+                bot_telegram_id=data.get('bot_telegram_id')
             )
             
             # Запускаем рабочего бота
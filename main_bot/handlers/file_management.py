@@ -56,18 +56,18 @@ async def setup_file_management_handlers(router: Router):
                 response_text = "✅ Файл бота удален!"
             elif message.photo:
                 # Фото
-                file_id = message.photo[-1].file_id
-                await update_bot_file(bot_id, message.from_user.id, file_id, 'photo')
+                media = message.photo[-1]
+                await update_bot_file(bot_id, message.from_user.id, media.file_id, 'photo', media.file_unique_id)
                 response_text = "✅ Фото бота обновлено!"
             elif message.video:
                 # Видео
-                file_id = message.video.file_id
-                await update_bot_file(bot_id, message.from_user.id, file_id, 'video')
+                media = message.video
+                await update_bot_file(bot_id, message.from_user.id, media.file_id, 'video', media.file_unique_id)
                 response_text = "✅ Видео бота обновлено!"
             elif message.document:
                 # Документ
-                file_id = message.document.file_id
-                await update_bot_file(bot_id, message.from_user.id, file_id, 'document')
+                media = message.document
+                await update_bot_file(bot_id, message.from_user.id, media.file_id, 'document', media.file_unique_id)
                 response_text = "✅ Документ бота обновлено!"
             else:
                 await message.answer(
@@ -10,9 +10,14 @@ from aiogram.fsm.context import FSMContext
 
 from database import get_bot_by_id, update_bot_image, remove_bot_image
 from main_bot.file_utils import save_bot_image_from_main_bot, cleanup_old_images
+from main_bot.image_processing import ImageTooLargeError, ImageProcessingError
+from config import BOT_IMAGE_MAX_INPUT_BYTES
 from ..states import AttachImage
 from ..keyboards import get_back_to_bot_keyboard
 
+# Лимит размера исходного изображения для сообщений пользователю
+MAX_IMAGE_SIZE_TEXT = f"{round(BOT_IMAGE_MAX_INPUT_BYTES / (1024 * 1024), 1):g} МБ"
+
 async def setup_image_management_handlers(router: Router):
     """Настройка обработчиков управления изображениями"""
     
@@ -38,7 +43,7 @@ async def setup_image_management_handlers(router: Router):
             "Отправьте изображение как фото или документ:\n\n"
             "• Изображение будет отображаться в основном сообщении бота\n"
             "• Поддерживаются форматы: JPG, PNG, GIF\n"
-            "• Максимальный размер: 10 МБ\n\n"
+            f"• Максимальный размер: {MAX_IMAGE_SIZE_TEXT}\n\n"
             "Чтобы удалить изображение, отправьте \"-\"\n\n"
             f"Текущее изображение: {'🖼️ Установлено' if has_image else '❌ Не установлено'}",
             reply_markup=get_back_to_bot_keyboard(bot_id),
@@ -64,7 +69,7 @@ async def setup_image_management_handlers(router: Router):
                 filename = await save_bot_image_from_main_bot(bot_id, message)
                 
                 # Удаляем старые изображения
-                cleanup_old_images(bot_id, filename)
+                await cleanup_old_images(bot_id, filename)
                 
                 # Сохраняем имя файла в базу
                 await update_bot_image(bot_id, message.from_user.id, filename)
@@ -82,6 +87,16 @@ async def setup_image_management_handlers(router: Router):
                 reply_markup=get_back_to_bot_keyboard(bot_id)
             )
             
+        except ImageTooLargeError:
+            await message.answer(
+                f"❌ Изображение слишком большое. Максимальный размер: {MAX_IMAGE_SIZE_TEXT}.",
+                reply_markup=get_back_to_bot_keyboard(bot_id)
+            )
+        except ImageProcessingError:
+            await message.answer(
+                "❌ Не удалось прочитать изображение. Поддерживаются форматы: JPG, PNG, GIF.",
+                reply_markup=get_back_to_bot_keyboard(bot_id)
+            )
         except Exception as e:
             logging.error(f"❌ Ошибка при прикреплении изображения: {e}")
             await message.answer(
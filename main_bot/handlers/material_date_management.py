@@ -11,7 +11,7 @@ from aiogram.fsm.context import FSMContext
 
 from database import (
     get_bot_by_id, update_material_sent_date_custom, get_material_sent_date,
-    clear_material_sent_date
+    clear_material_sent_date, get_material_delivery_summary
 )
 from ..states import MaterialDateManagement
 from ..keyboards import get_back_to_bot_keyboard
@@ -65,6 +65,52 @@ async def setup_material_date_handlers(router: Router):
         await callback.answer()
 
 
+    @router.callback_query(F.data.startswith("delivery_stats_"))
+    async def delivery_stats(callback: CallbackQuery):
+        """Сводка доставки материалов подписчикам бота"""
+        bot_id = int(callback.data.replace("delivery_stats_", ""))
+        
+        # Проверяем права доступа
+        bot = await get_bot_by_id(bot_id, callback.from_user.id)
+        if not bot:
+            await callback.answer("❌ Бот не найден", show_alert=True)
+            return
+        
+        summary = await get_material_delivery_summary(bot_id)
+        statuses = summary['statuses']
+        outcomes = summary['outcomes']
+        dead_letters = summary['dead_letters']
+        
+        text = (
+            f"📊 <b>Доставка материалов</b>\n"
+            f"🤖 Бот: {bot[3]} (@{bot[2]})\n\n"
+            f"⏳ Ожидают отправки: {statuses.get('pending', 0)}\n"
+            f"✅ Доставлено: {statuses.get('sent', 0)}\n"
+            f"⏭ Отписались до рассылки: {statuses.get('not_subscribed', 0)}\n"
+            f"❌ Не доставлено: {statuses.get('dead', 0)}\n"
+        )
+        if dead_letters:
+            text += (
+                f"   • заблокировали бота: {dead_letters.get('forbidden', 0)}\n"
+                f"   • отклонено Telegram: {dead_letters.get('bad_request', 0)}\n"
+                f"   • ошибки сети после повторов: {dead_letters.get('transient_error', 0)}\n"
+            )
+        if outcomes:
+            text += (
+                f"\n<b>Попытки за 24 часа:</b> {sum(outcomes.values())}\n"
+                f"✅ {outcomes.get('sent', 0)} · ⏭ {outcomes.get('not_subscribed', 0)} · "
+                f"🚫 {outcomes.get('forbidden', 0)} · ⚠️ {outcomes.get('bad_request', 0)} · "
+                f"🔁 {outcomes.get('transient_error', 0)}"
+            )
+        
+        await callback.message.answer(
+            text,
+            reply_markup=get_back_to_bot_keyboard(bot_id),
+            parse_mode="HTML"
+        )
+        await callback.answer()
+
+
     @router.message(MaterialDateManagement.waiting_for_custom_date)
     async def process_custom_material_date(message: Message, state: FSMContext):
         """Обработка новой даты рассылки"""
@@ -0,0 +1,157 @@
+"""
+main_bot/handlers/reminder_management.py
+Обработчики настройки напоминаний бота
+"""
+
+import logging
+from aiogram import F, Router
+from aiogram.types import Message, CallbackQuery
+from aiogram.fsm.context import FSMContext
+
+from database import get_bot_by_id, get_bot_reminder_policy
+from worker_bot import set_bot_reminder_policy
+from worker_bot.reminder_policy import ReminderPolicy
+from ..states import EditReminderPolicy
+from ..keyboards import get_back_to_bot_keyboard
+
+# Строки настройки в сообщении владельца: {название: поле политики}
+POLICY_FIELDS = {
+    'интервалы': 'intervals',
+    'множитель': 'backoff',
+    'максимум': 'max_interval',
+    'лимит': 'max_attempts',
+    'тихие часы': 'quiet_hours',
+    'часовой пояс': 'timezone',
+}
+
+
+def format_reminder_policy(policy: ReminderPolicy) -> str:
+    """Политика в виде строк настройки (интервалы - в минутах)"""
+    quiet_hours = f"{policy.quiet_hours[0]}-{policy.quiet_hours[1]}" if policy.quiet_hours else "нет"
+    return (
+        f"Интервалы: {' '.join(str(value // 60) for value in policy.intervals)}\n"
+        f"Множитель: {policy.backoff:g}\n"
+        f"Максимум: {policy.max_interval // 60}\n"
+        f"Лимит: {policy.max_attempts}\n"
+        f"Тихие часы: {quiet_hours}\n"
+        f"Часовой пояс: {policy.timezone}"
+    )
+
+
+def parse_reminder_policy(text: str) -> dict:
+    """
+    Разбирает строки настройки «Название: значение» (см. format_reminder_policy)
+
+    Returns:
+        dict: Поля политики из сообщения
+
+    Raises:
+        ValueError: Неизвестная строка или некорректное значение
+    """
+    policy = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        name, separator, value = line.partition(':')
+        field = POLICY_FIELDS.get(name.strip().lower())
+        value = value.strip()
+        if not separator or field is None:
+            raise ValueError(f"Неизвестная строка: {line.strip()}")
+        try:
+            if field == 'intervals':
+                policy[field] = [int(float(item) * 60) for item in value.replace(',', ' ').split()]
+            elif field == 'backoff':
+                policy[field] = float(value.replace(',', '.'))
+            elif field == 'max_interval':
+                policy[field] = int(float(value.replace(',', '.')) * 60)
+            elif field == 'max_attempts':
+                policy[field] = int(value)
+            elif field == 'quiet_hours':
+                policy[field] = None if value.lower() in ('нет', '-') else [int(hour) for hour in value.split('-')]
+            else:
+                policy[field] = value
+        except ValueError:
+            raise ValueError(f"Некорректное значение: {line.strip()}")
+    if not policy:
+        raise ValueError("Нет ни одной строки настройки")
+    return policy
+
+
+async def setup_reminder_management_handlers(router: Router):
+    """Настройка обработчиков настройки напоминаний"""
+    
+    @router.callback_query(F.data.startswith("reminder_policy_"))
+    async def reminder_policy_menu(callback: CallbackQuery, state: FSMContext):
+        """Текущая политика напоминаний бота и запрос новой"""
+        bot_id = int(callback.data.replace("reminder_policy_", ""))
+        
+        # Проверяем права доступа
+        bot = await get_bot_by_id(bot_id, callback.from_user.id)
+        if not bot:
+            await callback.answer("❌ Бот не найден", show_alert=True)
+            return
+        
+        await state.update_data(reminder_policy_bot_id=bot_id)
+        policy = ReminderPolicy.from_json(await get_bot_reminder_policy(bot_id))
+        
+        await callback.message.answer(
+            f"🔔 <b>Напоминания неподписавшимся</b>\n\n"
+            f"🤖 Бот: {bot[3]} (@{bot[2]})\n\n"
+            f"<code>{format_reminder_policy(policy)}</code>\n\n"
+            f"• Интервалы - задержки перед 1-м, 2-м, 3-м... напоминанием (минуты)\n"
+            f"• Множитель - рост задержки после последнего интервала (не меньше 1)\n"
+            f"• Максимум - самая большая задержка (минуты)\n"
+            f"• Лимит - сколько всего напоминаний отправить (не меньше 1)\n"
+            f"• Тихие часы - когда не напоминать, например 23-9 или «нет»\n"
+            f"• Часовой пояс тихих часов - например Europe/Moscow или +3\n\n"
+            f"Отправьте строки, которые нужно изменить, в том же формате.\n"
+            f"<i>Чтобы вернуть настройки по умолчанию, отправьте \"-\"</i>",
+            reply_markup=get_back_to_bot_keyboard(bot_id),
+            parse_mode="HTML"
+        )
+        
+        await state.set_state(EditReminderPolicy.waiting_for_policy)
+        await callback.answer()
+
+    @router.message(EditReminderPolicy.waiting_for_policy)
+    async def process_reminder_policy(message: Message, state: FSMContext):
+        """Обработка новой политики напоминаний"""
+        data = await state.get_data()
+        bot_id = data.get('reminder_policy_bot_id')
+        text = (message.text or "").strip()
+        
+        try:
+            if text == '-':
+                policy = None
+            else:
+                # Строки, которых нет в сообщении, остаются прежними
+                current = ReminderPolicy.from_json(await get_bot_reminder_policy(bot_id))
+                policy = parse_reminder_policy(format_reminder_policy(current))
+                policy.update(parse_reminder_policy(text))
+            
+            if not await set_bot_reminder_policy(bot_id, message.from_user.id, policy):
+                await message.answer("❌ Бот не найден")
+                await state.clear()
+                return
+        except ValueError as e:
+            await message.answer(
+                f"❌ {e}\n\nИсправьте и отправьте снова или вернитесь к боту.",
+                reply_markup=get_back_to_bot_keyboard(bot_id)
+            )
+            return
+        except Exception as e:
+            logging.error(f"❌ Ошибка при обновлении политики напоминаний: {e}")
+            await message.answer(
+                "❌ Произошла ошибка при обновлении напоминаний.",
+                reply_markup=get_back_to_bot_keyboard(bot_id)
+            )
+            await state.clear()
+            return
+        
+        policy = ReminderPolicy.from_json(await get_bot_reminder_policy(bot_id))
+        await message.answer(
+            f"✅ Напоминания обновлены!\n\n<code>{format_reminder_policy(policy)}</code>",
+            reply_markup=get_back_to_bot_keyboard(bot_id),
+            parse_mode="HTML"
+        )
+        await state.clear()
@@ -0,0 +1,105 @@
+"""
+main_bot/image_processing.py
+Подготовка изображений ботов при загрузке: уменьшение, очистка метаданных, сжатие
+"""
+
+import asyncio
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+from config import (
+    BOT_IMAGE_MAX_SIDE, BOT_IMAGE_TARGET_BYTES, BOT_IMAGE_FORMAT, BOT_IMAGE_MAX_INPUT_BYTES
+)
+
+# Качество сжатия по убыванию: берется первое, при котором файл укладывается в BOT_IMAGE_TARGET_BYTES
+QUALITY_STEPS = (85, 75, 65, 55, 45)
+IMAGE_WORKERS = 2
+
+_executor = None
+
+
+class ImageTooLargeError(ValueError):
+    """Исходное изображение больше BOT_IMAGE_MAX_INPUT_BYTES"""
+
+
+class LimitedBuffer(io.BytesIO):
+    """Буфер для скачивания: прерывает загрузку, как только данных больше лимита"""
+
+    def __init__(self, limit: int = BOT_IMAGE_MAX_INPUT_BYTES):
+        super().__init__()
+        self.limit = limit
+
+    def write(self, data) -> int:
+        if self.tell() + len(data) > self.limit:
+            raise ImageTooLargeError(f"Изображение больше {self.limit // (1024 * 1024)} МБ")
+        return super().write(data)
+
+
+class ImageProcessingError(ValueError):
+    """Изображение не удалось декодировать или пережать"""
+
+
+def _encode(image, fmt: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == 'WEBP':
+        image.save(buffer, 'WEBP', quality=quality, method=6)
+    else:
+        image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def _process_image(data: bytes) -> tuple:
+    """Декодирует, уменьшает и пережимает изображение (выполняется в пуле потоков)"""
+    fmt = 'WEBP' if BOT_IMAGE_FORMAT == 'WEBP' else 'JPEG'
+    with Image.open(io.BytesIO(data)) as source:
+        # JPEG декодируется сразу в уменьшенном масштабе
+        source.draft('RGB', (BOT_IMAGE_MAX_SIDE, BOT_IMAGE_MAX_SIDE))
+        # Поворот из EXIF применяется до того, как метаданные будут отброшены
+        image = ImageOps.exif_transpose(source)
+        image.thumbnail((BOT_IMAGE_MAX_SIDE, BOT_IMAGE_MAX_SIDE), Image.LANCZOS)
+
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            if fmt == 'JPEG':
+                # У JPEG нет прозрачности - кладем на белый фон
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+    for quality in QUALITY_STEPS:
+        encoded = _encode(image, fmt, quality)
+        if len(encoded) <= BOT_IMAGE_TARGET_BYTES:
+            break
+    return encoded, '.webp' if fmt == 'WEBP' else '.jpg'
+
+
+async def process_image(data: bytes, file_ext: str) -> tuple:
+    """
+    Готовит изображение бота к отправке в Telegram
+
+    Args:
+        data: Исходный файл
+        file_ext: Расширение исходного файла
+
+    Returns:
+        tuple: (данные, расширение)
+
+    Raises:
+        ImageProcessingError: Файл не удалось декодировать или пережать
+    """
+    global _executor
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image")
+    try:
+        processed, ext = await asyncio.get_running_loop().run_in_executor(_executor, _process_image, data)
+    except Exception as e:
+        # Исходный файл не сохраняем: его размер и метаданные не проверены
+        logging.warning(f"⚠️ Не удалось обработать изображение ({file_ext}): {e}")
+        raise ImageProcessingError(f"Не удалось обработать изображение: {e}") from e
+
+    logging.info(f"🗜️ Изображение сжато: {len(data) // 1024} КБ → {len(processed) // 1024} КБ")
+    return processed, ext
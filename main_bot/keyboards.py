@@ -79,6 +79,10 @@ def get_bot_management_keyboard(bot_id: int):
             InlineKeyboardButton(text="🖼️ Прикрепить изображение", callback_data=f"attach_image_{bot_id}"),
             InlineKeyboardButton(text="📅 Дата рассылки", callback_data=f"material_date_{bot_id}")
         ],
+        [
+            InlineKeyboardButton(text="📊 Доставка материалов", callback_data=f"delivery_stats_{bot_id}"),
+            InlineKeyboardButton(text="🔔 Напоминания", callback_data=f"reminder_policy_{bot_id}")
+        ],
         # Файл временно закомментирован
         # [
         #     InlineKeyboardButton(text="📎 Файл", callback_data=f"edit_file_{bot_id}")
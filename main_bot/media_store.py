@@ -0,0 +1,269 @@
+"""
+main_bot/media_store.py
+Общее хранилище изображений ботов по SHA-256 содержимого, индекс файлов медиа
+в памяти и сборка мусора. Файловые операции выполняются в небольшом пуле потоков,
+чтобы не останавливать общий event loop всех ботов.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Файл хранится один раз, сколько бы ботов его ни использовали: имя файла -
+# SHA-256 содержимого, ссылки на него - bots.image_filename
+MEDIA_BASE = "media"
+BLOBS_DIR = f"{MEDIA_BASE}/blobs"
+# Файл моложе этого (секунды) не удаляется: его могли только что сохранить,
+# а имя еще не записано в bots.image_filename
+BLOB_GRACE_PERIOD = 3600
+
+# Потоки для файловых операций медиа
+MEDIA_IO_WORKERS = 2
+
+_BLOB_RE = re.compile(r'^[0-9a-f]{64}\.[0-9a-z]+$')
+_gc_task = None
+_io_executor = None
+# Индекс ведет каждый процесс сам: файлы, сохраненные или удаленные другим
+# процессом-шардом, он не видит. Поэтому попадание в индекс - только подсказка,
+# перед загрузкой файла с диска его наличие проверяет check_media_file
+_index = None  # set путей существующих файлов медиа; None - еще не загружен
+_index_lock = asyncio.Lock()
+
+
+def is_blob_filename(filename: str) -> bool:
+    """Имя файла из общего хранилища (иначе - старый файл в папке бота)"""
+    return bool(filename) and _BLOB_RE.match(filename) is not None
+
+
+def get_blob_path(filename: str) -> str:
+    """Путь к файлу хранилища: media/blobs/ab/abcd...ext"""
+    return f"{BLOBS_DIR}/{filename[:2]}/{filename}"
+
+
+async def run_media_io(func, *args):
+    """Выполняет блокирующую файловую операцию в пуле потоков медиа"""
+    global _io_executor
+    if _io_executor is None:
+        _io_executor = ThreadPoolExecutor(max_workers=MEDIA_IO_WORKERS, thread_name_prefix="media")
+    return await asyncio.get_running_loop().run_in_executor(_io_executor, func, *args)
+
+
+def _scan(directories: tuple) -> set:
+    """Пути всех файлов в папках медиа (выполняется в потоке)"""
+    paths = set()
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            paths.update(os.path.join(root, name) for name in files)
+    return paths
+
+
+async def _get_index() -> set:
+    """Индекс файлов медиа: загружается с диска один раз, дальше обновляется при записи и удалении"""
+    global _index
+    if _index is None:
+        async with _index_lock:
+            if _index is None:
+                from .file_utils import BOT_IMAGES_DIR
+                _index = await run_media_io(_scan, (BLOBS_DIR, BOT_IMAGES_DIR))
+                logging.info(f"🗂️ Индекс медиа загружен: {len(_index)} файлов")
+    return _index
+
+
+def index_media_file(path: str):
+    """Отмечает в индексе, что файл записан"""
+    if _index is not None:
+        _index.add(path)
+
+
+def unindex_media_file(path: str):
+    """Отмечает в индексе, что файл удален"""
+    if _index is not None:
+        _index.discard(path)
+
+
+async def media_exists(path: str) -> bool:
+    """
+    Есть ли файл медиа: по индексу в памяти, а файла, которого в индексе нет,
+    - на диске в пуле потоков (его мог сохранить другой процесс)
+    """
+    index = await _get_index()
+    if path in index:
+        return True
+    return await check_media_file(path)
+
+
+async def check_media_file(path: str) -> bool:
+    """Проверяет файл на диске (в пуле потоков) и исправляет по результату индекс"""
+    exists = await run_media_io(os.path.isfile, path)
+    if exists:
+        index_media_file(path)
+    else:
+        unindex_media_file(path)
+    return exists
+
+
+async def save_blob(data: bytes, ext: str, original: bytes = None, original_ext: str = "") -> str:
+    """
+    Сохраняет файл в хранилище (если такого содержимого там еще нет)
+
+    Args:
+        data: Содержимое файла
+        ext: Расширение файла
+        original: Исходный файл, из которого получен data (хранится рядом)
+        original_ext: Расширение исходного файла
+
+    Returns:
+        str: Имя файла в хранилище (для bots.image_filename)
+    """
+    filename = await run_media_io(_save_blob, data, ext, original, original_ext)
+    index_media_file(get_blob_path(filename))
+    return filename
+
+
+def _save_blob(data: bytes, ext: str, original: bytes, original_ext: str) -> str:
+    digest = hashlib.sha256(data).hexdigest()
+    filename = f"{digest}{(ext or '.jpg').lower()}"
+    path = get_blob_path(filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    if os.path.exists(path):
+        # Такое изображение уже есть у другого бота: обновляем время, чтобы
+        # сборщик мусора не удалил файл до того, как на него сошлется этот бот
+        os.utime(path)
+        logging.info(f"♻️ Изображение {filename[:12]} уже есть в хранилище")
+    else:
+        _write_atomic(path, data)
+
+    if original is not None:
+        original_path = f"{os.path.dirname(path)}/{digest}.orig{original_ext.lower()}"
+        if not os.path.exists(original_path):
+            _write_atomic(original_path, original)
+    return filename
+
+
+def _write_atomic(path: str, data: bytes):
+    """Запись через временный файл: читатели не видят недописанный файл"""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _blob_files(filename: str) -> list:
+    """Файл хранилища и его исходник"""
+    directory = os.path.dirname(get_blob_path(filename))
+    digest = filename.split('.', 1)[0]
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, name) for name in os.listdir(directory) if name.startswith(digest)]
+
+
+async def delete_blob(filename: str) -> bool:
+    """
+    Удаляет файл хранилища, на который больше не ссылается ни один бот.
+    Недавно сохраненные файлы оставляет сборщику мусора.
+    """
+    removed = await run_media_io(_delete_blob, filename)
+    if removed:
+        unindex_media_file(get_blob_path(filename))
+    return removed
+
+
+def _delete_blob(filename: str) -> bool:
+    path = get_blob_path(filename)
+    try:
+        if not os.path.exists(path) or time.time() - os.path.getmtime(path) < BLOB_GRACE_PERIOD:
+            return False
+        for file_path in _blob_files(filename):
+            os.remove(file_path)
+        logging.info(f"🗑️ Удалено изображение из хранилища: {filename}")
+        return True
+    except Exception as e:
+        logging.error(f"❌ Ошибка удаления изображения из хранилища: {e}")
+        return False
+
+
+def _collect(referenced: set, bot_images: dict, bot_images_dir: str) -> list:
+    """Удаляет файлы без ссылок и папки удаленных ботов (выполняется в потоке)"""
+    removed = []
+    now = time.time()
+
+    def is_stale(path: str) -> bool:
+        return now - os.path.getmtime(path) >= BLOB_GRACE_PERIOD
+
+    # Общее хранилище: файл жив, пока на него (или на файл с тем же хэшем) есть ссылка
+    referenced_digests = {name.split('.', 1)[0] for name in referenced if is_blob_filename(name)}
+    if os.path.isdir(BLOBS_DIR):
+        for prefix in os.listdir(BLOBS_DIR):
+            directory = os.path.join(BLOBS_DIR, prefix)
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if name.split('.', 1)[0] not in referenced_digests and is_stale(path):
+                    os.remove(path)
+                    removed.append(path)
+            if not os.listdir(directory):
+                os.rmdir(directory)
+
+    # Старые папки bot_{id}: удаленные боты целиком, у остальных - все, кроме текущего изображения
+    if os.path.isdir(bot_images_dir):
+        for name in os.listdir(bot_images_dir):
+            directory = os.path.join(bot_images_dir, name)
+            bot_id = name[4:] if name.startswith("bot_") else ""
+            if not bot_id.isdigit() or not os.path.isdir(directory):
+                continue
+            if int(bot_id) not in bot_images:
+                removed.extend(_scan((directory,)))
+                shutil.rmtree(directory, ignore_errors=True)
+                continue
+            for filename in os.listdir(directory):
+                path = os.path.join(directory, filename)
+                if filename != bot_images[int(bot_id)] and is_stale(path):
+                    os.remove(path)
+                    removed.append(path)
+            if not os.listdir(directory):
+                os.rmdir(directory)
+    return removed
+
+
+async def collect_media_garbage() -> int:
+    """
+    Удаляет изображения, на которые не ссылается ни один бот, и папки удаленных ботов
+
+    Returns:
+        int: Сколько файлов удалено
+    """
+    from database import get_bot_image_filenames
+    from .file_utils import BOT_IMAGES_DIR
+
+    bot_images = await get_bot_image_filenames()
+    referenced = {filename for filename in bot_images.values() if filename}
+    removed = await run_media_io(_collect, referenced, bot_images, BOT_IMAGES_DIR)
+    for path in removed:
+        unindex_media_file(path)
+    if removed:
+        logging.info(f"🧹 Сборка мусора медиа: удалено файлов {len(removed)}")
+    return len(removed)
+
+
+async def _gc_loop(interval_hours: int):
+    while True:
+        try:
+            await collect_media_garbage()
+        except Exception as e:
+            logging.error(f"❌ Ошибка сборки мусора медиа: {e}")
+        await asyncio.sleep(interval_hours * 3600)
+
+
+def start_media_gc():
+    """Запускает периодическую сборку мусора медиа (MEDIA_GC_INTERVAL_HOURS, 0 - отключена)"""
+    global _gc_task
+    from config import MEDIA_GC_INTERVAL_HOURS
+    if MEDIA_GC_INTERVAL_HOURS <= 0:
+        return
+    if _gc_task is None or _gc_task.done():
+        _gc_task = asyncio.create_task(_gc_loop(MEDIA_GC_INTERVAL_HOURS))
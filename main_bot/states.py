@@ -31,3 +31,7 @@ class AttachImage(StatesGroup):
 
 class MaterialDateManagement(StatesGroup):
     waiting_for_custom_date = State()
+
+class EditReminderPolicy(StatesGroup):
+    """Состояния для настройки напоминаний"""
+    waiting_for_policy = State()
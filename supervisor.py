@@ -0,0 +1,373 @@
+# supervisor.py
+"""
+Супервизор процессов-шардов для рабочих ботов.
+
+В режиме супервизора (WORKER_SHARDS > 0) основной процесс держит основной бот,
+мониторинг платежей и вебхук сервер, а рабочие боты распределяются по N
+дочерним процессам по консистентному хешу bot_id. Команды start/stop/reload
+передаются шарду-владельцу через Unix-сокет (одна JSON-строка на запрос).
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import os
+import sys
+
+from config import WORKER_SHARDS, SHARD_SOCKET_DIR
+
+# Количество виртуальных узлов шарда на кольце (равномерность распределения)
+SHARD_VIRTUAL_NODES = 64
+
+# Перезапуск упавшего шарда: начальная и максимальная задержка (секунды)
+SHARD_RESTART_DELAY = 2.0
+SHARD_RESTART_MAX_DELAY = 60.0
+
+# Сколько ждать готовности шарда после запуска (секунды)
+SHARD_READY_TIMEOUT = 30.0
+
+# Таймаут одной IPC-команды (запуск бота может занять несколько секунд)
+SHARD_COMMAND_TIMEOUT = 60.0
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+
+# Экземпляр супервизора в текущем процессе (только в основном процессе)
+_supervisor = None
+
+
+def get_shard_socket_path(shard_index: int) -> str:
+    """Возвращает путь к Unix-сокету шарда"""
+    return os.path.join(SHARD_SOCKET_DIR, f"shard_{shard_index}.sock")
+
+
+class ShardRing:
+    """Консистентное хеш-кольцо: bot_id -> номер шарда"""
+
+    def __init__(self, shard_indexes=(), virtual_nodes: int = SHARD_VIRTUAL_NODES):
+        self.virtual_nodes = virtual_nodes
+        self._points = []  # отсортированные хеши виртуальных узлов
+        self._owners = {}  # {hash: shard_index}
+        for shard_index in shard_indexes:
+            self.add(shard_index)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+    def add(self, shard_index: int):
+        """Добавляет шард на кольцо"""
+        for vnode in range(self.virtual_nodes):
+            point = self._hash(f"shard-{shard_index}-{vnode}")
+            if point not in self._owners:
+                bisect.insort(self._points, point)
+            self._owners[point] = shard_index
+
+    def remove(self, shard_index: int):
+        """Убирает шард с кольца"""
+        for vnode in range(self.virtual_nodes):
+            point = self._hash(f"shard-{shard_index}-{vnode}")
+            if self._owners.get(point) == shard_index:
+                del self._owners[point]
+                position = bisect.bisect_left(self._points, point)
+                del self._points[position]
+
+    def __contains__(self, shard_index: int) -> bool:
+        return shard_index in self._owners.values()
+
+    def get_shard(self, bot_id: int):
+        """Возвращает шард-владелец бота или None, если живых шардов нет"""
+        if not self._points:
+            return None
+        position = bisect.bisect(self._points, self._hash(f"bot-{bot_id}")) % len(self._points)
+        return self._owners[self._points[position]]
+
+
+async def send_shard_command(shard_index: int, command: str, bot_id: int = None,
+                             timeout: float = SHARD_COMMAND_TIMEOUT) -> dict:
+    """
+    Отправляет команду шарду через Unix-сокет
+
+    Args:
+        shard_index: Номер шарда
+        command: start / stop / reload / ping
+        bot_id: ID бота в базе данных (для команд над ботом)
+        timeout: Таймаут ожидания ответа
+
+    Returns:
+        dict: Ответ шарда, всегда содержит ключ 'ok'
+    """
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_unix_connection(get_shard_socket_path(shard_index)),
+            timeout=5.0
+        )
+        request = {'cmd': command, 'bot_id': bot_id}
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+
+        line = await asyncio.wait_for(reader.readline(), timeout=timeout)
+        if not line:
+            return {'ok': False, 'error': 'empty response'}
+        return json.loads(line)
+
+    except (OSError, asyncio.TimeoutError, json.JSONDecodeError) as e:
+        return {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+    finally:
+        if writer:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+
+# ===== СТОРОНА ШАРДА =====
+
+async def _handle_shard_connection(reader, writer):
+    """Обрабатывает одну команду от супервизора"""
+    from database import get_bot_token_by_id
+    from worker_bot.bot_manager import (
+        start_worker_bot, stop_worker_bot, restart_worker_bot, get_active_worker_bots
+    )
+
+    response = {'ok': False}
+    try:
+        line = await reader.readline()
+        request = json.loads(line) if line else {}
+        command = request.get('cmd')
+        bot_id = request.get('bot_id')
+
+        if command == 'ping':
+            response = {'ok': True, 'bots': get_active_worker_bots()}
+        elif command == 'stop':
+            await stop_worker_bot(bot_id)
+            response = {'ok': True}
+        elif command in ('start', 'reload'):
+            bot_token = await get_bot_token_by_id(bot_id)
+            if not bot_token:
+                response = {'ok': False, 'error': f"bot {bot_id} not found"}
+            elif command == 'start':
+                response = {'ok': bool(await start_worker_bot(bot_token, bot_id))}
+            else:
+                response = {'ok': bool(await restart_worker_bot(bot_token, bot_id))}
+        else:
+            response = {'ok': False, 'error': f"unknown command {command!r}"}
+
+    except Exception as e:
+        logging.error(f"❌ Ошибка обработки IPC-команды: {e}")
+        response = {'ok': False, 'error': str(e)}
+
+    try:
+        writer.write(json.dumps(response).encode() + b"\n")
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve_shard_commands(shard_index: int):
+    """
+    Запускает IPC-сервер шарда на Unix-сокете
+
+    Returns:
+        asyncio.Server: Запущенный сервер
+    """
+    os.makedirs(SHARD_SOCKET_DIR, exist_ok=True)
+    socket_path = get_shard_socket_path(shard_index)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    server = await asyncio.start_unix_server(_handle_shard_connection, path=socket_path)
+    logging.info(f"🔌 Шард {shard_index} слушает команды на {socket_path}")
+    return server
+
+
+# ===== СТОРОНА СУПЕРВИЗОРА =====
+
+class ShardSupervisor:
+    """Запускает процессы-шарды, маршрутизирует команды и перезапускает упавшие шарды"""
+
+    def __init__(self, shards_count: int = WORKER_SHARDS):
+        self.shards_count = shards_count
+        self.ring = ShardRing()  # только живые шарды
+        self._processes = {}  # {shard_index: Process}
+        self._watch_tasks = {}  # {shard_index: task}
+        self._restart_attempts = {}  # {shard_index: attempts}
+        self._assignments = {}  # {bot_id: shard_index} - где бот реально запущен
+        self._desired = set()  # bot_id, которые должны работать (даже если сейчас не размещены)
+        self._lock = asyncio.Lock()
+        self._stopping = False
+
+    async def start(self):
+        """Запускает все шарды и ждет их готовности"""
+        os.makedirs(SHARD_SOCKET_DIR, exist_ok=True)
+        logging.info(f"🧩 Запуск {self.shards_count} шардов рабочих ботов...")
+        await asyncio.gather(*(self._spawn(shard_index) for shard_index in range(self.shards_count)))
+        ready = sum(1 for shard_index in range(self.shards_count) if shard_index in self.ring)
+        logging.info(f"✅ Готово шардов: {ready}/{self.shards_count}")
+
+    async def _spawn(self, shard_index: int):
+        """Запускает процесс шарда и добавляет его на кольцо после готовности"""
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, MAIN_SCRIPT, '--shard', str(shard_index)
+        )
+        self._processes[shard_index] = process
+        self._watch_tasks[shard_index] = asyncio.create_task(self._watch(shard_index, process))
+        logging.info(f"🚀 Шард {shard_index} запущен (pid {process.pid})")
+
+        if not await self._wait_ready(shard_index, process):
+            logging.error(f"❌ Шард {shard_index} не ответил за {SHARD_READY_TIMEOUT} сек, перезапускаем")
+            if process.returncode is None:
+                process.terminate()  # _watch перезапустит процесс
+            return
+
+        self._restart_attempts[shard_index] = 0
+        async with self._lock:
+            self.ring.add(shard_index)
+            await self._rebalance()
+
+    async def _wait_ready(self, shard_index: int, process) -> bool:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + SHARD_READY_TIMEOUT
+        while loop.time() < deadline and process.returncode is None:
+            response = await send_shard_command(shard_index, 'ping', timeout=5.0)
+            if response.get('ok'):
+                return True
+            await asyncio.sleep(0.5)
+        return False
+
+    async def _watch(self, shard_index: int, process):
+        """Ждет завершения процесса шарда и перезапускает его"""
+        return_code = await process.wait()
+        if self._stopping:
+            return
+
+        logging.error(f"💥 Шард {shard_index} завершился с кодом {return_code}, переназначаем его ботов")
+
+        async with self._lock:
+            if shard_index in self.ring:
+                self.ring.remove(shard_index)
+            orphaned = [bot_id for bot_id, owner in self._assignments.items() if owner == shard_index]
+            for bot_id in orphaned:
+                del self._assignments[bot_id]
+                # Если живых шардов нет или запуск не удался, бот остается в _desired
+                # и будет запущен при следующем _rebalance (после перезапуска шарда)
+                await self._start_on_owner(bot_id)
+
+        attempts = self._restart_attempts.get(shard_index, 0)
+        self._restart_attempts[shard_index] = attempts + 1
+        delay = min(SHARD_RESTART_DELAY * (2 ** attempts), SHARD_RESTART_MAX_DELAY)
+        logging.info(f"🔄 Перезапуск шарда {shard_index} через {delay:.0f} сек")
+        await asyncio.sleep(delay)
+
+        if not self._stopping:
+            await self._spawn(shard_index)
+
+    async def _start_on_owner(self, bot_id: int) -> bool:
+        """Запускает бота на шарде-владельце (вызывать под self._lock)"""
+        shard_index = self.ring.get_shard(bot_id)
+        if shard_index is None:
+            logging.error(f"❌ Нет живых шардов для запуска бота {bot_id}")
+            return False
+
+        response = await send_shard_command(shard_index, 'start', bot_id)
+        if response.get('ok'):
+            self._assignments[bot_id] = shard_index
+            logging.info(f"▶️ Бот {bot_id} запущен на шарде {shard_index}")
+            return True
+
+        logging.error(f"❌ Шард {shard_index} не запустил бота {bot_id}: {response.get('error')}")
+        return False
+
+    async def _rebalance(self):
+        """
+        Переносит ботов, чей владелец на кольце изменился, и запускает
+        неразмещенных ботов из _desired (вызывать под self._lock)
+        """
+        for bot_id, current in list(self._assignments.items()):
+            owner = self.ring.get_shard(bot_id)
+            if owner is None or owner == current:
+                continue
+            if current in self.ring:
+                await send_shard_command(current, 'stop', bot_id)
+            del self._assignments[bot_id]
+            await self._start_on_owner(bot_id)
+
+        unplaced = [bot_id for bot_id in self._desired if bot_id not in self._assignments]
+        if unplaced and self.ring.get_shard(unplaced[0]) is not None:
+            logging.info(f"🔁 Запуск неразмещенных ботов: {len(unplaced)}")
+            for bot_id in unplaced:
+                await self._start_on_owner(bot_id)
+
+    async def start_bot(self, bot_id: int) -> bool:
+        """Запускает (или перезапускает) бота на шарде-владельце"""
+        async with self._lock:
+            self._desired.add(bot_id)
+            current = self._assignments.get(bot_id)
+            owner = self.ring.get_shard(bot_id)
+            if current is not None and current != owner and current in self.ring:
+                await send_shard_command(current, 'stop', bot_id)
+                del self._assignments[bot_id]
+            return await self._start_on_owner(bot_id)
+
+    async def stop_bot(self, bot_id: int):
+        """Останавливает бота на шарде, где он запущен"""
+        async with self._lock:
+            self._desired.discard(bot_id)
+            shard_index = self._assignments.pop(bot_id, None)
+            if shard_index is None:
+                shard_index = self.ring.get_shard(bot_id)
+            if shard_index is None:
+                return
+            response = await send_shard_command(shard_index, 'stop', bot_id)
+            if not response.get('ok'):
+                logging.warning(f"⚠️ Шард {shard_index} не остановил бота {bot_id}: {response.get('error')}")
+
+    async def reload_bot(self, bot_id: int) -> bool:
+        """Перезапускает бота на его шарде с актуальными данными из БД"""
+        async with self._lock:
+            self._desired.add(bot_id)
+            shard_index = self._assignments.get(bot_id)
+            if shard_index is None or shard_index not in self.ring:
+                return await self._start_on_owner(bot_id)
+            response = await send_shard_command(shard_index, 'reload', bot_id)
+            return bool(response.get('ok'))
+
+    def is_bot_running(self, bot_id: int) -> bool:
+        return bot_id in self._assignments
+
+    def get_running_bots(self) -> list:
+        return list(self._assignments.keys())
+
+    async def stop(self):
+        """Останавливает все шарды"""
+        self._stopping = True
+        for task in self._watch_tasks.values():
+            task.cancel()
+
+        for shard_index, process in self._processes.items():
+            if process.returncode is None:
+                process.terminate()
+
+        for shard_index, process in self._processes.items():
+            try:
+                await asyncio.wait_for(process.wait(), timeout=15.0)
+            except asyncio.TimeoutError:
+                logging.warning(f"⚠️ Шард {shard_index} не завершился, принудительная остановка")
+                process.kill()
+
+        self._assignments.clear()
+        logging.info("✅ Все шарды остановлены")
+
+
+def get_supervisor():
+    """Возвращает супервизор шардов, если процесс работает в режиме супервизора"""
+    return _supervisor
+
+
+def set_supervisor(supervisor):
+    """Регистрирует супервизор шардов для текущего процесса"""
+    global _supervisor
+    _supervisor = supervisor
@@ -0,0 +1,18 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# config.py требует BOT_TOKEN при импорте
+os.environ.setdefault('BOT_TOKEN', '1:test')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Пустая база subscription_bot.db во временной папке"""
+    monkeypatch.chdir(tmp_path)
+    import database
+    asyncio.run(database.init_db())
+    return tmp_path
@@ -0,0 +1,97 @@
+"""
+Остановка и спящий режим рабочего бота: запись освобождается в нужном состоянии,
+даже если polling завершается раньше, чем _stop_entry дойдет до его задачи
+"""
+
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from aiogram.methods import GetUpdates
+from aiogram.types import Chat, Message, Update
+
+import worker_bot.bot_manager as bot_manager
+import worker_bot.polling as polling
+from worker_bot.registry import bot_registry, BotState
+
+
+class FakeBot:
+    """Бот с одним апдейтом; подтверждение апдейтов при остановке идет по сети"""
+
+    def __init__(self, telegram_id: int):
+        self.id = telegram_id
+        self.token = f'{telegram_id}:test'
+        self.session = SimpleNamespace(timeout=1)
+        self.confirmed = None
+
+    async def __call__(self, method, request_timeout=None):
+        assert isinstance(method, GetUpdates)
+        if method.offset is None:
+            chat = Chat(id=1, type='private')
+            message = Message(message_id=1, date=datetime.now(), chat=chat, text='/start')
+            return [Update(update_id=1, message=message)]
+        if method.timeout:
+            await asyncio.sleep(3600)  # long polling без новых апдейтов
+            return []
+        # Последний getUpdates при остановке ждет ответа сети:
+        # за это время задача _run_polling успевает завершиться
+        await asyncio.sleep(0.05)
+        self.confirmed = method.offset
+        return []
+
+
+async def _start(bot_id: int):
+    bot = FakeBot(1000 + bot_id)
+    entry = bot_registry.ensure(bot_id)
+    bot_registry.bind(entry, bot, None)
+    entry.task = asyncio.create_task(bot_manager._run_polling(entry))
+    entry.state = BotState.RUNNING
+    for _ in range(100):
+        await asyncio.sleep(0.01)
+        queue = polling._update_queues.get(bot_id)
+        if queue is not None and queue.processed:
+            break
+    return entry, bot
+
+
+async def _process_update(bot, bot_id, update):
+    pass
+
+
+def test_stop_releases_entry(db, monkeypatch):
+    monkeypatch.setattr(polling, '_process_update', _process_update)
+
+    async def scenario():
+        entry, bot = await _start(1)
+        await bot_manager.stop_worker_bot(1)
+        assert bot.confirmed == 2
+        assert entry.task is None
+        assert entry.state == BotState.STOPPED
+        assert bot_registry.get(1) is None
+        assert not bot_manager.is_worker_bot_running(1)
+
+    asyncio.run(scenario())
+
+
+def test_hibernate_keeps_token(db, monkeypatch):
+    monkeypatch.setattr(polling, '_process_update', _process_update)
+    monkeypatch.setattr(bot_manager, '_ensure_dormant_poller', lambda: None)
+
+    async def scenario():
+        entry, bot = await _start(2)
+        await bot_manager.hibernate_worker_bot(2)
+        assert bot.confirmed == 2
+        assert bot_registry.get(2) is entry
+        assert entry.state == BotState.DORMANT
+        assert entry.task is None and entry.bot is None
+        assert entry.token == bot.token
+        # Опрос спящего бота начинается после подтвержденных апдейтов
+        assert entry.update_offset == 2
+        assert bot_manager.is_worker_bot_dormant(2)
+        assert bot_registry.get_by_telegram_id(bot.id) is None
+
+        # Явная остановка спящего бота убирает его из реестра
+        await bot_manager.stop_worker_bot(2)
+        assert bot_registry.get(2) is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,25 @@
+"""
+Подготовка изображений: файл, который не удалось декодировать, не сохраняется как есть
+"""
+
+import asyncio
+import io
+
+import pytest
+from PIL import Image
+
+from main_bot.image_processing import ImageProcessingError, process_image
+
+
+def test_undecodable_image_is_rejected():
+    with pytest.raises(ImageProcessingError):
+        asyncio.run(process_image(b'not an image', '.jpg'))
+
+
+def test_image_is_reencoded():
+    buffer = io.BytesIO()
+    Image.new('RGBA', (64, 64), (255, 0, 0, 128)).save(buffer, 'PNG')
+    data, ext = asyncio.run(process_image(buffer.getvalue(), '.png'))
+    assert ext in ('.jpg', '.webp')
+    with Image.open(io.BytesIO(data)) as image:
+        assert image.size == (64, 64)
@@ -0,0 +1,137 @@
+"""
+Рассылка материалов из очереди material_deliveries: итоги отправок пишутся
+контрольными точками, прерванная рассылка продолжается с неотправленных получателей,
+временные ошибки повторяются, окончательные попадают в dead letter
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import aiosqlite
+import pytest
+
+import database
+import worker_bot.core as core
+import worker_bot.material_delivery as delivery
+
+RECIPIENTS = 30
+
+
+@pytest.fixture
+def bot_id(db):
+    async def setup():
+        bot_id = await database.add_bot_to_db('1:materials', 'materials_bot', 'Materials', 100)
+        now = time.time()
+        for user_id in range(1, RECIPIENTS + 1):
+            await database.add_material_delivery(bot_id, user_id, now - 1, 'release')
+        return bot_id
+
+    return asyncio.run(setup())
+
+
+async def _statuses(bot_id: int) -> dict:
+    async with aiosqlite.connect('subscription_bot.db') as db:
+        cursor = await db.execute(
+            'SELECT user_id, status, attempts FROM material_deliveries WHERE bot_id = ?', (bot_id,)
+        )
+        return {user_id: (status, attempts) for user_id, status, attempts in await cursor.fetchall()}
+
+
+def test_queue_keeps_one_delivery_per_release(bot_id):
+    async def scenario():
+        now = time.time()
+        await database.add_material_delivery(bot_id, RECIPIENTS + 1, now + 3600, 'release')
+        due = await database.get_bot_due_material_deliveries(bot_id, now, limit=1000)
+        assert [user_id for user_id, _ in due] == list(range(1, RECIPIENTS + 1))
+
+        # Получившему материалы этой даты рассылки повторно не отправляем
+        await database.save_material_broadcast_progress(None, [('sent', bot_id, 1)], [], [], [], 0, 0, 0)
+        await database.add_material_delivery(bot_id, 1, now - 1, 'release')
+        assert (await _statuses(bot_id))[1] == ('sent', 1)
+        # Новая дата рассылки - новая отправка
+        await database.add_material_delivery(bot_id, 1, now - 1, 'next release')
+        assert (await _statuses(bot_id))[1] == ('pending', 0)
+
+        # Очистка даты отменяет ожидающие отправки, новая дата возвращает их в очередь
+        await database.clear_material_sent_date(bot_id)
+        assert {status for status, _ in (await _statuses(bot_id)).values()} == {'cancelled'}
+        release = datetime.now() + timedelta(hours=1)
+        await database.update_material_sent_date_custom(bot_id, 100, release)
+        statuses = await _statuses(bot_id)
+        assert {status for status, _ in statuses.values()} == {'pending'}
+        assert await database.get_bot_due_material_deliveries(bot_id, now) == []
+
+    asyncio.run(scenario())
+
+
+def test_interrupted_broadcast_resumes(bot_id, monkeypatch):
+    sent = []
+    stuck = asyncio.Event()
+
+    async def send_stuck(bot_id, user_id):
+        if user_id > 5:
+            stuck.set()
+            await asyncio.sleep(3600)  # бот остановлен посреди рассылки
+        sent.append(user_id)
+        return 'sent', None
+
+    async def send(bot_id, user_id):
+        sent.append(user_id)
+        return 'sent', None
+
+    async def scenario():
+        monkeypatch.setattr(core, 'send_scheduled_materials', send_stuck)
+        task = delivery._broadcasts[bot_id] = asyncio.create_task(delivery._run_broadcast(bot_id, RECIPIENTS))
+        await asyncio.wait_for(stuck.wait(), 5)
+        await asyncio.sleep(0.05)
+        await delivery.cancel_material_broadcast(bot_id)
+        assert task.cancelled()
+
+        # Контрольная точка при отмене сохранила уже отправленное
+        statuses = await _statuses(bot_id)
+        assert sorted(user_id for user_id, (status, _) in statuses.items() if status == 'sent') == [1, 2, 3, 4, 5]
+        assert all(statuses[user_id] == ('pending', 0) for user_id in range(6, RECIPIENTS + 1))
+
+        # Следующий запуск отправляет только остальным и продолжает счетчики
+        monkeypatch.setattr(core, 'send_scheduled_materials', send)
+        await delivery._run_broadcast(bot_id, RECIPIENTS - 5)
+        assert sorted(sent) == list(range(1, RECIPIENTS + 1))
+        assert all(status == ('sent', 1) for status in (await _statuses(bot_id)).values())
+
+        async with aiosqlite.connect('subscription_bot.db') as db:
+            cursor = await db.execute('SELECT status, sent FROM material_broadcasts WHERE bot_id = ?', (bot_id,))
+            assert await cursor.fetchall() == [('done', RECIPIENTS)]
+
+    asyncio.run(scenario())
+
+
+def test_failed_deliveries_are_retried_or_dead_lettered(bot_id, monkeypatch):
+    async def send(bot_id, user_id):
+        if user_id == 1:
+            return 'transient_error', 'timeout'
+        if user_id == 2:
+            return 'forbidden', 'bot was blocked by the user'
+        return 'sent', None
+
+    async def scenario():
+        monkeypatch.setattr(core, 'send_scheduled_materials', send)
+        now = time.time()
+        await delivery._run_broadcast(bot_id, RECIPIENTS)
+
+        statuses = await _statuses(bot_id)
+        assert statuses[1] == ('pending', 1)
+        assert statuses[2] == ('dead', 1)
+        async with aiosqlite.connect('subscription_bot.db') as db:
+            cursor = await db.execute('SELECT due_at FROM material_deliveries WHERE bot_id = ? AND user_id = 1', (bot_id,))
+            (due_at,), = await cursor.fetchall()
+            cursor = await db.execute('SELECT user_id, outcome, attempts FROM material_dead_letters')
+            dead_letters = await cursor.fetchall()
+        # Повтор временной ошибки - через MATERIAL_RETRY_DELAY
+        assert due_at >= now + delivery.MATERIAL_RETRY_DELAY
+        assert dead_letters == [(2, 'forbidden', 1)]
+
+        summary = await database.get_material_delivery_summary(bot_id)
+        assert summary['dead_letters'] == {'forbidden': 1}
+
+    asyncio.run(scenario())
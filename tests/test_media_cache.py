@@ -0,0 +1,90 @@
+"""
+Кэш file_id изображения бота: file_id, который Telegram больше не принимает,
+забывается, а файл загружается заново
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendPhoto
+from aiogram.types import FSInputFile
+
+import database
+from worker_bot import media_cache
+
+
+def test_rejected_file_id_is_reuploaded(db):
+    image_path = db / 'image.jpg'
+    image_path.write_bytes(b'jpeg')
+    media_hash = media_cache.get_image_media_hash('image.jpg')
+    sent = []
+
+    async def send_photo(file):
+        sent.append(file)
+        if file == 'stale':
+            raise TelegramBadRequest(SendPhoto(chat_id=1, photo=file), 'wrong file identifier/HTTP URL specified')
+        return SimpleNamespace(photo=[SimpleNamespace(file_id='fresh')])
+
+    async def scenario():
+        await media_cache.remember_file_id(1, media_hash, 'stale')
+
+        async with media_cache.image_media(1, str(image_path), 'image.jpg') as media:
+            await media.send(send_photo)
+        assert sent[0] == 'stale'
+        assert isinstance(sent[1], FSInputFile)
+        assert await database.get_media_cache_file_id(1, media_hash) == 'fresh'
+
+        # Следующая отправка - снова по file_id
+        async with media_cache.image_media(1, str(image_path), 'image.jpg') as media:
+            await media.send(send_photo)
+        assert sent[2] == 'fresh'
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        media_cache.forget_bot_media(1)
+
+
+def test_missing_image_is_not_uploaded(db):
+    sent = []
+
+    async def send_photo(file):
+        sent.append(file)
+
+    async def scenario():
+        # Файл удалил другой процесс: загрузка отменяется, вызывающий отправит текст
+        with pytest.raises(FileNotFoundError):
+            async with media_cache.image_media(1, str(db / 'missing.jpg'), 'missing.jpg') as media:
+                await media.send(send_photo)
+        assert not sent
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        media_cache.forget_bot_media(1)
+
+
+def test_reuploaded_owner_file_reuses_file_id(db):
+    sent = []
+
+    async def send_photo(file):
+        sent.append(file)
+        return SimpleNamespace(photo=[SimpleNamespace(file_id='worker')])
+
+    async def scenario():
+        bot_id = await database.add_bot_to_db('1:media', 'media_bot', 'Media', 100)
+        await database.update_bot_file(bot_id, 100, 'first', 'photo', 'unique')
+        await media_cache.remember_file_id(bot_id, await media_cache.resolve_media_hash('first'), 'worker')
+
+        # Владелец загрузил тот же файл заново: file_id другой, file_unique_id тот же
+        await database.update_bot_file(bot_id, 100, 'second', 'photo', 'unique')
+        async with media_cache.worker_media(bot_id, 'second') as media:
+            await media.send(send_photo)
+        assert sent == ['worker']
+        return bot_id
+
+    bot_id = asyncio.run(scenario())
+    media_cache.forget_bot_media(bot_id)
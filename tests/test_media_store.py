@@ -0,0 +1,62 @@
+"""
+Хранилище изображений ботов: одинаковое содержимое хранится один раз,
+сборщик мусора удаляет только файлы, на которые не ссылается ни один бот
+"""
+
+import asyncio
+import os
+
+import database
+import main_bot.media_store as media_store
+
+
+def test_shared_blob_survives_gc_until_unreferenced(db, monkeypatch):
+    monkeypatch.setattr(media_store, '_index', None)
+
+    async def scenario():
+        first = await database.add_bot_to_db('1:first', 'first_bot', 'First', 100)
+        second = await database.add_bot_to_db('2:second', 'second_bot', 'Second', 100)
+
+        shared = await media_store.save_blob(b'shared image', '.jpg', b'original', '.png')
+        assert await media_store.save_blob(b'shared image', '.jpg') == shared
+        orphan = await media_store.save_blob(b'replaced image', '.jpg')
+        await database.update_bot_image(first, 100, shared)
+        await database.update_bot_image(second, 100, shared)
+
+        # Недавно сохраненный файл без ссылок не трогаем: ссылку на него могут еще не записать
+        assert await media_store.collect_media_garbage() == 0
+
+        monkeypatch.setattr(media_store, 'BLOB_GRACE_PERIOD', 0)
+        assert await media_store.collect_media_garbage() == 1
+        assert not await media_store.media_exists(media_store.get_blob_path(orphan))
+        assert await media_store.media_exists(media_store.get_blob_path(shared))
+
+        # Файл удаляется вместе с исходником, когда на него перестает ссылаться последний бот
+        await database.update_bot_image(first, 100, None)
+        assert await media_store.media_exists(media_store.get_blob_path(shared))
+        await database.update_bot_image(second, 100, None)
+        assert not await media_store.media_exists(media_store.get_blob_path(shared))
+        assert not any(files for _, _, files in os.walk(media_store.BLOBS_DIR))
+
+    asyncio.run(scenario())
+
+
+def test_index_is_a_hint_for_other_processes(db, monkeypatch):
+    monkeypatch.setattr(media_store, '_index', None)
+
+    async def scenario():
+        filename = await media_store.save_blob(b'image', '.jpg')
+        path = media_store.get_blob_path(filename)
+        assert await media_store.media_exists(path)
+
+        # Файл удалил другой процесс: индекс этого процесса о нем не знает
+        os.remove(path)
+        assert not await media_store.check_media_file(path)
+        assert not await media_store.media_exists(path)
+
+        # Другой процесс сохранил файл снова: промах перепроверяется на диске
+        with open(path, 'wb') as f:
+            f.write(b'image')
+        assert await media_store.media_exists(path)
+
+    asyncio.run(scenario())
@@ -0,0 +1,51 @@
+"""
+Ограничение частоты апдейтов: сообщения сверх лимита отбрасываются,
+а блокировка и разблокировка бота (my_chat_member) доходят всегда
+"""
+
+import asyncio
+from datetime import datetime
+
+from aiogram.types import Chat, ChatMemberMember, ChatMemberBanned, ChatMemberUpdated, Message, Update, User
+
+from worker_bot.middlewares import ThrottlingMiddleware
+
+USER = User(id=7, is_bot=False, first_name='user')
+CHAT = Chat(id=7, type='private')
+
+
+def make_message(update_id: int):
+    message = Message(message_id=update_id, date=datetime.now(), chat=CHAT, from_user=USER, text=str(update_id))
+    return Update(update_id=update_id, message=message)
+
+
+def make_member_update(update_id: int, blocked: bool):
+    bot_user = User(id=1, is_bot=True, first_name='bot')
+    member = ChatMemberMember(user=bot_user)
+    banned = ChatMemberBanned(user=bot_user, until_date=0)
+    event = ChatMemberUpdated(
+        chat=CHAT, from_user=USER, date=datetime.now(),
+        old_chat_member=member if blocked else banned,
+        new_chat_member=banned if blocked else member,
+    )
+    return Update(update_id=update_id, my_chat_member=event)
+
+
+def test_chat_member_updates_are_not_throttled():
+    middleware = ThrottlingMiddleware(rate=0.001, burst=1)
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event.update_id)
+
+    async def scenario():
+        updates = [
+            make_message(1), make_message(2),
+            make_member_update(3, blocked=True), make_member_update(4, blocked=False),
+        ]
+        for update in updates:
+            await middleware(handler, update, {'bot_id': 1, 'event_from_user': USER})
+
+    asyncio.run(scenario())
+    assert handled == [1, 3, 4]
+    assert middleware.dropped == 1
@@ -0,0 +1,174 @@
+"""
+Очередь апдейтов рабочего бота: получение не останавливается медленным
+обработчиком, необработанные апдейты не теряются, а переполнение очереди
+сбрасывает апдейты с ответом «занято»
+"""
+
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from aiogram.methods import GetUpdates
+from aiogram.types import Chat, Message, Update
+
+import database
+import worker_bot.polling as polling
+
+PENDING = 1000
+BATCH = 100  # Telegram отдает не больше 100 апдейтов за запрос
+
+
+def make_update(update_id: int):
+    chat = Chat(id=update_id, type='private')
+    message = Message(message_id=update_id, date=datetime.now(), chat=chat, text='/start')
+    return Update(update_id=update_id, message=message)
+
+
+class FakeBot:
+    """Бот с PENDING апдейтами на стороне Telegram"""
+
+    def __init__(self):
+        self.session = SimpleNamespace(timeout=1)
+        self.confirmed = 0  # все апдейты ниже этого подтверждены
+        self.busy_replies = []
+        self.requests = 0
+
+    async def __call__(self, method, request_timeout=None):
+        assert isinstance(method, GetUpdates)
+        self.requests += 1
+        offset = method.offset or 1
+        self.confirmed = max(self.confirmed, offset)
+        if offset > PENDING:
+            if method.timeout:
+                await asyncio.sleep(3600)  # long polling без новых апдейтов
+            return []
+        return [make_update(i) for i in range(offset, min(offset + BATCH, PENDING + 1))]
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.busy_replies.append(chat_id)
+
+
+async def _run(bot, bot_id, process_update, queue=None, save_unfinished=False):
+    polling._process_update = process_update
+    if queue is not None:
+        polling._update_queues[bot_id] = queue
+    task = asyncio.create_task(polling.run_worker_polling(bot, bot_id))
+    for _ in range(200):
+        await asyncio.sleep(0.01)
+        if polling._update_queues[bot_id].last_update_id == PENDING:
+            break
+    await asyncio.sleep(0.05)
+    update_queue = polling._update_queues[bot_id]
+    stats = update_queue.get_stats()
+    last_update_id = update_queue.last_update_id
+    await polling.stop_worker_polling(bot_id, timeout=0.1, save_unfinished=save_unfinished)
+    await asyncio.wait_for(task, 1)
+    return stats, last_update_id
+
+
+def test_slow_handler_does_not_stop_fetching(db):
+    original = polling._process_update
+    release = asyncio.Event()
+
+    async def process_update(bot, bot_id, update):
+        if update.update_id == 1:
+            await release.wait()
+
+    async def scenario():
+        bot = FakeBot()
+        try:
+            stats, last_update_id = await _run(bot, 1, process_update)
+        finally:
+            polling._process_update = original
+        assert last_update_id == PENDING
+        assert stats['processed'] == PENDING - 1
+        assert stats['shed'] == 0
+        # Зависший апдейт подтвержден только после сохранения в БД
+        assert bot.confirmed == PENDING + 1
+        assert [row[0] for row in await database.get_pending_updates(1)] == [1]
+
+        # Следующий запуск бота обрабатывает его первым
+        processed = []
+
+        async def record(bot, bot_id, update):
+            processed.append(update.update_id)
+
+        try:
+            await _run(FakeBot(), 1, record)
+        finally:
+            polling._process_update = original
+        assert processed[0] == 1
+        assert await database.get_pending_updates(1) == []
+
+    asyncio.run(scenario())
+
+
+def test_unfinished_updates_are_not_confirmed(db):
+    original = polling._process_update
+    release = asyncio.Event()
+
+    async def process_update(bot, bot_id, update):
+        if update.update_id > PENDING - 5:
+            await release.wait()
+
+    async def scenario():
+        bot = FakeBot()
+        try:
+            stats, last_update_id = await _run(bot, 3, process_update)
+        finally:
+            polling._process_update = original
+        assert stats['unfinished'] == 5
+        # Необработанные апдейты Telegram доставит снова - в БД их нет
+        assert bot.confirmed == PENDING - 4
+        assert await database.get_pending_updates(3) == []
+
+    asyncio.run(scenario())
+
+
+def test_hibernate_confirms_unfinished_updates(db):
+    original = polling._process_update
+    release = asyncio.Event()
+
+    async def process_update(bot, bot_id, update):
+        if update.update_id > PENDING - 5:
+            await release.wait()
+
+    async def scenario():
+        bot = FakeBot()
+        try:
+            await _run(bot, 4, process_update, save_unfinished=True)
+        finally:
+            polling._process_update = original
+        # Спящий бот: необработанные апдейты в БД и подтверждены, опрос их не увидит
+        assert bot.confirmed == PENDING + 1
+        assert [row[0] for row in await database.get_pending_updates(4)] == list(range(PENDING - 4, PENDING + 1))
+
+    asyncio.run(scenario())
+
+
+def test_backlog_is_shed_with_busy_reply(db):
+    original = polling._process_update
+    release = asyncio.Event()
+
+    async def process_update(bot, bot_id, update):
+        await release.wait()
+
+    async def scenario():
+        bot = FakeBot()
+        queue = polling.BotUpdateQueue(bot, 2, maxsize=10, concurrency=2)
+        try:
+            stats, last_update_id = await _run(bot, 2, process_update, queue)
+        finally:
+            polling._process_update = original
+        assert last_update_id == PENDING
+        # 2 апдейта в обработке, 10 в очереди, остальные сброшены
+        assert stats['running'] == 2
+        assert stats['depth'] == 10
+        assert stats['shed'] == PENDING - 12
+        # Ответы «занято» ограничены числом обработчиков
+        assert 0 < len(bot.busy_replies) <= PENDING - 12
+        # Сброшенные апдейты подтверждены, необработанные старше окна - после сохранения в БД
+        assert bot.confirmed == PENDING + 1
+        assert len(await database.get_pending_updates(2)) == 12
+
+    asyncio.run(scenario())
@@ -0,0 +1,58 @@
+"""
+Политика напоминаний: задержка ограничена max_interval, некорректная политика
+из БД заменяется политикой по умолчанию, владелец задает политику с часовым поясом
+"""
+
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+import database
+from main_bot.handlers.reminder_management import parse_reminder_policy
+from worker_bot.reminder_manager import set_bot_reminder_policy
+from worker_bot.reminder_policy import ReminderPolicy, DEFAULT_POLICY, validate_policy
+
+
+def test_delay_is_capped():
+    policy = ReminderPolicy.from_json('{"intervals": [600], "backoff": 10, "max_interval": 7200}')
+    assert [policy.next_delay(attempt) for attempt in range(4)] == [600, 6000, 7200, 7200]
+    # Степень такого attempt не помещается во float
+    assert policy.next_delay(10 ** 6) == 7200
+
+
+def test_invalid_policy_falls_back_to_default():
+    for raw in ('{"max_attempts": 0}', '{"backoff": 0.5}', 'not json'):
+        policy = ReminderPolicy.from_json(raw)
+        assert policy.max_attempts == DEFAULT_POLICY['max_attempts']
+        assert policy.backoff == DEFAULT_POLICY['backoff']
+
+
+def test_validate_policy_timezone():
+    assert validate_policy({'timezone': 'Asia/Tokyo'})['timezone'] == 'Asia/Tokyo'
+    assert ReminderPolicy.from_json('{"timezone": "UTC-5"}').tz.utcoffset(None) == timedelta(hours=-5)
+    # Старый ключ utc_offset
+    assert ReminderPolicy.from_json('{"utc_offset": 5}').tz.utcoffset(None) == timedelta(hours=5)
+    for bad in ({'timezone': 'Mars/Olympus'}, {'timezone': '+20'}, {'quiet_hours': [25, 9]}, {'unknown': 1}):
+        with pytest.raises(ValueError):
+            validate_policy(bad)
+
+
+def test_owner_sets_policy(db):
+    async def scenario():
+        bot_id = await database.add_bot_to_db('1:policy', 'policy_bot', 'Policy', 100)
+        policy = parse_reminder_policy('Интервалы: 5 30\nЧасовой пояс: +5\nТихие часы: нет')
+        assert await set_bot_reminder_policy(bot_id, 100, policy)
+        stored = ReminderPolicy.from_json(await database.get_bot_reminder_policy(bot_id))
+        assert stored.intervals == [300, 1800]
+        assert stored.quiet_hours is None and stored.timezone == '+5'
+
+        # Чужой бот и некорректная политика в БД не попадают
+        assert not await set_bot_reminder_policy(bot_id, 200, policy)
+        with pytest.raises(ValueError):
+            await set_bot_reminder_policy(bot_id, 100, {'max_attempts': 0})
+
+        assert await set_bot_reminder_policy(bot_id, 100, None)
+        assert await database.get_bot_reminder_policy(bot_id) is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,108 @@
+"""
+Напоминания хранятся в таблице reminders: остановка бота выгружает их из памяти,
+а следующий запуск загружает с тем же сроком, сообщением и счетчиком попыток
+"""
+
+import asyncio
+import time
+
+import pytest
+
+import database
+import worker_bot.reminder_manager as reminders
+from worker_bot.bot_config import invalidate_bot_config
+from worker_bot.registry import bot_registry
+
+
+@pytest.fixture
+def bot_id(db, monkeypatch):
+    bot_id = asyncio.run(database.add_bot_to_db('1:reminders', 'reminders_bot', 'Reminders', 100))
+    # Событие диспетчера привязывается к циклу событий, в каждом тесте он свой
+    monkeypatch.setattr(reminders, '_wakeup', asyncio.Event())
+    yield bot_id
+    bot_registry.release(bot_registry.ensure(bot_id))
+    invalidate_bot_config(bot_id)
+
+
+def test_reminders_survive_bot_restart(bot_id, monkeypatch):
+    async def scenario():
+        bot_registry.ensure(bot_id)
+        await reminders.start_reminders(bot_id, 1, message_id=10)
+        await reminders.start_reminders(bot_id, 2)
+        assert reminders.is_reminder_active(bot_id, 1)
+        assert reminders.get_active_reminders_count(bot_id) == 2
+
+        # Следующий срок и сообщение меняются в памяти и пишутся в БД отложенно
+        await reminders.schedule_next_reminder(bot_id, 1, 11)
+        due = reminders._reminders[(bot_id, 1)].due
+        await reminders.stop_reminders(bot_id, 2)
+        assert not reminders.is_reminder_active(bot_id, 2)
+
+        # Остановка бота выгружает напоминания, но не удаляет их из БД
+        await reminders.stop_all_reminders_for_bot(bot_id)
+        assert (bot_id, 1) not in reminders._reminders
+        assert reminders.is_reminder_active(bot_id, 1)
+        assert reminders.get_active_reminders_count(bot_id) == 1
+        assert await reminders.count_stored_reminders(bot_id) == 1
+
+        # Запуск бота загружает напоминания со сроком в ближайшие REMINDER_LOAD_AHEAD
+        monkeypatch.setattr(reminders, 'REMINDER_LOAD_AHEAD', due - time.time() + 60)
+        await reminders._load_due_reminders()
+        reminder = reminders._reminders[(bot_id, 1)]
+        assert (reminder.due, reminder.message_id, reminder.attempt) == (due, 11, 1)
+        assert not reminders.is_reminder_active(bot_id, 2)
+
+        await reminders.stop_all_reminders()
+
+    asyncio.run(scenario())
+
+
+def test_overdue_reminders_are_spread_on_resume(bot_id):
+    async def scenario():
+        now = time.time()
+        await database.save_reminders_batch(
+            [(bot_id, user_id, now - 3600, None, 2) for user_id in range(1, 21)], []
+        )
+
+        # Напоминания бота, который работает в другом процессе, не загружаются
+        await reminders._load_due_reminders()
+        assert not reminders._reminders
+
+        bot_registry.ensure(bot_id)
+        await reminders._load_due_reminders()
+        assert len(reminders._reminders) == 20
+        dues = [reminders._reminders[(bot_id, user_id)].due for user_id in range(1, 21)]
+        assert all(now <= due <= now + reminders.REMINDER_RESUME_JITTER + 1 for due in dues)
+        assert len(set(dues)) > 1
+        assert all(reminders._reminders[(bot_id, user_id)].attempt == 2 for user_id in range(1, 21))
+
+        await reminders.stop_all_reminders()
+
+    asyncio.run(scenario())
+
+
+def test_distant_reminders_count_as_active(bot_id):
+    async def scenario():
+        bot_registry.ensure(bot_id)
+        due = time.time() + reminders.REMINDER_LOAD_AHEAD + 3600
+        await database.save_reminders_batch([(bot_id, 1, due, None, 1)], [])
+        await reminders._load_due_reminders()
+        assert (bot_id, 1) not in reminders._reminders
+
+        # Напоминание дальше REMINDER_LOAD_AHEAD не в памяти, но активно
+        assert reminders.is_reminder_active(bot_id, 1)
+        assert reminders.get_active_reminders_count(bot_id) == 1
+        assert reminders.get_active_reminders_count() == 1
+
+        # Еще не записанные в БД изменения учитываются сразу
+        await reminders.start_reminders(bot_id, 2)
+        await reminders.stop_reminders(bot_id, 1)
+        assert not reminders.is_reminder_active(bot_id, 1)
+        assert reminders.get_active_reminders_count(bot_id) == 1
+        await reminders._flush_writes()
+        assert reminders.get_active_reminders_count(bot_id) == 1
+        assert await reminders.count_stored_reminders(bot_id) == 1
+
+        await reminders.stop_all_reminders()
+
+    asyncio.run(scenario())
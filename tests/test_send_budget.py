@@ -0,0 +1,39 @@
+"""
+Бюджет отправок бота: фоновые рассылки не трогают резерв
+и пропускают вперед ответы пользователям
+"""
+
+import asyncio
+
+from worker_bot.send_budget import SendBudget
+
+
+def test_background_sends_leave_reserve_for_replies():
+    async def scenario():
+        budget = SendBudget(rate=10, reserve=3)
+
+        # Фоновые отправки забирают все, кроме резерва
+        for _ in range(7):
+            await asyncio.wait_for(budget.acquire(background=True), 0.01)
+        background = asyncio.create_task(budget.acquire(background=True))
+        await asyncio.sleep(0.01)
+        assert not background.done()
+
+        # Ответ пользователю берет токен из резерва сразу
+        for _ in range(3):
+            await asyncio.wait_for(budget.acquire(), 0.01)
+        await asyncio.wait_for(background, 1)
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_pauses_all_sends():
+    async def scenario():
+        budget = SendBudget(rate=10, reserve=0)
+        budget.pause(0.2)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await budget.acquire()
+        assert loop.time() - started >= 0.2
+
+    asyncio.run(scenario())
@@ -4,11 +4,12 @@ worker_bot/__init__.py
 """
 
 from .bot_manager import start_worker_bot, stop_worker_bot, stop_all_worker_bots
-from .reminder_manager import stop_all_reminders
+from .reminder_manager import stop_all_reminders, set_bot_reminder_policy
 
 __all__ = [
     'start_worker_bot',
     'stop_worker_bot', 
     'stop_all_worker_bots',
-    'stop_all_reminders'
+    'stop_all_reminders',
+    'set_bot_reminder_policy'
 ]
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""
+worker_bot/blocked_users.py
+Пользователи, заблокировавшие рабочего бота
+"""
+
+import logging
+from database import get_blocked_users, add_blocked_user, remove_blocked_user
+
+# Загружаются из БД при первой проверке и выгружаются при остановке бота
+_blocked = {}  # {bot_id: set(user_id)}
+
+
+async def _get_blocked_set(bot_id: int) -> set:
+    blocked = _blocked.get(bot_id)
+    if blocked is None:
+        blocked = _blocked[bot_id] = set(await get_blocked_users(bot_id))
+    return blocked
+
+
+async def is_user_blocked(bot_id: int, user_id: int) -> bool:
+    """
+    Проверяет, заблокировал ли пользователь бота.
+    Вызывается перед любой исходящей отправкой, не инициированной пользователем.
+    """
+    return user_id in await _get_blocked_set(bot_id)
+
+
+async def mark_user_blocked(bot_id: int, user_id: int):
+    """Отмечает, что пользователь заблокировал бота (403 или my_chat_member kicked)"""
+    blocked = await _get_blocked_set(bot_id)
+    if user_id in blocked:
+        return
+
+    blocked.add(user_id)
+    await add_blocked_user(bot_id, user_id)
+    logging.info(f"🚫 Пользователь {user_id} заблокировал бота {bot_id}")
+
+    # Напоминания заблокировавшему бесполезны
+    from .reminder_manager import stop_reminders
+    await stop_reminders(bot_id, user_id)
+
+
+async def mark_user_unblocked(bot_id: int, user_id: int):
+    """Снимает отметку о блокировке (пользователь снова запустил бота)"""
+    blocked = await _get_blocked_set(bot_id)
+    if user_id not in blocked:
+        return
+
+    blocked.discard(user_id)
+    await remove_blocked_user(bot_id, user_id)
+    logging.info(f"✅ Пользователь {user_id} разблокировал бота {bot_id}")
+
+
+def unload_blocked_users(bot_id: int):
+    """Выгружает список заблокировавших из памяти (при остановке бота)"""
+    _blocked.pop(bot_id, None)
@@ -0,0 +1,116 @@
+"""
+worker_bot/bot_config.py
+Кэш настроек рабочих ботов и готовых сообщений напоминаний
+"""
+
+import logging
+import time
+from config import WORKER_CONFIG_CHECK_INTERVAL
+from database import get_bot_config_version, get_bot_reminder_policy
+from .reminder_policy import ReminderPolicy
+
+# Сколько разных наборов неподписанных каналов помнить на одного бота
+PAYLOAD_CACHE_SIZE = 64
+
+REMINDER_TEXT = "⏰ **Напоминание:** Вы еще не подписались на все каналы!\n\n"
+
+_configs = {}  # {bot_id: BotConfig}
+
+
+class ReminderPayload:
+    """Готовое сообщение напоминания для одного набора неподписанных каналов"""
+    __slots__ = ('text', 'parse_mode', 'keyboard')
+
+    def __init__(self, text: str, parse_mode, keyboard):
+        self.text = text  # подпись к изображению или текст сообщения
+        self.parse_mode = parse_mode
+        self.keyboard = keyboard
+
+
+class BotConfig:
+    """Настройки бота одной версии (config_version) и производные от них данные"""
+    __slots__ = ('version', 'data', 'channels', 'channels_with_names', 'image_path',
+                 'image_filename', 'reminder_policy', 'payloads', 'checked_at')
+
+    def __init__(self, version: int, data: tuple, channels: list, image_path: str = None,
+                 reminder_policy: str = None):
+        self.version = version
+        self.data = data  # строка bots в формате get_bot_data_for_worker
+        self.channels = channels  # активные каналы в формате get_bot_channels_for_worker
+        self.channels_with_names = [
+            (channel[1], channel[2] if channel[2] else channel[1]) for channel in channels
+        ]
+        self.image_path = image_path  # None, если изображения нет или файл не найден
+        self.image_filename = data[9] if image_path else None  # file_id изображения хранит media_cache
+        self.reminder_policy = ReminderPolicy.from_json(reminder_policy)
+        self.payloads = {}  # {tuple(not_subscribed_channels): ReminderPayload}
+        self.checked_at = time.monotonic()
+
+    def get_reminder_payload(self, not_subscribed_channels: list) -> ReminderPayload:
+        """Сообщение напоминания для набора неподписанных каналов (собирается один раз)"""
+        key = tuple(not_subscribed_channels)
+        payload = self.payloads.get(key)
+        if payload is not None:
+            return payload
+
+        from .core import get_image_caption, format_subscription_message
+        from .keyboards import create_subscription_keyboard
+
+        bot_custom_message = self.data[5] if self.data[5] else ""
+        if self.image_path:
+            text = get_image_caption(bot_custom_message, self.channels_with_names)
+        else:
+            text = format_subscription_message(bot_custom_message, self.channels_with_names)
+
+        payload = ReminderPayload(
+            f"{REMINDER_TEXT}{text}",
+            "HTML" if bot_custom_message else None,
+            create_subscription_keyboard(not_subscribed_channels, self.channels_with_names)
+        )
+        if len(self.payloads) >= PAYLOAD_CACHE_SIZE:
+            self.payloads.pop(next(iter(self.payloads)))
+        self.payloads[key] = payload
+        return payload
+
+
+async def get_bot_config(bot_id: int):
+    """
+    Настройки активного бота из кэша. Версия сверяется с БД не чаще
+    раза в WORKER_CONFIG_CHECK_INTERVAL секунд; при изменении настройки
+    перечитываются, а готовые сообщения собираются заново.
+
+    Returns:
+        BotConfig или None, если бот не найден или выключен
+    """
+    config = _configs.get(bot_id)
+    now = time.monotonic()
+    if config is not None and now - config.checked_at < WORKER_CONFIG_CHECK_INTERVAL:
+        return config
+
+    version = await get_bot_config_version(bot_id)
+    if version is None:
+        _configs.pop(bot_id, None)
+        return None
+
+    if config is not None and config.version == version:
+        config.checked_at = now
+        return config
+
+    from .core import get_bot_data_for_worker, _get_bot_channels_for_worker
+    data = await get_bot_data_for_worker(bot_id)
+    if not data:
+        _configs.pop(bot_id, None)
+        return None
+
+    from main_bot.file_utils import find_bot_image
+    channels = await _get_bot_channels_for_worker(bot_id)
+    image_path = await find_bot_image(bot_id, data[9])
+    reminder_policy = await get_bot_reminder_policy(bot_id)
+    config = _configs[bot_id] = BotConfig(version, data, channels, image_path, reminder_policy)
+    logging.info(f"⚙️ Загружены настройки бота {bot_id} (версия {version})")
+    return config
+
+
+def invalidate_bot_config(bot_id: int):
+    """Сбрасывает кэш настроек бота (при остановке бота)"""
+    _configs.pop(bot_id, None)
@@ -5,246 +5,315 @@ worker_bot/bot_manager.py
 
 import asyncio
 import logging
-from aiogram import Bot, Dispatcher
-from .core import active_bots
-from .router import create_worker_router
-from database import get_active_bot_channels
-from .reminder_manager import stop_all_reminders_for_bot
+import time
+import aiohttp
+from aiogram import Bot
+from aiogram.exceptions import TelegramUnauthorizedError
+from aiogram.utils.backoff import Backoff, BackoffConfig
+from .registry import bot_registry, BotEntry, BotState
+from .router import get_worker_dispatcher
+from .polling import run_worker_polling, stop_worker_polling, get_last_poll_time
+from .http_session import get_shared_session, get_shared_client_session, drop_http_stats
+from .send_budget import drop_send_budget
+from .bot_config import invalidate_bot_config
+from .media_cache import forget_bot_media, prewarm_bot_image
+from config import WORKER_IDLE_TIMEOUT, WORKER_DORMANT_POLL_INTERVAL, WORKER_STALL_TIMEOUT, WORKER_PREWARM_IMAGES
+from database import get_active_bot_channels, get_bot_identity, deactivate_bot
+from .reminder_manager import (
+    stop_all_reminders_for_bot, count_stored_reminders, start_reminder_loader, REMINDER_LOAD_AHEAD
+)
+from .material_delivery import start_material_delivery, cancel_material_broadcast
+from .blocked_users import unload_blocked_users
+from .rendered_messages import forget_rendered_messages
 
-# Глобальные переменные для управления задачами ботов
-_active_tasks = {}  # {bot_id: task}
-_active_dispatchers = {}  # {bot_id: {'dp': dp, 'bot': bot}}
-_bot_start_locks = {}  # ЗАЩИТА ОТ ПОВТОРНОГО ЗАПУСКА: {bot_id: lock}
+# Фоновые задачи: спящий режим и сторож polling
+_idle_monitor_task = None
+_dormant_poll_task = None
+_watchdog_task = None
 
-async def start_worker_bot(bot_token: str, bot_id: int):
+WATCHDOG_INTERVAL = 30
+WATCHDOG_BACKOFF = BackoffConfig(min_delay=2.0, max_delay=300.0, factor=2.0, jitter=0.2)
+# Попытка, проработавшая дольше этого (секунды), считается успешной: backoff сбрасывается
+WATCHDOG_HEALTHY_RUN = 300
+
+async def start_worker_bot(bot_token: str, bot_id: int, wake: bool = False):
     """
     Запускает рабочего бота с защитой от повторного запуска
     
     Args:
         bot_token: Токен бота
         bot_id: ID бота в базе данных
+        wake: Только пробудить: уже работающий бот с тем же токеном не перезапускается
     """
-    # Создаем лок для этого бота, если его нет
-    if bot_id not in _bot_start_locks:
-        _bot_start_locks[bot_id] = asyncio.Lock()
+    # В режиме супервизора бот запускается на шарде-владельце
+    from supervisor import get_supervisor
+    supervisor = get_supervisor()
+    if supervisor:
+        return await supervisor.start_bot(bot_id)
     
-    async with _bot_start_locks[bot_id]:
-        try:
-            # Останавливаем бота если он уже запущен
-            if bot_id in _active_tasks:
-                logging.info(f"ℹ️ Бот {bot_id} уже запущен, останавливаем предыдущий экземпляр")
-                await stop_worker_bot(bot_id)
-                await asyncio.sleep(2)  # Даем время на корректную остановку
-            
-            bot = Bot(token=bot_token, parse_mode="HTML")
-            dp = Dispatcher()
-            
-            # Создаем и добавляем роутер с привязанными каналами
-            worker_router = create_worker_router(bot_id)
-            dp.include_router(worker_router)
-            
-            # Сохраняем ссылку на бота
-            bot_info = await bot.get_me()
-            active_bots[bot_info.id] = {'dp': dp, 'bot': bot, 'bot_id': bot_id}
-            _active_dispatchers[bot_id] = {'dp': dp, 'bot': bot}
-            
-            # Получаем количество активных каналов
-            channels = await get_active_bot_channels(bot_id)
-            
-            logging.info(f"🚀 Запуск рабочего бота @{bot_info.username} (ID: {bot_id}) с {len(channels)} активными каналами")
-            
-            # Запускаем polling в отдельной задаче
-            task = asyncio.create_task(_run_polling(bot, dp, bot_id))
-            _active_tasks[bot_id] = task
-            
-            return True
+    entry = bot_registry.ensure(bot_id)
+    
+    try:
+        async with entry.lock:
+            try:
+                # Бота уже разбудил другой вызов, пока мы ждали лок
+                if wake and entry.task is not None and entry.token == bot_token:
+                    return True
+                
+                # Останавливаем бота если он уже запущен
+                if entry.task is not None:
+                    logging.info(f"ℹ️ Бот {bot_id} уже запущен, останавливаем предыдущий экземпляр")
+                    await _stop_entry(entry)
+                    await asyncio.sleep(2)  # Даем время на корректную остановку
+                
+                # Спящий бот просыпается через обычный запуск
+                entry.state = BotState.STARTING
+                
+                bot = Bot(token=bot_token, parse_mode="HTML", session=get_shared_session())
+                # Общий диспетчер: новых обработчиков для бота не создается
+                dp = get_worker_dispatcher()
+                
+                # По Telegram ID middleware находит запись бота. ID берется из токена,
+                # username - из БД: getMe при запуске не нужен, токены проверяет фоновая задача
+                identity = await get_bot_identity(bot_id)
+                if identity and identity[0] and identity[0] != bot.id:
+                    logging.warning(f"⚠️ Telegram ID бота {bot_id} в БД не совпадает с токеном")
+                # Username еще не сохранен (токены не проверялись) - показываем Telegram ID
+                bot_label = f"@{identity[1]}" if identity and identity[1] else f"с Telegram ID {bot.id}"
+                bot_registry.bind(entry, bot, dp)
+                
+                # Получаем количество активных каналов
+                channels = await get_active_bot_channels(bot_id)
+                
+                logging.info(f"🚀 Запуск рабочего бота {bot_label} (ID: {bot_id}) с {len(channels)} активными каналами")
+                
+                # Запускаем polling в отдельной задаче
+                entry.task = asyncio.create_task(_run_polling(entry))
+                entry.state = BotState.RUNNING
+                touch_worker_bot(bot_id)
+                _ensure_idle_monitor()
+                _ensure_watchdog()
+                start_reminder_loader()
+                start_material_delivery()
+                if WORKER_PREWARM_IMAGES:
+                    asyncio.create_task(prewarm_bot_image(bot, bot_id))
+                
+                return True
             
-        except Exception as e:
-            logging.error(f"❌ Ошибка запуска рабочего бота {bot_id}: {e}")
-            return False
+            except Exception as e:
+                logging.error(f"❌ Ошибка запуска рабочего бота {bot_id}: {e}")
+                bot_registry.release(entry)
+                return False
+    finally:
+        # Запись неудачного запуска удаляем после освобождения лока
+        bot_registry.discard(entry)
 
-async def _run_polling(bot: Bot, dp: Dispatcher, bot_id: int):
+async def _run_polling(entry: BotEntry):
     """
-    Запускает стандартный polling для рабочего бота
+    Запускает polling рабочего бота через общий диспетчер и перезапускает его
+    с экспоненциальной задержкой после падений и зависаний.
+    Бот с отозванным токеном выключается в БД вместо бесконечных повторов.
     """
+    bot = entry.bot
+    bot_id = entry.bot_id
+    backoff = Backoff(config=WATCHDOG_BACKOFF)
+    
     try:
-        # Используем стандартный polling aiogram
-        await dp.start_polling(bot)
+        while True:
+            attempt = asyncio.create_task(run_worker_polling(bot, bot_id))
+            entry.poll_attempt = attempt
+            started = time.monotonic()
+            
+            try:
+                await attempt
+                return  # polling остановлен через stop_worker_polling
+            except asyncio.CancelledError:
+                if not entry.stalled:
+                    raise  # остановка бота
+                entry.stalled = False
+                reason = f"нет ответа getUpdates дольше {WORKER_STALL_TIMEOUT} с"
+            except TelegramUnauthorizedError:
+                logging.error(f"❌ Токен бота {bot_id} отозван, бот выключен")
+                await deactivate_bot(bot_id)
+                await stop_all_reminders_for_bot(bot_id)
+                return
+            except Exception as e:
+                reason = f"{type(e).__name__}: {e}"
+            finally:
+                if entry.poll_attempt is attempt:
+                    entry.poll_attempt = None
+            
+            if time.monotonic() - started > WATCHDOG_HEALTHY_RUN:
+                backoff.reset()
+            delay = next(backoff)
+            logging.warning(f"⚠️ Polling бота {bot_id} остановился ({reason}), перезапуск через {delay:.0f} с")
+            await asyncio.sleep(delay)
+    
     except asyncio.CancelledError:
         logging.info(f"✅ Рабочий бот {bot_id} получил сигнал отмены")
-    except Exception as e:
-        # Игнорируем ошибки, связанные с остановкой polling
-        error_msg = str(e).lower()
-        if any(term in error_msg for term in ['polling', 'stopped', 'cancelled', 'closed']):
-            logging.info(f"✅ Polling бота {bot_id} остановлен")
-        else:
-            logging.error(f"❌ Ошибка polling для бота {bot_id}: {e}")
     finally:
         # Корректно закрываем ресурсы
-        await _cleanup_bot_resources(bot_id)
+        _cleanup_bot_resources(entry, asyncio.current_task())
 
-async def _cleanup_bot_resources(bot_id: int):
-    """Корректная очистка ресурсов бота"""
-    try:
-        # Закрываем сессию бота
-        if bot_id in _active_dispatchers:
-            bot_data = _active_dispatchers[bot_id]
-            if bot_data['bot']:
-                try:
-                    await bot_data['bot'].session.close()
-                    await asyncio.sleep(0.5)  # Даем время на корректное закрытие
-                except Exception as e:
-                    # Игнорируем ошибки закрытия сессии (обычно это нормально при остановке)
-                    if "session is closed" not in str(e).lower():
-                        logging.warning(f"⚠️ Ошибка при закрытии сессии бота {bot_id}: {e}")
-        
-        # Убираем из активных
-        if bot_id in _active_tasks:
-            del _active_tasks[bot_id]
-        if bot_id in _active_dispatchers:
-            del _active_dispatchers[bot_id]
-        
-        # Убираем из active_bots
-        for bot_info_id, bot_data in list(active_bots.items()):
-            if bot_data.get('bot_id') == bot_id:
-                del active_bots[bot_info_id]
-                break
-                
-    except Exception as e:
-        logging.error(f"❌ Ошибка очистки ресурсов бота {bot_id}: {e}")
-
-async def stop_worker_bot(bot_id: int):
+def _cleanup_bot_resources(entry: BotEntry, task=None, state: str = BotState.STOPPED):
     """
-    Останавливает рабочего бота с улучшенной обработкой ошибок
+    Корректная очистка ресурсов бота
+    
+    Args:
+        entry: Запись бота в реестре
+        task: Завершившаяся задача polling (ресурсы нового экземпляра не трогаем)
+        state: Состояние записи после очистки
     """
+    if task is not None and (entry.task is not task or entry.state == BotState.STOPPING):
+        # Остановку ведет _stop_entry - он сам освободит запись в нужном состоянии
+        return
+    
     try:
-        if bot_id not in _active_tasks and bot_id not in _active_dispatchers:
+        # Сессия общая для всех ботов - закрывать нечего, убираем только счетчики
+        if entry.telegram_id is not None:
+            drop_http_stats(entry.telegram_id)
+            drop_send_budget(entry.telegram_id)
+        bot_registry.release(entry, state)
+    except Exception as e:
+        logging.error(f"❌ Ошибка очистки ресурсов бота {entry.bot_id}: {e}")
+
+async def _stop_entry(entry: BotEntry, state: str = BotState.STOPPED):
+    """Останавливает бота (вызывающий держит entry.lock)"""
+    bot_id = entry.bot_id
+    
+    if entry.task is None:
+        if entry.state == BotState.DORMANT and state == BotState.STOPPED:
+            # Явная остановка спящего бота - просто забываем его токен
+            logging.info(f"🛑 Спящий бот {bot_id} остановлен")
+        else:
             logging.info(f"ℹ️ Бот {bot_id} уже остановлен")
-            return
-            
-        logging.info(f"🛑 Остановка бота {bot_id}...")
+        bot_registry.release(entry, state)
+        return
+    
+    logging.info(f"🛑 Остановка бота {bot_id}...")
+    
+    # Задачу запоминаем до остановки polling: завершившись, она не освобождает запись сама
+    task = entry.task
+    entry.state = BotState.STOPPING
+    
+    try:
+        # Перестаем получать апдейты и даем работающим обработчикам завершиться.
+        # Спящий бот сохраняет необработанные апдейты в БД: опрос спящих ботов
+        # начинается после них и будит бота только новыми апдейтами
+        entry.update_offset = await stop_worker_polling(bot_id, save_unfinished=state == BotState.DORMANT)
+        
+        # Рассылку материалов продолжит следующий запуск бота (здесь или в другом шарде)
+        await cancel_material_broadcast(bot_id)
         
         # Останавливаем все напоминания для этого бота
-        from .reminder_manager import stop_all_reminders_for_bot
         await stop_all_reminders_for_bot(bot_id)
+        if state == BotState.STOPPED:
+            unload_blocked_users(bot_id)
+            invalidate_bot_config(bot_id)
+            forget_bot_media(bot_id)
+            forget_rendered_messages(bot_id)
         
-        # Сначала останавливаем диспетчер (это остановит polling)
-        if bot_id in _active_dispatchers:
-            bot_data = _active_dispatchers[bot_id]
-            
-            # Останавливаем polling через стандартный метод (await!)
-            if hasattr(bot_data['dp'], 'stop_polling'):
-                try:
-                    await bot_data['dp'].stop_polling() 
-                    logging.info(f"✅ Polling бота {bot_id} остановлен")
-                except RuntimeError as e:
-                    if "not started" in str(e).lower():
-                        logging.info(f"ℹ️ Polling бота {bot_id} уже остановлен")
-                    else:
-                        logging.error(f"❌ Ошибка остановки polling бота {bot_id}: {e}")
-                except Exception as e:
-                    logging.error(f"❌ Ошибка остановки polling бота {bot_id}: {e}")
-        
-        # Затем останавливаем задачу polling
-        if bot_id in _active_tasks:
-            task = _active_tasks[bot_id]
-            if not task.done():
-                try:
-                    task.cancel()
-                    # Ждем завершения задачи с таймаутом
-                    await asyncio.wait_for(task, timeout=5.0)
-                    logging.info(f"✅ Задача бота {bot_id} остановлена")
-                except asyncio.CancelledError:
-                    pass
-                except asyncio.TimeoutError:
-                    logging.warning(f"⚠️ Таймаут при остановке задачи бота {bot_id}")
-                except Exception as e:
-                    logging.error(f"❌ Ошибка при отмене задачи бота {bot_id}: {e}")
-        
-        # Закрываем сессию бота
-        if bot_id in _active_dispatchers:
-            bot_data = _active_dispatchers[bot_id]
-            if bot_data['bot']:
-                try:
-                    await bot_data['bot'].session.close()
-                    await asyncio.sleep(1.0)  # Даем время на корректное закрытие
-                    logging.info(f"✅ Сессия бота {bot_id} закрыта")
-                except Exception as e:
-                    logging.warning(f"⚠️ Ошибка при закрытии сессии бота {bot_id}: {e}")
-        
+        # Останавливаем задачу polling (диспетчер общий, его не трогаем)
+        if not task.done():
+            try:
+                task.cancel()
+                # Ждем завершения задачи с таймаутом
+                await asyncio.wait_for(task, timeout=5.0)
+                logging.info(f"✅ Задача бота {bot_id} остановлена")
+            except asyncio.CancelledError:
+                pass
+            except asyncio.TimeoutError:
+                logging.warning(f"⚠️ Таймаут при остановке задачи бота {bot_id}")
+            except Exception as e:
+                logging.error(f"❌ Ошибка при отмене задачи бота {bot_id}: {e}")
+    finally:
         # Очищаем ресурсы
-        await _cleanup_bot_resources(bot_id)
-        
-        logging.info(f"✅ Бот {bot_id} полностью остановлен")
-        
+        _cleanup_bot_resources(entry, state=state)
+    
+    logging.info(f"✅ Бот {bot_id} полностью остановлен")
+
+async def stop_worker_bot(bot_id: int):
+    """
+    Останавливает рабочего бота с улучшенной обработкой ошибок
+    """
+    from supervisor import get_supervisor
+    supervisor = get_supervisor()
+    if supervisor:
+        await supervisor.stop_bot(bot_id)
+        return
+    
+    entry = bot_registry.get(bot_id)
+    if entry is None:
+        logging.info(f"ℹ️ Бот {bot_id} уже остановлен")
+        return
+    
+    try:
+        async with entry.lock:
+            await _stop_entry(entry)
     except Exception as e:
         logging.error(f"❌ Ошибка при остановке бота {bot_id}: {e}")
-        
-    except Exception as e:
-        # Игнорируем ошибку "Polling is not started"
-        if "Polling is not started" in str(e):
-            logging.info(f"ℹ️ Бот {bot_id} уже остановлен")
-        else:
-            logging.error(f"❌ Ошибка при остановке бота {bot_id}: {e}")
+    finally:
+        bot_registry.discard(entry)
 
 async def stop_all_worker_bots():
     """
     Останавливает всех рабочих ботов с улучшенной обработкой
     """
     try:
-        bot_ids = list(_active_tasks.keys())
+        for entry in bot_registry.entries(BotState.DORMANT):
+            bot_registry.release(entry)
+        
+        bot_ids = bot_registry.running_ids()
         if not bot_ids:
             logging.info("ℹ️ Нет активных рабочих ботов для остановки")
             return
-            
-        logging.info(f"🛑 Останавливаем {len(bot_ids)} рабочих ботов...")
         
-        # Сначала останавливаем всех диспетчеров (останавливаем polling)
-        for bot_id in bot_ids:
-            if bot_id in _active_dispatchers:
-                bot_data = _active_dispatchers[bot_id]
-                if hasattr(bot_data['dp'], 'stop_polling'):
-                    try:
-                        await bot_data['dp'].stop_polling()
-                        logging.info(f"✅ Polling бота {bot_id} остановлен")
-                    except RuntimeError as e:
-                        if "not started" in str(e).lower():
-                            logging.info(f"ℹ️ Polling бота {bot_id} уже остановлен")
-                        else:
-                            logging.error(f"❌ Ошибка остановки polling бота {bot_id}: {e}")
-                    except Exception as e:
-                        logging.error(f"❌ Ошибка остановки polling бота {bot_id}: {e}")
+        logging.info(f"🛑 Останавливаем {len(bot_ids)} рабочих ботов...")
         
-        # Затем останавливаем ботов последовательно с задержкой
+        # Останавливаем ботов последовательно с задержкой
         for bot_id in bot_ids:
             try:
                 await stop_worker_bot(bot_id)
-                await asyncio.sleep(1.0) 
+                await asyncio.sleep(1.0)
             except Exception as e:
                 logging.error(f"❌ Ошибка остановки бота {bot_id}: {e}")
         
         logging.info(f"✅ Остановлены все рабочие боты ({len(bot_ids)} шт.)")
-        
+    
     except Exception as e:
         logging.error(f"❌ Ошибка при остановке всех ботов: {e}")
 
 def get_active_worker_bots():
     """Получение списка активных рабочих ботов"""
-    return list(_active_tasks.keys())
+    from supervisor import get_supervisor
+    supervisor = get_supervisor()
+    if supervisor:
+        return supervisor.get_running_bots()
+    return bot_registry.running_ids() + bot_registry.dormant_ids()
 
 def is_worker_bot_running(bot_id: int) -> bool:
     """Проверяет, запущен ли рабочий бот"""
-    return bot_id in _active_tasks
+    from supervisor import get_supervisor
+    supervisor = get_supervisor()
+    if supervisor:
+        return supervisor.is_bot_running(bot_id)
+    entry = bot_registry.get(bot_id)
+    return entry is not None and (entry.task is not None or entry.state == BotState.DORMANT)
 
 async def restart_worker_bot(bot_token: str, bot_id: int):
     """Перезапускает рабочего бота"""
+    from supervisor import get_supervisor
+    supervisor = get_supervisor()
+    if supervisor:
+        return await supervisor.reload_bot(bot_id)
+    
     try:
         logging.info(f"🔄 Перезапуск бота {bot_id}...")
         
         # Останавливаем бота если он запущен
         if is_worker_bot_running(bot_id):
             await stop_worker_bot(bot_id)
-            await asyncio.sleep(2) 
+            await asyncio.sleep(2)
         
         # Запускаем бота заново
         success = await start_worker_bot(bot_token, bot_id)
@@ -252,9 +321,166 @@ async def restart_worker_bot(bot_token: str, bot_id: int):
             logging.info(f"✅ Бот {bot_id} успешно перезапущен")
         else:
             logging.error(f"❌ Не удалось перезапустить бота {bot_id}")
-            
-        return success
         
+        return success
+    
     except Exception as e:
         logging.error(f"❌ Ошибка перезапуска бота {bot_id}: {e}")
         return False
+
+# ===== СПЯЩИЙ РЕЖИМ =====
+
+def touch_worker_bot(bot_id: int):
+    """Отмечает активность бота (вызывается на каждый апдейт)"""
+    entry = bot_registry.get(bot_id)
+    if entry is not None:
+        entry.last_activity = time.monotonic()
+
+def is_worker_bot_dormant(bot_id: int) -> bool:
+    """Проверяет, находится ли бот в спящем режиме"""
+    entry = bot_registry.get(bot_id)
+    return entry is not None and entry.state == BotState.DORMANT
+
+async def get_worker_bot(bot_id: int):
+    """
+    Возвращает экземпляр Bot рабочего бота, пробуждая его при необходимости
+    
+    Args:
+        bot_id: ID бота в базе данных
+    
+    Returns:
+        Bot: Экземпляр бота или None, если бот не запущен
+    """
+    entry = bot_registry.get(bot_id)
+    if entry is None:
+        return None
+    
+    if entry.state == BotState.DORMANT:
+        await start_worker_bot(entry.token, bot_id, wake=True)
+    elif entry.lock.locked():
+        # Бота сейчас запускает или останавливает другой вызов - ждем результата
+        async with entry.lock:
+            pass
+        bot_registry.discard(entry)
+    
+    entry = bot_registry.get(bot_id)
+    if entry is None or entry.state != BotState.RUNNING:
+        return None
+    return entry.bot
+
+async def hibernate_worker_bot(bot_id: int):
+    """
+    Переводит бота в спящий режим: освобождает Bot и polling,
+    оставляя в реестре только токен для редкой проверки новых апдейтов
+    """
+    entry = bot_registry.get(bot_id)
+    if entry is None or entry.task is None:
+        return
+    
+    async with entry.lock:
+        if entry.task is None:
+            return
+        await _stop_entry(entry, BotState.DORMANT)
+    logging.info(f"💤 Бот {bot_id} переведен в спящий режим")
+    
+    _ensure_dormant_poller()
+
+def _ensure_idle_monitor():
+    global _idle_monitor_task
+    if WORKER_IDLE_TIMEOUT <= 0:
+        return
+    if _idle_monitor_task is None or _idle_monitor_task.done():
+        _idle_monitor_task = asyncio.create_task(_idle_monitor_loop())
+
+def _ensure_watchdog():
+    global _watchdog_task
+    if WORKER_STALL_TIMEOUT <= 0:
+        return
+    if _watchdog_task is None or _watchdog_task.done():
+        _watchdog_task = asyncio.create_task(_watchdog_loop())
+
+def _ensure_dormant_poller():
+    global _dormant_poll_task
+    if _dormant_poll_task is None or _dormant_poll_task.done():
+        _dormant_poll_task = asyncio.create_task(_dormant_poll_loop())
+
+async def _idle_monitor_loop():
+    """Переводит в спящий режим ботов без апдейтов дольше WORKER_IDLE_TIMEOUT"""
+    check_interval = max(10, min(60, WORKER_IDLE_TIMEOUT // 4))
+    
+    while bot_registry.running_ids():
+        await asyncio.sleep(check_interval)
+        now = time.monotonic()
+        
+        for entry in bot_registry.entries(BotState.RUNNING):
+            if now - entry.last_activity < WORKER_IDLE_TIMEOUT:
+                continue
+            # Бот с ближайшими напоминаниями все равно скоро проснется
+            if await count_stored_reminders(entry.bot_id, time.time() + REMINDER_LOAD_AHEAD):
+                continue
+            try:
+                await hibernate_worker_bot(entry.bot_id)
+            except Exception as e:
+                logging.error(f"❌ Ошибка перевода бота {entry.bot_id} в спящий режим: {e}")
+
+async def _watchdog_loop():
+    """
+    Отменяет зависшие попытки polling (нет ответа getUpdates дольше WORKER_STALL_TIMEOUT).
+    Перезапуск выполняет _run_polling этого бота.
+    """
+    while bot_registry.running_ids():
+        await asyncio.sleep(WATCHDOG_INTERVAL)
+        now = time.monotonic()
+        
+        for entry in bot_registry.entries(BotState.RUNNING):
+            attempt = entry.poll_attempt
+            last_poll = get_last_poll_time(entry.bot_id)
+            if attempt is None or attempt.done() or last_poll is None or now - last_poll < WORKER_STALL_TIMEOUT:
+                continue
+            logging.warning(f"⚠️ Polling бота {entry.bot_id} завис ({now - last_poll:.0f} с без ответа), перезапускаем")
+            entry.stalled = True
+            attempt.cancel()
+
+async def _dormant_poll_loop():
+    """
+    Редко опрашивает спящих ботов одним HTTP-клиентом на всех.
+    getUpdates вызывается с offset, подтвержденным при переходе в спящий режим:
+    необработанные до него апдейты (они в БД) бота не будят, а новый апдейт
+    остается неподтвержденным и будет получен обычным polling после пробуждения.
+    """
+    semaphore = asyncio.Semaphore(10)
+    
+    async def probe(session: aiohttp.ClientSession, entry: BotEntry, bot_token: str):
+        params = {'limit': 1, 'timeout': 0}
+        if entry.update_offset is not None:
+            params['offset'] = entry.update_offset
+        async with semaphore:
+            try:
+                async with session.get(
+                    f"https://api.telegram.org/bot{bot_token}/getUpdates",
+                    params=params,
+                    timeout=aiohttp.ClientTimeout(total=15)
+                ) as resp:
+                    data = await resp.json(content_type=None)
+            except Exception as e:
+                logging.debug(f"Ошибка опроса спящего бота {entry.bot_id}: {e}")
+                return
+        
+        if entry.state != BotState.DORMANT or entry.token != bot_token:
+            return  # бот уже проснулся или остановлен
+        
+        if data.get('error_code') == 401:
+            logging.error(f"❌ Токен спящего бота {entry.bot_id} отозван, бот выключен")
+            bot_registry.release(entry)
+            await deactivate_bot(entry.bot_id)
+        elif data.get('ok') and data.get('result'):
+            logging.info(f"⏰ Спящий бот {entry.bot_id} получил апдейт, пробуждаем")
+            await start_worker_bot(bot_token, entry.bot_id, wake=True)
+    
+    while bot_registry.dormant_ids():
+        session = await get_shared_client_session()
+        await asyncio.gather(*(
+            probe(session, entry, entry.token)
+            for entry in bot_registry.entries(BotState.DORMANT)
+        ))
+        await asyncio.sleep(WORKER_DORMANT_POLL_INTERVAL)
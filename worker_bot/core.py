@@ -3,15 +3,10 @@ worker_bot/core.py
 Основные функции и глобальные переменные для рабочих ботов
 """
 
-import asyncio
 import logging
 import aiosqlite
 from datetime import datetime
-from aiogram.exceptions import TelegramBadRequest
-
-# Глобальные переменные для управления ботами
-active_bots = {}  # {bot_info.id: {'dp': dp, 'bot': bot, 'bot_id': bot_id}}
-active_dispatchers = {}  # {bot_id: {'dp': dp, 'bot': bot}} - оставляем для обратной совместимости
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
 
 async def _get_bot_channels_for_worker(bot_id: int):
     """Получение каналов бота для рабочих ботов (без проверки владельца)"""
@@ -39,14 +34,15 @@ async def check_user_subscriptions(user_id: int, bot_id: int):
     Returns:
         tuple: (not_subscribed_channels, all_channels_with_names)
     """
-    # Получаем данные бота чтобы найти владельца
-    bot_data = await get_bot_data_for_worker(bot_id)
-    if not bot_data:
+    # Данные бота и его каналы берем из кэша настроек
+    from .bot_config import get_bot_config
+    config = await get_bot_config(bot_id)
+    if not config:
         logging.error(f"❌ Бот {bot_id} не найден в базе данных")
         return [], []
     
     # Получаем все каналы для этого бота
-    channels = await _get_bot_channels_for_worker(bot_id)
+    channels = config.channels
     if not channels:
         logging.warning(f"⚠️ Для бота {bot_id} не найдено каналов")
         return [], []
@@ -248,7 +244,7 @@ async def send_subscription_success_message(message, bot_data, user_id):
     # Отправляем сообщение с медиа или без
     from .media_utils import send_media_with_message
     if file_id and file_type:
-        await send_media_with_message(message, file_id, file_type, welcome_text, None)
+        await send_media_with_message(message, file_id, file_type, welcome_text, None, bot_id=bot_id)
     else:
         await message.answer(
             welcome_text,
@@ -258,18 +254,16 @@ async def send_subscription_success_message(message, bot_data, user_id):
     
     # Если material_sent_at заполнен, планируем отправку материалов
     if material_sent_at:
-        await schedule_material_delivery(bot_id, user_id, button_url, file_id, file_type, material_sent_at)
+        await schedule_material_delivery(bot_id, user_id, material_sent_at)
 
-async def schedule_material_delivery(bot_id: int, user_id: int, button_url: str, file_id: str, file_type: str, material_sent_at: str):
+async def schedule_material_delivery(bot_id: int, user_id: int, material_sent_at: str):
     """
-    Планирует отправку материалов в указанную дату
+    Ставит отправку материалов в очередь на указанную дату
+    (отправляет worker_bot/material_delivery.py)
     
     Args:
         bot_id: ID бота
         user_id: ID пользователя
-        button_url: Ссылка на материалы
-        file_id: ID файла
-        file_type: Тип файла
         material_sent_at: Дата отправки материалов
     """
     try:
@@ -283,47 +277,58 @@ async def schedule_material_delivery(bot_id: int, user_id: int, button_url: str,
         if delay_seconds > 0:
             logging.info(f"⏰ Планируем отправку материалов для пользователя {user_id} через {delay_seconds} секунд")
             
-            # Создаем задачу на отправку
-            asyncio.create_task(
-                send_materials_at_scheduled_time(bot_id, user_id, button_url, file_id, file_type, delay_seconds)
-            )
+            from database import add_material_delivery
+            await add_material_delivery(bot_id, user_id, send_date.timestamp(), material_sent_at)
+            
+            from .material_delivery import wake_material_delivery
+            wake_material_delivery(send_date.timestamp())
         else:
             logging.warning(f"⚠️ Дата отправки материалов уже прошла: {material_sent_at}")
             
     except Exception as e:
         logging.error(f"❌ Ошибка планирования отправки материалов: {e}")
 
-async def send_materials_at_scheduled_time(bot_id: int, user_id: int, button_url: str, file_id: str, file_type: str, delay_seconds: float):
+async def send_scheduled_materials(bot_id: int, user_id: int) -> tuple:
     """
-    Отправляет материалы через указанное время
+    Отправляет материалы, запланированные на дату рассылки
     
     Args:
         bot_id: ID бота
         user_id: ID пользователя
-        button_url: Ссылка на материалы
-        file_id: ID файла
-        file_type: Тип файла
-        delay_seconds: Задержка в секундах
+        
+    Returns:
+        tuple: (outcome, error) - класс итога отправки и текст ошибки:
+               'sent', 'not_subscribed' (отписался), 'forbidden' (заблокировал бота),
+               'bad_request' (Telegram отклонил сообщение), 'transient_error' или
+               'unavailable' (бот или его настройки недоступны - отправка откладывается)
     """
+    # Заблокировавшему бота материалы не отправляем
+    from .blocked_users import is_user_blocked, mark_user_blocked
+    if await is_user_blocked(bot_id, user_id):
+        logging.info(f"🚫 Пользователь {user_id} заблокировал бота {bot_id}, материалы не отправляем")
+        return 'forbidden', 'пользователь заблокировал бота'
+    
     try:
-        # Ждем указанное время
-        await asyncio.sleep(delay_seconds)
-        
-        # Получаем активного бота
-        from .bot_manager import _active_dispatchers
-        if bot_id not in _active_dispatchers:
+        # Получаем активного бота (спящий бот будет пробужден)
+        from .bot_manager import get_worker_bot
+        bot = await get_worker_bot(bot_id)
+        if not bot:
             logging.error(f"❌ Бот {bot_id} не активен для отправки материалов")
-            return
+            return 'unavailable', 'бот не активен'
         
-        bot_data = _active_dispatchers[bot_id]
-        bot = bot_data['bot']
+        # Материалы берем из текущих настроек бота
+        from .bot_config import get_bot_config
+        config = await get_bot_config(bot_id)
+        if not config:
+            return 'unavailable', 'настройки бота не найдены'
+        button_url, file_id, file_type = config.data[6], config.data[7], config.data[8]
         
         # Проверяем, что пользователь все еще подписан на все каналы
         not_subscribed_channels, _ = await check_user_subscriptions(user_id, bot_id)
         
         if not_subscribed_channels:
             logging.info(f"⚠️ Пользователь {user_id} отписался от каналов, материалы не отправляем")
-            return
+            return 'not_subscribed', None
         
         # Формируем сообщение с материалами
         materials_text = (
@@ -341,7 +346,7 @@ async def send_materials_at_scheduled_time(bot_id: int, user_id: int, button_url
                 self.user_id = user_id
             
             async def answer(self, text, reply_markup=None, parse_mode=None):
-                await self.bot.send_message(
+                return await self.bot.send_message(
                     chat_id=self.user_id,
                     text=text,
                     reply_markup=reply_markup,
@@ -349,7 +354,7 @@ async def send_materials_at_scheduled_time(bot_id: int, user_id: int, button_url
                 )
             
             async def answer_photo(self, photo, caption, reply_markup=None, parse_mode=None):
-                await self.bot.send_photo(
+                return await self.bot.send_photo(
                     chat_id=self.user_id,
                     photo=photo,
                     caption=caption,
@@ -358,7 +363,7 @@ async def send_materials_at_scheduled_time(bot_id: int, user_id: int, button_url
                 )
             
             async def answer_video(self, video, caption, reply_markup=None, parse_mode=None):
-                await self.bot.send_video(
+                return await self.bot.send_video(
                     chat_id=self.user_id,
                     video=video,
                     caption=caption,
@@ -367,7 +372,7 @@ async def send_materials_at_scheduled_time(bot_id: int, user_id: int, button_url
                 )
             
             async def answer_document(self, document, caption, reply_markup=None, parse_mode=None):
-                await self.bot.send_document(
+                return await self.bot.send_document(
                     chat_id=self.user_id,
                     document=document,
                     caption=caption,
@@ -378,11 +383,21 @@ async def send_materials_at_scheduled_time(bot_id: int, user_id: int, button_url
         temp_message = TempMessage(bot, user_id)
         
         if file_id and file_type:
-            await send_media_with_message(temp_message, file_id, file_type, materials_text, None)
+            await send_media_with_message(temp_message, file_id, file_type, materials_text, None, bot_id=bot_id)
         else:
             await temp_message.answer(materials_text, reply_markup=None, parse_mode=None)
         
         logging.info(f"✅ Материалы отправлены пользователю {user_id}")
+        return 'sent', None
         
+    except TelegramRetryAfter:
+        raise  # повтор после паузы решает рассылка
+    except TelegramForbiddenError as e:
+        await mark_user_blocked(bot_id, user_id)
+        return 'forbidden', str(e)
+    except TelegramBadRequest as e:
+        logging.error(f"❌ Telegram отклонил материалы для пользователя {user_id}: {e}")
+        return 'bad_request', str(e)
     except Exception as e:
         logging.error(f"❌ Ошибка отправки материалов пользователю {user_id}: {e}")
+        return 'transient_error', str(e)
@@ -4,17 +4,18 @@ worker_bot/handlers.py
 """
 
 import logging
-import os
 from aiogram import F, Router
 from aiogram.exceptions import TelegramBadRequest
-from aiogram.types import Message, CallbackQuery, InputMediaPhoto, FSInputFile
-from aiogram.filters import CommandStart
-from .reminder_manager import start_reminders, stop_reminders
+from aiogram.types import Message, CallbackQuery, ChatMemberUpdated, InputMediaPhoto
+from aiogram.filters import CommandStart, ChatMemberUpdatedFilter, KICKED, MEMBER
+from .reminder_manager import start_reminders, stop_reminders, update_reminder_message
+from .blocked_users import mark_user_blocked, mark_user_unblocked
+from .media_cache import image_media
+from .rendered_messages import get_rendered_message, get_text_hash, remember_rendered_message
 
 
 from .core import (
     check_user_subscriptions,
-    get_bot_data_for_worker,
     format_subscription_message,
     get_image_caption,
     format_materials_message,
@@ -23,84 +24,68 @@ from .core import (
 from .keyboards import create_subscription_keyboard, main_menu_kb
 from .media_utils import send_media_with_message, edit_media_message
 
-def setup_handlers(router: Router, bot_id: int):
-    """
-    Настраивает обработчики для роутера
+# Общий роутер всех рабочих ботов: bot_id и bot_config приходят из middleware
+router = Router(name="worker_bot")
+
+@router.message(CommandStart())
+async def cmd_start_worker(message: Message, bot_id: int, bot_config):
+    """Обработчик команды /start для рабочего бота"""
+    user_id = message.from_user.id
     
-    Args:
-        router: Роутер aiogram
-        bot_id: ID бота для которого настраиваются обработчики
-    """
+    # Проверяем подписки пользователя
+    not_subscribed_channels, channels_with_names = await check_user_subscriptions(user_id, bot_id)
     
-    @router.message(CommandStart())
-    async def cmd_start_worker(message: Message):
-        """Обработчик команды /start для рабочего бота"""
-        user_id = message.from_user.id
-        
-        # Проверяем подписки пользователя
-        not_subscribed_channels, channels_with_names = await check_user_subscriptions(user_id, bot_id)
-        
-        logging.info(f"🔍 Проверка подписок для пользователя {user_id}")
-        logging.info(f"📋 Все каналы: {channels_with_names}")
-        logging.info(f"❌ Не подписан на: {not_subscribed_channels}")
-        
-        if not channels_with_names:
-            await message.answer("❌ Бот не настроен. Обратитесь к администратору.")
-            return
-        
-        # Получаем данные бота
-        bot_data = await get_bot_data_for_worker(bot_id)
-        if not bot_data:
-            await message.answer("❌ Бот не найден в базе данных.")
-            return
-        
-        # Если пользователь подписан на все проверяемые каналы
-        if not not_subscribed_channels:
-            # Используем новую функцию для отправки сообщения об успешной подписке
-            await send_subscription_success_message(message, bot_data, user_id)
-            return
-        
-        # Если пользователь НЕ подписан на все каналы, показываем кнопки для подписки
-        bot_custom_message = bot_data[5] if bot_data[5] else ""  # message
-        image_filename = bot_data[9] if bot_data[9] else ""  # image_filename
-        
-        # Формируем подпись для изображения
-        caption = get_image_caption(bot_custom_message, channels_with_names)
-        keyboard = create_subscription_keyboard(not_subscribed_channels, channels_with_names)
-        
-        logging.info(f"⌨️ Создана клавиатура с {len(not_subscribed_channels)} кнопками")
-        
-        # ОТПРАВЛЯЕМ ИЗОБРАЖЕНИЕ С ПОДПИСЬЮ (если есть изображение)
-        sent_message = None
-        if image_filename:
-            try:
-                # Получаем путь к изображению
-                from main_bot.file_utils import get_bot_image_path
-                image_path = get_bot_image_path(bot_id, image_filename)
-                
-                if os.path.exists(image_path):
-                    # Используем FSInputFile для отправки локального файла
-                    photo = FSInputFile(image_path)
-                    sent_message = await message.answer_photo(
-                        photo=photo,
+    logging.info(f"🔍 Проверка подписок для пользователя {user_id}")
+    logging.info(f"📋 Все каналы: {channels_with_names}")
+    logging.info(f"❌ Не подписан на: {not_subscribed_channels}")
+    
+    if not channels_with_names:
+        await message.answer("❌ Бот не настроен. Обратитесь к администратору.")
+        return
+    
+    # Данные бота загружены middleware
+    bot_data = bot_config
+    if not bot_data:
+        await message.answer("❌ Бот не найден в базе данных.")
+        return
+    
+    # Если пользователь подписан на все проверяемые каналы
+    if not not_subscribed_channels:
+        # Используем новую функцию для отправки сообщения об успешной подписке
+        await send_subscription_success_message(message, bot_data, user_id)
+        return
+    
+    # Если пользователь НЕ подписан на все каналы, показываем кнопки для подписки
+    bot_custom_message = bot_data[5] if bot_data[5] else ""  # message
+    image_filename = bot_data[9] if bot_data[9] else ""  # image_filename
+    
+    # Формируем подпись для изображения
+    caption = get_image_caption(bot_custom_message, channels_with_names)
+    keyboard = create_subscription_keyboard(not_subscribed_channels, channels_with_names)
+    
+    logging.info(f"⌨️ Создана клавиатура с {len(not_subscribed_channels)} кнопками")
+    
+    # ОТПРАВЛЯЕМ ИЗОБРАЖЕНИЕ С ПОДПИСЬЮ (если есть изображение)
+    sent_message = None
+    if image_filename:
+        try:
+            # Путь к изображению (наличие файла - по индексу медиа в памяти)
+            from main_bot.file_utils import get_bot_image_path, find_bot_image
+            image_path = await find_bot_image(bot_id, image_filename)
+            
+            if image_path:
+                # С диска файл загружается только в первый раз, дальше - по file_id
+                async with image_media(bot_id, image_path, image_filename) as media:
+                    sent_message = await media.send(lambda file: message.answer_photo(
+                        photo=file,
                         caption=caption,
                         reply_markup=keyboard,
                         parse_mode="HTML" if bot_custom_message else None
-                    )
-                    logging.info(f"🖼️ Отправлено изображение для бота {bot_id}")
-                else:
-                    logging.warning(f"⚠️ Файл изображения не найден: {image_path}")
-                    # Отправляем текстовое сообщение если файл не найден
-                    full_message = format_subscription_message(bot_custom_message, channels_with_names)
-                    sent_message = await message.answer(
-                        full_message,
-                        reply_markup=keyboard,
-                        disable_web_page_preview=True,
-                        parse_mode="HTML" if bot_custom_message else None
-                    )
-            except Exception as e:
-                logging.error(f"❌ Ошибка отправки изображения: {e}")
-                # Если не удалось отправить изображение, отправляем текстовое сообщение
+                    ))
+                logging.info(f"🖼️ Отправлено изображение для бота {bot_id}")
+            else:
+                logging.warning(f"⚠️ Файл изображения не найден: {get_bot_image_path(bot_id, image_filename)}")
+                # Отправляем текстовое сообщение если файл не найден
                 full_message = format_subscription_message(bot_custom_message, channels_with_names)
                 sent_message = await message.answer(
                     full_message,
@@ -108,8 +93,9 @@ def setup_handlers(router: Router, bot_id: int):
                     disable_web_page_preview=True,
                     parse_mode="HTML" if bot_custom_message else None
                 )
-        else:
-            # Если изображения нет, отправляем текстовое сообщение
+        except Exception as e:
+            logging.error(f"❌ Ошибка отправки изображения: {e}")
+            # Если не удалось отправить изображение, отправляем текстовое сообщение
             full_message = format_subscription_message(bot_custom_message, channels_with_names)
             sent_message = await message.answer(
                 full_message,
@@ -117,119 +103,170 @@ def setup_handlers(router: Router, bot_id: int):
                 disable_web_page_preview=True,
                 parse_mode="HTML" if bot_custom_message else None
             )
-        
-        # ЗАПУСКАЕМ НАПОМИНАНИЯ (после отправки сообщения с кнопками)
-        if not_subscribed_channels and sent_message:
-            from .reminder_manager import start_reminders
-            try:
-                await start_reminders(bot_id, user_id, sent_message.message_id)
-                logging.info(f"🔔 Запущены напоминания для пользователя {user_id}")
-            except Exception as e:
-                logging.error(f"❌ Ошибка запуска напоминаний: {e}")
+    else:
+        # Если изображения нет, отправляем текстовое сообщение
+        full_message = format_subscription_message(bot_custom_message, channels_with_names)
+        sent_message = await message.answer(
+            full_message,
+            reply_markup=keyboard,
+            disable_web_page_preview=True,
+            parse_mode="HTML" if bot_custom_message else None
+        )
+    
+    if sent_message:
+        # Хэш - той же подписи, с которой сравнивает check_subs (и для текстового сообщения)
+        remember_rendered_message(
+            bot_id, user_id, sent_message.message_id, caption, not_subscribed_channels,
+            image_filename if sent_message.photo else None
+        )
+    
+    # ЗАПУСКАЕМ НАПОМИНАНИЯ (после отправки сообщения с кнопками)
+    if not_subscribed_channels and sent_message:
+        from .reminder_manager import start_reminders
+        try:
+            await start_reminders(bot_id, user_id, sent_message.message_id)
+            logging.info(f"🔔 Запущены напоминания для пользователя {user_id}")
+        except Exception as e:
+            logging.error(f"❌ Ошибка запуска напоминаний: {e}")
 
-    @router.callback_query(F.data == "check_subs")
-    async def check_subs_callback(callback: CallbackQuery):
-        """Обработчик кнопки 'Проверить подписки'"""
-        user_id = callback.from_user.id
+@router.callback_query(F.data == "check_subs")
+async def check_subs_callback(callback: CallbackQuery, bot_id: int, bot_config):
+    """Обработчик кнопки 'Проверить подписки'"""
+    user_id = callback.from_user.id
+    
+    try:
+        # Проверяем подписки пользователя (на callback отвечаем один раз - итогом проверки)
+        not_subscribed_channels, channels_with_names = await check_user_subscriptions(user_id, bot_id)
         
-        try:
-            # Отвечаем на callback сразу
-            await callback.answer("🔍 Проверяем подписки...", show_alert=False)
+        logging.info(f"🔍 Проверка подписок для пользователя {user_id}")
+        logging.info(f"❌ Не подписан на: {not_subscribed_channels}")
+        
+        if not channels_with_names:
+            await callback.answer()
+            await callback.message.answer("❌ Бот не настроен. Обратитесь к администратору.")
+            return
+        
+        # Данные бота загружены middleware
+        bot_data = bot_config
+        if not bot_data:
+            await callback.answer()
+            await callback.message.answer("❌ Бот не найден в базе данных.")
+            return
+        
+        # Если пользователь подписан на все каналы
+        if not not_subscribed_channels:
+            await callback.answer()
             
-            # Проверяем подписки пользователя
-            not_subscribed_channels, channels_with_names = await check_user_subscriptions(user_id, bot_id)
+            # Останавливаем напоминания
+            await stop_reminders(bot_id, user_id)
             
-            logging.info(f"🔍 Проверка подписок для пользователя {user_id}")
-            logging.info(f"❌ Не подписан на: {not_subscribed_channels}")
+            # Отправляем сообщение об успешной подписке
+            await send_subscription_success_message(callback.message, bot_data, user_id)
             
-            if not channels_with_names:
-                await callback.message.answer("❌ Бот не настроен. Обратитесь к администратору.")
-                return
+            # Пытаемся удалить старое сообщение с кнопками
+            try:
+                await callback.message.delete()
+            except TelegramBadRequest as e:
+                logging.warning(f"⚠️ Не удалось удалить сообщение: {e}")
             
-            # Получаем данные бота
-            bot_data = await get_bot_data_for_worker(bot_id)
-            if not bot_data:
-                await callback.message.answer("❌ Бот не найден в базе данных.")
-                return
+            return
+        
+        # Если пользователь НЕ подписан на все каналы
+        bot_custom_message = bot_data[5] if bot_data[5] else ""  # message
+        image_filename = bot_data[9] if bot_data[9] else ""  # image_filename
+        
+        # Формируем сообщение
+        caption = get_image_caption(bot_custom_message, channels_with_names)
+        keyboard = create_subscription_keyboard(not_subscribed_channels, channels_with_names)
+        
+        # Обновляем сообщение: фото загружается заново, только если его в сообщении еще нет
+        # или изображение бота заменили, иначе меняются подпись и/или кнопки - по сравнению
+        # с тем, что уже показано
+        parse_mode = "HTML" if bot_custom_message else None
+        message_id = callback.message.message_id
+        rendered = get_rendered_message(bot_id, user_id, message_id)
+        caption_changed = rendered is None or rendered.text_hash != get_text_hash(caption)
+        keyboard_changed = rendered is None or rendered.not_subscribed != tuple(not_subscribed_channels)
+        try:
+            from main_bot.file_utils import find_bot_image
+            image_path = await find_bot_image(bot_id, image_filename)
+            shown_image = None
+            if callback.message.photo:
+                # Неизвестное состояние (например, после перезапуска) считаем актуальным
+                shown_image = rendered.image if rendered is not None else image_filename
             
-            # Если пользователь подписан на все каналы
-            if not not_subscribed_channels:
-                # Останавливаем напоминания
-                await stop_reminders(bot_id, user_id)
-                
-                # Отправляем сообщение об успешной подписке
-                await send_subscription_success_message(callback.message, bot_data, user_id)
-                
-                # Пытаемся удалить старое сообщение с кнопками
+            if image_path and not callback.message.photo:
+                # Изображение появилось после отправки сообщения. Текстовое сообщение
+                # нельзя превратить в фото: отправляем новое, старое удаляем
+                async with image_media(bot_id, image_path, image_filename) as media:
+                    sent_message = await media.send(lambda file: callback.message.answer_photo(
+                        photo=file,
+                        caption=caption,
+                        reply_markup=keyboard,
+                        parse_mode=parse_mode
+                    ))
                 try:
                     await callback.message.delete()
                 except TelegramBadRequest as e:
                     logging.warning(f"⚠️ Не удалось удалить сообщение: {e}")
-                
+                message_id = sent_message.message_id
+                await update_reminder_message(bot_id, user_id, message_id)
+                shown_image = image_filename
+            elif image_path and shown_image != image_filename:
+                # Изображение бота заменили после отправки сообщения
+                async with image_media(bot_id, image_path, image_filename) as media:
+                    await media.send(lambda file: callback.message.edit_media(
+                        media=InputMediaPhoto(media=file, caption=caption, parse_mode=parse_mode),
+                        reply_markup=keyboard
+                    ))
+                shown_image = image_filename
+            elif not caption_changed and not keyboard_changed:
+                await callback.answer("✅ Вы уже проверяли подписки", show_alert=False)
                 return
+            elif not caption_changed:
+                await callback.message.edit_reply_markup(reply_markup=keyboard)
+            elif callback.message.photo:
+                await callback.message.edit_caption(
+                    caption=caption,
+                    reply_markup=keyboard,
+                    parse_mode=parse_mode
+                )
+            else:
+                await callback.message.edit_text(
+                    caption,
+                    reply_markup=keyboard,
+                    disable_web_page_preview=True,
+                    parse_mode=parse_mode
+                )
+            remember_rendered_message(bot_id, user_id, message_id, caption, not_subscribed_channels, shown_image)
             
-            # Если пользователь НЕ подписан на все каналы
-            bot_custom_message = bot_data[5] if bot_data[5] else ""  # message
-            image_filename = bot_data[9] if bot_data[9] else ""  # image_filename
+            # Запускаем/обновляем напоминания
+            await start_reminders(bot_id, user_id, message_id)
             
-            # Формируем сообщение
-            caption = get_image_caption(bot_custom_message, channels_with_names)
-            keyboard = create_subscription_keyboard(not_subscribed_channels, channels_with_names)
+            await callback.answer("❌ Вы не подписаны на все каналы!", show_alert=True)
             
-            # Обновляем сообщение с новыми данными
-            try:
-                # Если есть изображение, обновляем медиа
-                if image_filename:
-                    from main_bot.file_utils import get_bot_image_path
-                    import os
-                    
-                    image_path = get_bot_image_path(bot_id, image_filename)
-                    if os.path.exists(image_path):
-                        from aiogram.types import InputMediaPhoto, FSInputFile
-                        
-                        photo = FSInputFile(image_path)
-                        media = InputMediaPhoto(
-                            media=photo,
-                            caption=caption,
-                            parse_mode="HTML" if bot_custom_message else None
-                        )
-                        
-                        await callback.message.edit_media(
-                            media=media,
-                            reply_markup=keyboard
-                        )
-                    else:
-                        await callback.message.edit_text(
-                            caption,
-                            reply_markup=keyboard,
-                            disable_web_page_preview=True,
-                            parse_mode="HTML" if bot_custom_message else None
-                        )
-                else:
-                    await callback.message.edit_text(
-                        caption,
-                        reply_markup=keyboard,
-                        disable_web_page_preview=True,
-                        parse_mode="HTML" if bot_custom_message else None
-                    )
-                
-                # Запускаем/обновляем напоминания
-                await start_reminders(bot_id, user_id, callback.message.message_id)
-                
-                await callback.answer("❌ Вы не подписаны на все каналы!", show_alert=True)
-                
-            except TelegramBadRequest as e:
-                if "message is not modified" in str(e):
-                    await callback.answer("✅ Вы уже проверяли подписки", show_alert=False)
-                else:
-                    logging.error(f"❌ Ошибка обновления сообщения: {e}")
-                    await callback.answer("❌ Ошибка проверки подписок", show_alert=True)
-        
-        except Exception as e:
-            logging.error(f"❌ Ошибка в обработчике check_subs: {e}")
-            await callback.answer("❌ Ошибка проверки подписок", show_alert=True)
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                await callback.answer("✅ Вы уже проверяли подписки", show_alert=False)
+            else:
+                logging.error(f"❌ Ошибка обновления сообщения: {e}")
+                await callback.answer("❌ Ошибка проверки подписок", show_alert=True)
+    
+    except Exception as e:
+        logging.error(f"❌ Ошибка в обработчике check_subs: {e}")
+        await callback.answer("❌ Ошибка проверки подписок", show_alert=True)
+
+@router.my_chat_member(F.chat.type == "private", ChatMemberUpdatedFilter(member_status_changed=KICKED))
+async def user_blocked_bot(event: ChatMemberUpdated, bot_id: int):
+    """Пользователь заблокировал бота"""
+    await mark_user_blocked(bot_id, event.from_user.id)
+
+@router.my_chat_member(F.chat.type == "private", ChatMemberUpdatedFilter(member_status_changed=MEMBER))
+async def user_unblocked_bot(event: ChatMemberUpdated, bot_id: int):
+    """Пользователь разблокировал бота"""
+    await mark_user_unblocked(bot_id, event.from_user.id)
 
-    @router.callback_query(F.data == "main_button")
-    async def main_button_callback(callback: CallbackQuery):
-        """Обработчик главной кнопки"""
-        await callback.answer("🔗 Кнопка работает!", show_alert=True)
+@router.callback_query(F.data == "main_button")
+async def main_button_callback(callback: CallbackQuery):
+    """Обработчик главной кнопки"""
+    await callback.answer("🔗 Кнопка работает!", show_alert=True)
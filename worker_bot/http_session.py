@@ -0,0 +1,138 @@
+"""
+worker_bot/http_session.py
+Общий HTTP-пул процесса для всех экземпляров Bot
+"""
+
+import logging
+import ssl
+import certifi
+from aiohttp import ClientSession, TCPConnector
+from aiogram import __version__ as aiogram_version
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.exceptions import TelegramRetryAfter
+from config import TELEGRAM_HTTP_LIMIT, TELEGRAM_HTTP_KEEPALIVE, TELEGRAM_DNS_CACHE_TTL
+from .send_budget import BUDGETED_METHODS, get_send_budget, is_background_send
+
+_client_session = None  # общий aiohttp.ClientSession процесса
+_shared_session = None  # общий AiohttpSession для всех Bot
+_bot_stats = {}  # {telegram_bot_id: BotHttpStats}
+
+
+class BotHttpStats:
+    """Счетчики HTTP-запросов одного бота"""
+    __slots__ = ('requests', 'in_flight', 'errors')
+
+    def __init__(self):
+        self.requests = 0  # всего запросов
+        self.in_flight = 0  # соединений занято прямо сейчас
+        self.errors = 0  # запросов, завершившихся ошибкой
+
+
+async def get_shared_client_session() -> ClientSession:
+    """
+    Возвращает общий ClientSession процесса с одним настроенным TCPConnector
+
+    Returns:
+        ClientSession: Общая HTTP-сессия
+    """
+    global _client_session
+
+    if _client_session is None or _client_session.closed:
+        connector = TCPConnector(
+            ssl=ssl.create_default_context(cafile=certifi.where()),
+            limit=TELEGRAM_HTTP_LIMIT,
+            keepalive_timeout=TELEGRAM_HTTP_KEEPALIVE,
+            ttl_dns_cache=TELEGRAM_DNS_CACHE_TTL,
+        )
+        _client_session = ClientSession(
+            connector=connector,
+            headers={'User-Agent': f"aiogram/{aiogram_version}"}
+        )
+        logging.info(f"🌐 Создан общий HTTP-пул (лимит соединений: {TELEGRAM_HTTP_LIMIT or 'без лимита'})")
+
+    return _client_session
+
+
+class SharedAiohttpSession(AiohttpSession):
+    """
+    Сессия aiogram поверх общего HTTP-пула.
+    close() не закрывает пул: его закрывает только close_shared_session().
+    Отправки в чаты проходят через бюджет сообщений бота (send_budget).
+    """
+
+    async def create_session(self) -> ClientSession:
+        return await get_shared_client_session()
+
+    async def close(self) -> None:
+        pass
+
+    async def make_request(self, bot, method, timeout=None):
+        stats = _bot_stats.get(bot.id)
+        if stats is None:
+            stats = _bot_stats[bot.id] = BotHttpStats()
+
+        budget = get_send_budget(bot.id) if isinstance(method, BUDGETED_METHODS) else None
+        if budget is not None:
+            await budget.acquire(background=is_background_send())
+
+        stats.requests += 1
+        stats.in_flight += 1
+        try:
+            return await super().make_request(bot, method, timeout=timeout)
+        except TelegramRetryAfter as e:
+            stats.errors += 1
+            if budget is not None:
+                budget.pause(e.retry_after)
+            raise
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.in_flight -= 1
+
+
+def get_shared_session() -> SharedAiohttpSession:
+    """
+    Возвращает общую сессию для Bot(token=..., session=get_shared_session())
+
+    Returns:
+        SharedAiohttpSession: Сессия, общая для всех ботов процесса
+    """
+    global _shared_session
+    if _shared_session is None:
+        _shared_session = SharedAiohttpSession()
+    return _shared_session
+
+
+def get_http_stats(telegram_bot_id: int = None) -> dict:
+    """
+    Возвращает счетчики HTTP-запросов
+
+    Args:
+        telegram_bot_id: Telegram ID бота (опционально)
+
+    Returns:
+        dict: {telegram_bot_id: {'requests', 'in_flight', 'errors'}}
+    """
+    items = _bot_stats.items()
+    if telegram_bot_id is not None:
+        items = [(telegram_bot_id, _bot_stats[telegram_bot_id])] if telegram_bot_id in _bot_stats else []
+
+    return {
+        bot_id: {'requests': stats.requests, 'in_flight': stats.in_flight, 'errors': stats.errors}
+        for bot_id, stats in items
+    }
+
+
+def drop_http_stats(telegram_bot_id: int):
+    """Удаляет счетчики остановленного бота"""
+    _bot_stats.pop(telegram_bot_id, None)
+
+
+async def close_shared_session():
+    """Закрывает общий HTTP-пул (при завершении процесса)"""
+    global _client_session
+    if _client_session is not None and not _client_session.closed:
+        await _client_session.close()
+        logging.info("✅ Общий HTTP-пул закрыт")
+    _client_session = None
@@ -2,10 +2,11 @@
 import logging
 from aiogram import Bot
 from aiogram.enums import ChatMemberStatus
+from .http_session import get_shared_session
 
 class MainBotClient:
     def __init__(self, token: str):
-        self.bot = Bot(token=token)
+        self.bot = Bot(token=token, session=get_shared_session())
         self.bot_info = None
     
     async def initialize(self):
@@ -47,8 +48,30 @@ class MainBotClient:
             logging.error(f"💥 Общая ошибка при проверке {channel}: {e}")
             return False
 
+    async def notify_owner(self, telegram_id: int, text: str, message_id: int = None):
+        """
+        Отправляет владельцу бота уведомление или обновляет отправленное ранее
+        
+        Returns:
+            int: ID сообщения с уведомлением (None при ошибке)
+        """
+        try:
+            if message_id:
+                try:
+                    await self.bot.edit_message_text(text, chat_id=telegram_id, message_id=message_id, parse_mode="HTML")
+                    return message_id
+                except Exception as e:
+                    if "message is not modified" in str(e):
+                        return message_id
+                    # Сообщение удалено - отправляем новое
+            message = await self.bot.send_message(telegram_id, text, parse_mode="HTML")
+            return message.message_id
+        except Exception as e:
+            logging.warning(f"⚠️ Не удалось уведомить владельца {telegram_id}: {e}")
+            return None
+
     async def close(self):
-        """Закрывает сессию основного бота"""
+        """Закрывает сессию основного бота (общий HTTP-пул закрывается отдельно)"""
         await self.bot.session.close()
 
 # Глобальный экземпляр основного бота
@@ -0,0 +1,277 @@
+"""
+worker_bot/material_delivery.py
+Рассылка запланированных материалов из очереди material_deliveries
+"""
+
+import asyncio
+import logging
+import time
+from aiogram.exceptions import TelegramRetryAfter
+from database import (
+    get_bots_with_due_material_deliveries, get_bot_due_material_deliveries,
+    start_material_broadcast, save_material_broadcast_progress,
+    get_material_sent_date, get_bot_owner_telegram_id, prune_delivery_attempts
+)
+from .registry import bot_registry
+from .send_budget import background_sends
+
+# Очередь проверяется раз в столько секунд (или раньше, если появилась более ранняя отправка)
+MATERIAL_POLL_INTERVAL = 60
+MATERIAL_PAGE_SIZE = 500
+# Сколько материалов бота отправляется одновременно; темп задает бюджет сообщений бота
+MATERIAL_CONCURRENCY = 20
+# Временные ошибки: повтор через MATERIAL_RETRY_DELAY * 2^(попытка-1) секунд (не больше
+# MATERIAL_RETRY_MAX_DELAY); после MATERIAL_MAX_ATTEMPTS попыток отправка уходит в dead letter
+MATERIAL_RETRY_DELAY = 300
+MATERIAL_RETRY_MAX_DELAY = 6 * 3600
+MATERIAL_MAX_ATTEMPTS = 5
+# Итоги, после которых повтор бесполезен
+PERMANENT_OUTCOMES = ('forbidden', 'bad_request')
+# Журнал попыток хранится столько дней
+DELIVERY_ATTEMPTS_KEEP_DAYS = 30
+# Сколько раз подряд ждать RetryAfter для одного получателя
+MATERIAL_RETRY_AFTER_LIMIT = 5
+# Контрольная точка рассылки - после стольких отправок или секунд
+BROADCAST_CHECKPOINT_SIZE = 100
+BROADCAST_CHECKPOINT_INTERVAL = 5
+# Ход рассылки в сообщении владельцу обновляется раз в столько секунд
+BROADCAST_REPORT_INTERVAL = 30
+
+_delivery_task = None
+_wakeup = asyncio.Event()
+_earliest_due = float('inf')  # самая ранняя отправка, добавленная после проверки очереди
+_broadcasts = {}  # {bot_id: asyncio.Task} - рассылки, идущие сейчас
+
+
+class MaterialBroadcast:
+    """
+    Рассылка материалов бота на одну дату (material_sent_at).
+    Итоги отправок пишутся в БД контрольными точками, так что после сбоя
+    рассылка продолжается с неотправленных получателей.
+    """
+
+    def __init__(self, bot_id: int, total: int):
+        self.bot_id = bot_id
+        self.remaining = total
+        self.id = None
+        self.sent = self.skipped = self.failed = 0
+        self.owner_id = None
+        self.report_message_id = None
+        self.deferred = False  # бот стал недоступен - рассылка продолжится позже
+        self._finished = []  # [(status, bot_id, user_id)] с последней контрольной точки
+        self._retries = []  # [(due_at, bot_id, user_id)] с последней контрольной точки
+        self._attempts = []  # [(bot_id, user_id, attempt, outcome, error)] журнал попыток
+        self._dead_letters = []  # [(bot_id, user_id, outcome, error, attempts)]
+        self._checkpoint_at = time.monotonic()
+        self._report_at = 0.0
+
+    async def run(self):
+        release = await get_material_sent_date(self.bot_id) or ''
+        self.id, self.sent, self.skipped, self.failed, self.report_message_id = \
+            await start_material_broadcast(self.bot_id, release)
+        self.owner_id = await get_bot_owner_telegram_id(self.bot_id)
+        logging.info(f"📤 Рассылка материалов бота {self.bot_id}: {self.remaining} получателей")
+
+        await self._report()
+        now = time.time()
+        after_user_id = 0
+        while True:
+            rows = await get_bot_due_material_deliveries(self.bot_id, now, after_user_id, MATERIAL_PAGE_SIZE)
+            for i in range(0, len(rows), MATERIAL_CONCURRENCY):
+                chunk = rows[i:i + MATERIAL_CONCURRENCY]
+                await asyncio.gather(*(self._deliver(user_id, attempts) for user_id, attempts in chunk))
+                await self._checkpoint()
+                if self.deferred:
+                    break
+
+            if self.deferred:
+                # Неотправленное остается в очереди со старым сроком и без лишней попытки
+                await self._checkpoint(force=True)
+                logging.warning(f"⏸ Рассылка материалов бота {self.bot_id} отложена: бот недоступен")
+                return
+            if len(rows) < MATERIAL_PAGE_SIZE:
+                break
+            after_user_id = rows[-1][0]
+
+        self.remaining = 0
+        await self._checkpoint(done=True)
+        logging.info(
+            f"🏁 Рассылка материалов бота {self.bot_id} завершена: отправлено {self.sent}, "
+            f"пропущено {self.skipped}, не доставлено {self.failed}"
+        )
+
+    async def _deliver(self, user_id: int, attempts: int):
+        from .core import send_scheduled_materials
+
+        outcome, error = 'transient_error', 'RetryAfter'
+        try:
+            for _ in range(MATERIAL_RETRY_AFTER_LIMIT):
+                try:
+                    with background_sends():
+                        outcome, error = await send_scheduled_materials(self.bot_id, user_id)
+                    break
+                except TelegramRetryAfter as e:
+                    # Бюджет бота уже на паузе; ждем и повторяем, не считая попытку
+                    await asyncio.sleep(e.retry_after)
+        except Exception as e:
+            logging.error(f"❌ Ошибка отправки материалов пользователю {user_id}: {e}")
+            outcome, error = 'transient_error', str(e)
+
+        if outcome == 'unavailable':
+            # Отправка откладывается до следующей проверки очереди и попыткой не считается
+            self.deferred = True
+            return
+
+        attempt = attempts + 1
+        self._attempts.append((self.bot_id, user_id, attempt, outcome, error))
+        self.remaining = max(0, self.remaining - 1)
+
+        if outcome == 'transient_error' and attempt < MATERIAL_MAX_ATTEMPTS:
+            delay = min(MATERIAL_RETRY_DELAY * 2 ** (attempt - 1), MATERIAL_RETRY_MAX_DELAY)
+            self._retries.append((time.time() + delay, self.bot_id, user_id))
+            return
+
+        if outcome == 'sent':
+            self.sent += 1
+            status = 'sent'
+        elif outcome == 'not_subscribed':
+            self.skipped += 1
+            status = 'not_subscribed'
+        else:
+            # Окончательная ошибка или исчерпаны попытки
+            if outcome not in PERMANENT_OUTCOMES:
+                logging.error(f"❌ Материалы пользователю {user_id} (бот {self.bot_id}) не отправлены за {attempt} попыток")
+            self.failed += 1
+            status = 'dead'
+            self._dead_letters.append((self.bot_id, user_id, outcome, error, attempt))
+        self._finished.append((status, self.bot_id, user_id))
+
+    async def _checkpoint(self, done: bool = False, force: bool = False):
+        """
+        Пишет итоги отправок и счетчики рассылки, обновляет отчет владельцу
+
+        Args:
+            done: Рассылка завершена
+            force: Записать сразу, без отчета (рассылка прерывается)
+        """
+        pending = len(self._attempts)
+        if not (done or force) and pending < BROADCAST_CHECKPOINT_SIZE and \
+                time.monotonic() - self._checkpoint_at < BROADCAST_CHECKPOINT_INTERVAL:
+            return
+
+        if done or (not force and time.monotonic() - self._report_at >= BROADCAST_REPORT_INTERVAL):
+            await self._report(done)
+
+        finished, self._finished = self._finished, []
+        retries, self._retries = self._retries, []
+        attempts, self._attempts = self._attempts, []
+        dead_letters, self._dead_letters = self._dead_letters, []
+        await save_material_broadcast_progress(
+            self.id, finished, retries, attempts, dead_letters,
+            self.sent, self.skipped, self.failed, self.report_message_id, done
+        )
+        self._checkpoint_at = time.monotonic()
+
+        if done:
+            await prune_delivery_attempts(DELIVERY_ATTEMPTS_KEEP_DAYS)
+
+    async def _report(self, done: bool = False):
+        """Сообщение владельцу бота с ходом рассылки (одно, обновляется)"""
+        from .main_bot_client import get_main_bot
+        main_bot = get_main_bot()
+        if not main_bot or not self.owner_id:
+            return
+
+        from .bot_config import get_bot_config
+        config = await get_bot_config(self.bot_id)
+        bot_name = f"@{config.data[2]}" if config else f"ID {self.bot_id}"
+
+        title = "🏁 <b>Рассылка материалов завершена</b>" if done else "📤 <b>Идет рассылка материалов</b>"
+        text = (
+            f"{title}\n"
+            f"🤖 Бот: {bot_name}\n\n"
+            f"✅ Отправлено: {self.sent}\n"
+            f"⏭ Пропущено (отписались): {self.skipped}\n"
+            f"❌ Не доставлено: {self.failed}\n"
+            f"⏳ Осталось: {self.remaining}"
+        )
+        self.report_message_id = await main_bot.notify_owner(self.owner_id, text, self.report_message_id)
+        self._report_at = time.monotonic()
+
+
+async def _run_broadcast(bot_id: int, total: int):
+    broadcast = MaterialBroadcast(bot_id, total)
+    try:
+        await broadcast.run()
+    except asyncio.CancelledError:
+        # Бот остановлен: сохраняем итоги уже выполненных отправок, остальное останется в очереди
+        if broadcast.id is not None:
+            try:
+                await broadcast._checkpoint(force=True)
+            except Exception as e:
+                logging.error(f"❌ Ошибка сохранения рассылки материалов бота {bot_id}: {e}")
+        raise
+    except Exception as e:
+        logging.error(f"❌ Ошибка рассылки материалов бота {bot_id}: {e}")
+    finally:
+        if _broadcasts.get(bot_id) is asyncio.current_task():
+            del _broadcasts[bot_id]
+
+
+async def cancel_material_broadcast(bot_id: int):
+    """
+    Прерывает рассылку материалов бота (при остановке, засыпании или переносе бота).
+    Неотправленные материалы остаются в очереди.
+    """
+    task = _broadcasts.pop(bot_id, None)
+    if task is None or task.done():
+        return
+    task.cancel()
+    await asyncio.wait({task}, timeout=5.0)
+    logging.info(f"⏹ Рассылка материалов бота {bot_id} прервана")
+
+
+async def _process_due_deliveries():
+    """Запускает рассылки для ботов этого процесса, у которых наступили отправки"""
+    for bot_id, total in await get_bots_with_due_material_deliveries(time.time()):
+        # Боты другого процесса рассылают свои материалы сами
+        if bot_id in _broadcasts or bot_registry.get(bot_id) is None:
+            continue
+        _broadcasts[bot_id] = asyncio.create_task(_run_broadcast(bot_id, total))
+
+
+async def _delivery_loop():
+    global _earliest_due
+
+    while True:
+        # Наступившие отправки заберет этот проход, более поздние ждем дальше
+        if _earliest_due <= time.time():
+            _earliest_due = float('inf')
+        try:
+            await _process_due_deliveries()
+        except Exception as e:
+            logging.error(f"❌ Ошибка обработки очереди материалов: {e}")
+
+        # Следующая проверка - через MATERIAL_POLL_INTERVAL или к сроку новой отправки
+        next_check = time.time() + MATERIAL_POLL_INTERVAL
+        while (now := time.time()) < min(next_check, _earliest_due):
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), min(next_check, _earliest_due) - now)
+            except asyncio.TimeoutError:
+                pass
+
+
+def wake_material_delivery(due_at: float):
+    """Сообщает об отправке на due_at: очередь проверится не позже этого времени"""
+    global _earliest_due
+    if due_at < _earliest_due:
+        _earliest_due = due_at
+        _wakeup.set()
+
+
+def start_material_delivery():
+    """Запускает обработчик очереди материалов (вызывается при запуске бота)"""
+    global _delivery_task
+    if _delivery_task is None or _delivery_task.done():
+        _delivery_task = asyncio.create_task(_delivery_loop())
@@ -0,0 +1,284 @@
+"""
+worker_bot/media_cache.py
+Перенос медиа владельца в рабочих ботов, кэш file_id медиа и изображений ботов
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile, FSInputFile
+from database import (
+    get_media_cache_file_id, save_media_cache_file_id, delete_media_cache_file_id, get_file_unique_id
+)
+
+# file_id привязан к боту, получившему файл: файл, загруженный владельцем в основной бот,
+# скачивается один раз и загружается в каждый рабочий бот один раз, дальше - по file_id
+MEDIA_DOWNLOAD_CACHE_BYTES = 64 * 1024 * 1024
+
+_file_ids = {}  # {(bot_id, media_hash): file_id рабочего бота}
+_media_hashes = {}  # {file_id основного бота: media_hash}
+_upload_locks = {}  # {(bot_id, media_hash): asyncio.Lock} - идущие первые загрузки
+_downloads = OrderedDict()  # {media_hash: (bytes, filename)} - скачанные через основной бот
+_downloads_size = 0
+
+
+def get_media_hash(file_id: str, file_unique_id: str = None) -> str:
+    """
+    Ключ медиа владельца в кэше: file_unique_id - один для файла, сколько бы раз
+    его ни загружали. Для файлов, сохраненных без него, - file_id основного бота.
+    """
+    if file_unique_id:
+        return hashlib.sha256(f"unique:{file_unique_id}".encode()).hexdigest()
+    return hashlib.sha256(file_id.encode()).hexdigest()
+
+
+async def resolve_media_hash(file_id: str) -> str:
+    """Ключ медиа владельца по file_id основного бота (file_unique_id берется из БД один раз)"""
+    media_hash = _media_hashes.get(file_id)
+    if media_hash is None:
+        media_hash = _media_hashes[file_id] = get_media_hash(file_id, await get_file_unique_id(file_id))
+    return media_hash
+
+
+class WorkerMedia:
+    """Медиа для отправки рабочим ботом: file_id из кэша или файл для первой загрузки"""
+    __slots__ = ('bot_id', 'media_hash', 'file', 'uploading', 'cached', 'load_file')
+
+    def __init__(self, bot_id: int, media_hash: str, file, uploading: bool = False,
+                 cached: bool = False, load_file=None):
+        self.bot_id = bot_id
+        self.media_hash = media_hash
+        self.file = file  # значение для photo=/video=/document=
+        self.uploading = uploading
+        self.cached = cached  # file - file_id рабочего бота из кэша
+        self.load_file = load_file  # файл для повторной загрузки
+
+    async def send(self, send):
+        """
+        Отправляет медиа: send(file) вызывает метод Bot с file в photo=/video=/document=.
+        Запоминает file_id первой загрузки. Если Telegram отклонил file_id из кэша
+        (устарел или у бота сменился токен), file_id забывается, а файл один раз
+        загружается заново.
+
+        Returns:
+            Ответ Telegram
+        """
+        try:
+            sent_message = await send(self.file)
+        except TelegramBadRequest as e:
+            if not self.cached or self.load_file is None:
+                raise
+            logging.warning(f"⚠️ Telegram отклонил file_id медиа {self.media_hash[:12]} бота {self.bot_id}, загружаем заново: {e}")
+            await forget_file_id(self.bot_id, self.media_hash, self.file)
+            async with upload_lock(self.bot_id, self.media_hash):
+                # Пока ждали, файл мог загрузить заново другой получатель
+                cached = await get_cached_file_id(self.bot_id, self.media_hash)
+                file = cached or await self.load_file()
+                if file is None:
+                    raise
+                self.file, self.cached, self.uploading = file, bool(cached), not cached
+                sent_message = await send(self.file)
+                await self.remember(sent_message)
+            return sent_message
+
+        await self.remember(sent_message)
+        return sent_message
+
+    async def remember(self, sent_message):
+        """Сохраняет file_id из ответа Telegram на первую загрузку"""
+        if not self.uploading or sent_message is None:
+            return
+        file_id = get_sent_file_id(sent_message)
+        if file_id:
+            await remember_file_id(self.bot_id, self.media_hash, file_id)
+
+
+def get_sent_file_id(sent_message):
+    """file_id медиа из отправленного сообщения"""
+    if sent_message.photo:
+        return sent_message.photo[-1].file_id
+    media = sent_message.video or sent_message.document or sent_message.animation
+    return media.file_id if media else None
+
+
+async def get_cached_file_id(bot_id: int, media_hash: str):
+    """file_id медиа в рабочем боте (память, затем БД)"""
+    key = (bot_id, media_hash)
+    file_id = _file_ids.get(key)
+    if file_id is None:
+        file_id = await get_media_cache_file_id(bot_id, media_hash)
+        if file_id:
+            _file_ids[key] = file_id
+    return file_id
+
+
+async def remember_file_id(bot_id: int, media_hash: str, file_id: str):
+    """Запоминает file_id медиа в рабочем боте (в памяти и в БД)"""
+    if _file_ids.get((bot_id, media_hash)) == file_id:
+        return
+    _file_ids[(bot_id, media_hash)] = file_id
+    await save_media_cache_file_id(bot_id, media_hash, file_id)
+    logging.info(f"📎 Закэширован file_id медиа {media_hash[:12]} для бота {bot_id}")
+
+
+async def forget_file_id(bot_id: int, media_hash: str, file_id: str):
+    """Забывает file_id медиа, который Telegram больше не принимает (в памяти и в БД)"""
+    if _file_ids.get((bot_id, media_hash)) == file_id:
+        del _file_ids[(bot_id, media_hash)]
+    await delete_media_cache_file_id(bot_id, media_hash, file_id)
+
+
+@asynccontextmanager
+async def upload_lock(bot_id: int, media_hash: str):
+    """Одна первая загрузка медиа в бота: остальные отправки ждут ее file_id"""
+    key = (bot_id, media_hash)
+    lock = _upload_locks.get(key)
+    if lock is None:
+        lock = _upload_locks[key] = asyncio.Lock()
+    try:
+        async with lock:
+            yield
+    finally:
+        if not lock.locked() and _upload_locks.get(key) is lock:
+            del _upload_locks[key]
+
+
+async def _download_from_main_bot(file_id: str, media_hash: str):
+    """Скачивает файл владельца через основной бот (один раз на процесс)"""
+    global _downloads_size
+
+    cached = _downloads.get(media_hash)
+    if cached is not None:
+        _downloads.move_to_end(media_hash)
+        return cached
+
+    from .main_bot_client import get_main_bot
+    main_bot = get_main_bot()
+    if not main_bot:
+        return None
+
+    file = await main_bot.bot.get_file(file_id)
+    data = (await main_bot.bot.download_file(file.file_path)).getvalue()
+    cached = (data, os.path.basename(file.file_path or "") or "file")
+
+    _downloads[media_hash] = cached
+    _downloads_size += len(data)
+    while _downloads_size > MEDIA_DOWNLOAD_CACHE_BYTES and len(_downloads) > 1:
+        _, (old_data, _) = _downloads.popitem(last=False)
+        _downloads_size -= len(old_data)
+    return cached
+
+
+@asynccontextmanager
+async def _cached_media(bot_id: int, media_hash: str, load_file, fallback=None):
+    """
+    file_id медиа из кэша или файл для первой загрузки (под блокировкой).
+    load_file() возвращает файл для загрузки или None - тогда отправляется fallback.
+    """
+    cached = await get_cached_file_id(bot_id, media_hash)
+    if cached:
+        yield WorkerMedia(bot_id, media_hash, cached, cached=True, load_file=load_file)
+        return
+
+    async with upload_lock(bot_id, media_hash):
+        # Пока ждали, файл мог загрузить другой получатель
+        cached = await get_cached_file_id(bot_id, media_hash)
+        if cached:
+            yield WorkerMedia(bot_id, media_hash, cached, cached=True, load_file=load_file)
+            return
+
+        file = await load_file()
+        if file is None:
+            yield WorkerMedia(bot_id, media_hash, fallback)
+            return
+
+        yield WorkerMedia(bot_id, media_hash, file, uploading=True)
+
+
+@asynccontextmanager
+async def worker_media(bot_id: int, file_id: str):
+    """
+    Медиа владельца для отправки рабочим ботом.
+    Если file_id рабочего бота еще нет, файл скачивается через основной бот
+    и загружается; отправлять нужно через media.send, чтобы file_id запомнился.
+
+    Usage:
+        async with worker_media(bot_id, file_id) as media:
+            sent = await media.send(lambda file: message.answer_photo(photo=file, ...))
+    """
+    media_hash = await resolve_media_hash(file_id)
+
+    async def load_file():
+        try:
+            downloaded = await _download_from_main_bot(file_id, media_hash)
+        except Exception as e:
+            logging.warning(f"⚠️ Не удалось скачать медиа через основной бот: {e}")
+            return None
+        if downloaded is None:
+            return None
+        data, filename = downloaded
+        return BufferedInputFile(data, filename)
+
+    # Если скачать не удалось - отправляем как раньше, по file_id основного бота
+    async with _cached_media(bot_id, media_hash, load_file, fallback=file_id) as media:
+        yield media
+
+
+def get_image_media_hash(image_filename: str) -> str:
+    """Ключ приветственного изображения бота в кэше (имена файлов уникальны)"""
+    return hashlib.sha256(f"image:{image_filename}".encode()).hexdigest()
+
+
+def image_media(bot_id: int, image_path: str, image_filename: str):
+    """
+    Приветственное изображение бота для отправки: с диска загружается только
+    первый раз, дальше отправляется по file_id (см. worker_media)
+    """
+    async def load_file():
+        # Путь найден по индексу медиа, а файл мог удалить другой процесс
+        from main_bot.media_store import check_media_file
+        if not await check_media_file(image_path):
+            raise FileNotFoundError(f"Файл изображения не найден: {image_path}")
+        return FSInputFile(image_path)
+
+    return _cached_media(bot_id, get_image_media_hash(image_filename), load_file)
+
+
+async def prewarm_bot_image(bot, bot_id: int):
+    """
+    Загружает изображение бота заранее, чтобы первый /start не ждал загрузки
+    (только при WORKER_PREWARM_IMAGES=1, иначе кэш заполняет первая отправка).
+    Получить file_id можно только отправкой, поэтому фото отправляется без звука
+    владельцу (если он запускал бота) и сразу удаляется.
+    """
+    from .bot_config import get_bot_config
+    from database import get_bot_owner_telegram_id
+
+    try:
+        config = await get_bot_config(bot_id)
+        if not config or not config.image_path:
+            return
+        owner_id = await get_bot_owner_telegram_id(bot_id)
+        if not owner_id:
+            return
+
+        async with image_media(bot_id, config.image_path, config.image_filename) as media:
+            if not media.uploading:
+                return  # file_id уже есть
+            sent_message = await media.send(
+                lambda file: bot.send_photo(owner_id, file, disable_notification=True)
+            )
+        await bot.delete_message(owner_id, sent_message.message_id)
+        logging.info(f"🔥 Изображение бота {bot_id} загружено заранее")
+    except Exception as e:
+        logging.debug(f"Изображение бота {bot_id} не загружено заранее: {e}")
+
+
+def forget_bot_media(bot_id: int):
+    """Выгружает file_id бота из памяти (при остановке бота)"""
+    for key in [key for key in _file_ids if key[0] == bot_id]:
+        del _file_ids[key]
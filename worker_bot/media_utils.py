@@ -6,7 +6,7 @@ worker_bot/media_utils.py
 import logging
 from aiogram.types import Message, CallbackQuery
 from aiogram.types import InputMediaPhoto, InputMediaVideo, InputMediaDocument
-from aiogram.exceptions import TelegramBadRequest
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
 from .keyboards import main_menu_kb
 
 async def send_media_with_message(
@@ -16,7 +16,8 @@ async def send_media_with_message(
     text: str, 
     button_url: str = None, 
     keyboard = None,
-    parse_mode: str = "HTML"
+    parse_mode: str = "HTML",
+    bot_id: int = None
 ):
     """
     Отправляет медиа-файл с сообщением
@@ -29,6 +30,8 @@ async def send_media_with_message(
         button_url: Ссылка для кнопки
         keyboard: Клавиатура (если None, используется main_menu_kb)
         parse_mode: Режим парсинга (HTML, Markdown, None)
+        bot_id: ID рабочего бота - file_id основного бота переносится в рабочий бот
+                через кэш медиа (без него отправка по чужому file_id не проходит)
     """
     # Проверяем, есть ли валидный файл
     if not file_id or not file_type:
@@ -44,34 +47,24 @@ async def send_media_with_message(
     try:
         reply_markup = keyboard or main_menu_kb(button_url)
         
-        if file_type == 'photo':
-            await message.answer_photo(
-                photo=file_id,
-                caption=text,
-                reply_markup=reply_markup,
-                parse_mode=parse_mode
-            )
-        elif file_type == 'video':
-            await message.answer_video(
-                video=file_id,
-                caption=text,
-                reply_markup=reply_markup,
-                parse_mode=parse_mode
-            )
-        elif file_type == 'document':
-            await message.answer_document(
-                document=file_id,
-                caption=text,
-                reply_markup=reply_markup,
-                parse_mode=parse_mode
-            )
-        else:
+        if file_type not in ('photo', 'video', 'document'):
             logging.warning(f"⚠️ Неизвестный тип файла: {file_type}")
             await message.answer(
                 text,
                 reply_markup=reply_markup,
                 parse_mode=parse_mode
             )
+            return
+        
+        if bot_id is None:
+            await _answer_media(message, file_type, file_id, text, reply_markup, parse_mode)
+            return
+        
+        from .media_cache import worker_media
+        async with worker_media(bot_id, file_id) as media:
+            await media.send(lambda file: _answer_media(message, file_type, file, text, reply_markup, parse_mode))
+    except (TelegramForbiddenError, TelegramRetryAfter):
+        raise  # заблокировал бота или лимит Telegram - текст тоже не дойдет
     except Exception as e:
         logging.error(f"❌ Ошибка отправки медиа: {e}")
         # Если не удалось отправить медиа, отправляем просто текст
@@ -81,6 +74,30 @@ async def send_media_with_message(
             parse_mode=parse_mode
         )
 
+async def _answer_media(message, file_type: str, media, text: str, reply_markup, parse_mode):
+    """Отправляет медиа нужного типа ответом на сообщение"""
+    if file_type == 'photo':
+        return await message.answer_photo(
+            photo=media,
+            caption=text,
+            reply_markup=reply_markup,
+            parse_mode=parse_mode
+        )
+    elif file_type == 'video':
+        return await message.answer_video(
+            video=media,
+            caption=text,
+            reply_markup=reply_markup,
+            parse_mode=parse_mode
+        )
+    else:
+        return await message.answer_document(
+            document=media,
+            caption=text,
+            reply_markup=reply_markup,
+            parse_mode=parse_mode
+        )
+
 async def edit_media_message(
     callback: CallbackQuery, 
     file_id: str, 
@@ -0,0 +1,156 @@
+"""
+worker_bot/middlewares.py
+Middleware для рабочих ботов
+"""
+
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from config import WORKER_THROTTLE_RATE, WORKER_THROTTLE_BURST
+
+# Через сколько секунд без апдейтов корзина пользователя удаляется
+THROTTLE_BUCKET_TTL = 300
+# Ответ на нажатие кнопки, отброшенное ограничением частоты
+THROTTLE_CALLBACK_NOTICE = "⏳ Слишком часто, подождите немного"
+
+
+class BotContextMiddleware(BaseMiddleware):
+    """
+    Определяет bot_id рабочего бота по Telegram ID экземпляра Bot.
+    Один экземпляр на все боты: обработчики получают bot_id из data.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        from .registry import bot_registry
+        bot_entry = bot_registry.get_by_telegram_id(data['bot'].id)
+        if bot_entry is None:
+            return None  # бот уже остановлен, апдейт не обрабатываем
+
+        data['bot_id'] = bot_entry.bot_id
+        return await handler(event, data)
+
+
+class _UserBucket:
+    """Корзина токенов пользователя в одном боте"""
+    __slots__ = ('tokens', 'updated', 'active')
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+        self.active = None  # ключ действия, которое сейчас обрабатывается
+
+
+def _action_key(event) -> Any:
+    """Ключ действия для склейки повторов: текст команды или callback_data"""
+    if event.message:
+        return ('message', event.message.text)
+    if event.callback_query:
+        return ('callback', event.callback_query.data)
+    return None
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничивает частоту сообщений и нажатий кнопок пользователя: token bucket
+    на (bot_id, user_id). Служебные апдейты (my_chat_member и другие) не ограничиваются,
+    чтобы не потерять блокировку или разблокировку бота. Повтор действия, которое
+    еще обрабатывается (та же команда или кнопка), склеивается с ним. Лишние
+    апдейты отбрасываются до любых запросов к БД и Telegram.
+    """
+
+    def __init__(self, rate: float = WORKER_THROTTLE_RATE, burst: int = WORKER_THROTTLE_BURST):
+        self.rate = rate  # токенов в секунду
+        self.burst = burst  # максимальный запас токенов
+        self._buckets = {}  # {(bot_id, user_id): _UserBucket}
+        self._last_sweep = time.monotonic()
+        self.dropped = 0
+
+    def _sweep(self, now: float):
+        """Удаляет корзины пользователей, которые давно ничего не присылали"""
+        expired = [
+            key for key, bucket in self._buckets.items()
+            if bucket.active is None and now - bucket.updated > THROTTLE_BUCKET_TTL
+        ]
+        for key in expired:
+            del self._buckets[key]
+        self._last_sweep = now
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get('event_from_user')
+        if self.rate <= 0 or user is None or not (event.message or event.callback_query):
+            return await handler(event, data)
+
+        now = time.monotonic()
+        if now - self._last_sweep > THROTTLE_BUCKET_TTL:
+            self._sweep(now)
+
+        key = (data['bot_id'], user.id)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _UserBucket(self.burst, now)
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+
+        action = _action_key(event)
+        if bucket.tokens < 1 or (action is not None and action == bucket.active):
+            self.dropped += 1
+            logging.debug(f"Апдейт пользователя {user.id} бота {data['bot_id']} отброшен ограничением частоты")
+            if event.callback_query:
+                # Без ответа у кнопки продолжает крутиться индикатор загрузки
+                try:
+                    await event.callback_query.answer(THROTTLE_CALLBACK_NOTICE)
+                except Exception as e:
+                    logging.debug(f"Не удалось ответить на отброшенный callback: {e}")
+            return None
+
+        bucket.tokens -= 1
+        if bucket.active is not None:
+            return await handler(event, data)
+
+        bucket.active = action
+        try:
+            return await handler(event, data)
+        finally:
+            bucket.active = None
+
+
+class ActivityMiddleware(BaseMiddleware):
+    """Отмечает время последнего апдейта бота (для перевода простаивающих ботов в спящий режим)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        from .bot_manager import touch_worker_bot
+        touch_worker_bot(data['bot_id'])
+        return await handler(event, data)
+
+
+class BotConfigMiddleware(BaseMiddleware):
+    """Загружает настройки бота из БД только для апдейтов, которые дошли до обработчика"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        from .bot_config import get_bot_config
+        config = await get_bot_config(data['bot_id'])
+        data['bot_config'] = config.data if config else None
+        return await handler(event, data)
@@ -0,0 +1,408 @@
+"""
+worker_bot/polling.py
+Polling рабочих ботов через общий диспетчер
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramUnauthorizedError
+from aiogram.methods import GetUpdates, TelegramMethod
+from aiogram.types import Update
+from aiogram.utils.backoff import Backoff, BackoffConfig
+from config import WORKER_UPDATE_QUEUE_SIZE, WORKER_HANDLER_CONCURRENCY, WORKER_DRAIN_TIMEOUT
+from database import save_pending_updates, get_pending_updates
+from .router import get_worker_dispatcher
+
+# Long polling: сколько секунд Telegram держит запрос getUpdates
+POLLING_TIMEOUT = 10
+
+POLLING_BACKOFF = BackoffConfig(min_delay=1.0, max_delay=30.0, factor=1.5, jitter=0.1)
+
+# Ответ пользователю, когда очередь бота переполнена
+BUSY_TEXT = "⏳ Бот сейчас перегружен, повторите через минуту."
+
+# Как часто логировать сброс апдейтов (секунды)
+SHED_LOG_INTERVAL = 10.0
+
+# Сколько апдейтов после самого старого необработанного можно держать неподтвержденными.
+# getUpdates отдает не больше 100 апдейтов, поэтому окно меньше: каждый запрос получает
+# новые апдейты. Необработанные апдейты старше окна сохраняются в БД и подтверждаются
+UNCONFIRMED_WINDOW = 50
+
+_update_queues = {}  # {bot_id: BotUpdateQueue}
+_last_poll = {}  # {bot_id: time.monotonic() последнего ответа на getUpdates}
+
+
+class BotUpdateQueue:
+    """
+    Ограниченная очередь апдейтов одного бота.
+    Обработчики запускаются по требованию (не больше concurrency одновременно)
+    и завершаются, когда очередь пуста, поэтому простаивающий бот не держит задач.
+
+    getUpdates не подтверждает необработанные апдейты (offset - самый старый из них),
+    так что после остановки, сбоя или переноса бота в другой шард Telegram доставит их
+    снова. Чтобы медленный обработчик не останавливал получение новых апдейтов,
+    необработанные апдейты старше UNCONFIRMED_WINDOW сохраняются в БД (pending_updates)
+    и подтверждаются; при следующем запуске бота они загружаются из БД.
+    При переполнении очереди лишние апдейты сбрасываются.
+    """
+
+    def __init__(self, bot: Bot, bot_id: int,
+                 maxsize: int = WORKER_UPDATE_QUEUE_SIZE,
+                 concurrency: int = WORKER_HANDLER_CONCURRENCY):
+        self.bot = bot
+        self.bot_id = bot_id
+        self.maxsize = maxsize
+        self.concurrency = concurrency
+        self._queue = deque()
+        self._workers = 0
+        self._worker_tasks = set()
+        self._busy_replies = 0
+
+        self._unfinished = {}  # {update_id: Update} - в очереди и в обработке
+        self._saved = set()  # update_id необработанных апдейтов, сохраненных в БД
+        self._save_writes = {}  # {update_id: Update - сохранить, None - удалить из БД}
+        self.last_update_id = None  # последний полученный update_id
+        self.stopping = False
+        self.fetch = None  # текущий запрос getUpdates
+
+        # Метрики
+        self.max_depth = 0
+        self.processed = 0
+        self.shed = 0
+        self._shed_logged = 0
+        self._last_shed_log = 0.0
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def running(self) -> int:
+        return self._workers
+
+    @property
+    def offset(self):
+        """
+        Offset для getUpdates: самый старый необработанный апдейт, которого нет в БД,
+        иначе следующий после последнего полученного (None - апдейтов еще не было)
+        """
+        if self.last_update_id is None:
+            return None
+        return min(
+            (update_id for update_id in self._unfinished if update_id not in self._saved),
+            default=self.last_update_id + 1
+        )
+
+    async def advance(self):
+        """
+        Сохраняет в БД необработанные апдейты старше UNCONFIRMED_WINDOW (и удаляет
+        обработанные) перед тем, как getUpdates их подтвердит.
+
+        Returns:
+            Offset для getUpdates
+        """
+        if self.last_update_id is not None:
+            oldest_allowed = self.last_update_id + 1 - UNCONFIRMED_WINDOW
+            for update_id, update in self._unfinished.items():
+                if update_id < oldest_allowed and update_id not in self._saved:
+                    self._saved.add(update_id)
+                    self._save_writes[update_id] = update
+        await self.flush_saved()
+        return self.offset
+
+    def save_unfinished(self):
+        """Отмечает для сохранения в БД все необработанные апдейты (см. flush_saved)"""
+        for update_id, update in self._unfinished.items():
+            if update_id not in self._saved:
+                self._saved.add(update_id)
+                self._save_writes[update_id] = update
+
+    async def flush_saved(self):
+        """Пишет в БД накопленные изменения сохраненных апдейтов"""
+        if not self._save_writes:
+            return
+
+        writes, self._save_writes = self._save_writes, {}
+        upserts = [
+            (self.bot_id, update_id, update.model_dump_json(exclude_none=True))
+            for update_id, update in writes.items() if update is not None
+        ]
+        deletes = [(self.bot_id, update_id) for update_id, update in writes.items() if update is None]
+        try:
+            await save_pending_updates(upserts, deletes)
+        except Exception as e:
+            logging.error(f"❌ Ошибка сохранения необработанных апдейтов бота {self.bot_id}: {e}")
+            for update_id, update in writes.items():
+                if update is None:
+                    self._save_writes.setdefault(update_id, None)
+                else:
+                    # Не сохранен - остается неподтвержденным
+                    self._saved.discard(update_id)
+
+    def _finish(self, update_id: int):
+        """Апдейт обработан (или сброшен): больше не держит offset и удаляется из БД"""
+        self._unfinished.pop(update_id, None)
+        if update_id in self._saved:
+            self._saved.discard(update_id)
+            # Еще не записанный апдейт просто не пишем
+            if self._save_writes.pop(update_id, None) is None:
+                self._save_writes[update_id] = None
+
+    def offer(self, update, saved: bool = False) -> bool:
+        """
+        Ставит апдейт в очередь. Повторно доставленные апдейты пропускаются.
+
+        Args:
+            saved: Апдейт загружен из БД (в очередь ставится, даже если она переполнена)
+
+        Returns:
+            bool: False, если апдейт не поставлен в очередь (повтор или очередь переполнена)
+        """
+        if self.last_update_id is not None and update.update_id <= self.last_update_id:
+            return False
+        self.last_update_id = update.update_id
+
+        if saved:
+            self._saved.add(update.update_id)
+        elif len(self._queue) >= self.maxsize:
+            self._shed(update)
+            return False
+
+        self._queue.append(update)
+        self._unfinished[update.update_id] = update
+        self.max_depth = max(self.max_depth, len(self._queue))
+
+        if self._workers < self.concurrency:
+            self._workers += 1
+            task = asyncio.create_task(self._work())
+            self._worker_tasks.add(task)
+            task.add_done_callback(self._worker_tasks.discard)
+        return True
+
+    async def _work(self):
+        try:
+            while self._queue:
+                update = self._queue.popleft()
+                await _process_update(self.bot, self.bot_id, update)
+                self._finish(update.update_id)
+                self.processed += 1
+        finally:
+            self._workers -= 1
+
+    async def drain(self, timeout: float) -> int:
+        """
+        Перестает брать апдейты из очереди и ждет работающие обработчики не дольше timeout.
+        Апдейты, которые не успели обработаться, остаются неподтвержденными (или в БД).
+
+        Returns:
+            int: Сколько апдейтов осталось необработанными
+        """
+        self._queue.clear()
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._worker_tasks and loop.time() < deadline:
+            await asyncio.wait(set(self._worker_tasks), timeout=deadline - loop.time())
+
+        for task in list(self._worker_tasks):
+            task.cancel()
+        return len(self._unfinished)
+
+    def _shed(self, update):
+        """Сбрасывает апдейт и отвечает пользователю коротким «повторите позже»"""
+        self.shed += 1
+
+        now = time.monotonic()
+        if now - self._last_shed_log >= SHED_LOG_INTERVAL:
+            logging.warning(
+                f"⚠️ Очередь бота {self.bot_id} переполнена: сброшено {self.shed - self._shed_logged} апдейтов "
+                f"(в очереди {self.depth}, обрабатывается {self.running})"
+            )
+            self._shed_logged = self.shed
+            self._last_shed_log = now
+
+        # Ответы «занято» тоже ограничены, чтобы не превратиться в новую лавину
+        if self._busy_replies < self.concurrency:
+            self._busy_replies += 1
+            asyncio.create_task(self._reply_busy(update))
+
+    async def _reply_busy(self, update):
+        try:
+            if update.message:
+                await self.bot.send_message(update.message.chat.id, BUSY_TEXT, parse_mode=None)
+            elif update.callback_query:
+                await self.bot.answer_callback_query(update.callback_query.id, text=BUSY_TEXT)
+        except Exception as e:
+            logging.debug(f"Не удалось отправить ответ о перегрузке ботом {self.bot_id}: {e}")
+        finally:
+            self._busy_replies -= 1
+
+    def get_stats(self) -> dict:
+        return {
+            'depth': self.depth,
+            'running': self.running,
+            'max_depth': self.max_depth,
+            'processed': self.processed,
+            'shed': self.shed,
+            'unfinished': len(self._unfinished),
+        }
+
+
+def get_update_queue_stats(bot_id: int = None) -> dict:
+    """
+    Возвращает метрики очередей апдейтов
+
+    Args:
+        bot_id: ID бота (опционально)
+
+    Returns:
+        dict: {bot_id: {'depth', 'running', 'max_depth', 'processed', 'shed', 'unfinished'}}
+    """
+    if bot_id is not None:
+        queue = _update_queues.get(bot_id)
+        return {bot_id: queue.get_stats()} if queue else {}
+    return {queue_bot_id: queue.get_stats() for queue_bot_id, queue in _update_queues.items()}
+
+
+def get_last_poll_time(bot_id: int):
+    """Время последнего ответа на getUpdates (time.monotonic) или None, если polling не идет"""
+    return _last_poll.get(bot_id)
+
+
+def _get_update_user(update):
+    event = update.message or update.callback_query
+    return event.from_user if event else None
+
+
+async def _process_update(bot: Bot, bot_id: int, update):
+    """Передает апдейт в общий диспетчер"""
+    dp = get_worker_dispatcher()
+    try:
+        response = await dp.feed_update(bot, update)
+        # Ответ обработчика в виде метода Telegram (как в webhook) выполняем сами
+        if isinstance(response, TelegramMethod):
+            await bot(response)
+    except TelegramForbiddenError:
+        # Пользователь заблокировал бота, пока обрабатывался его апдейт
+        user = _get_update_user(update)
+        if user:
+            from .blocked_users import mark_user_blocked
+            await mark_user_blocked(bot_id, user.id)
+    except Exception as e:
+        logging.error(f"❌ Ошибка обработки апдейта {update.update_id} ботом {bot_id}: {e}")
+
+
+async def run_worker_polling(bot: Bot, bot_id: int):
+    """
+    Получает апдейты бота через getUpdates и обрабатывает их в общем диспетчере.
+    Сетевые ошибки пережидает с backoff, отозванный токен (TelegramUnauthorizedError)
+    пробрасывает наружу. Нормально завершается только после stop_worker_polling().
+
+    Очередь апдейтов переживает перезапуск попытки polling: обработчики прошлой
+    попытки продолжают работу, а повторно доставленные апдейты пропускаются.
+    Новая очередь сначала берет апдейты, сохраненные в БД до прошлой остановки.
+
+    Args:
+        bot: Экземпляр бота
+        bot_id: ID бота в базе данных
+    """
+    dp = get_worker_dispatcher()
+    backoff = Backoff(config=POLLING_BACKOFF)
+    get_updates = GetUpdates(
+        timeout=POLLING_TIMEOUT,
+        allowed_updates=dp.resolve_used_update_types()
+    )
+    update_queue = _update_queues.get(bot_id)
+    if update_queue is None or update_queue.bot is not bot:
+        update_queue = _update_queues[bot_id] = BotUpdateQueue(bot, bot_id)
+        # Подтвержденные, но не обработанные до прошлой остановки апдейты - первыми
+        # (остальные необработанные Telegram доставит снова)
+        try:
+            for update_id, payload in await get_pending_updates(bot_id):
+                update_queue.offer(Update.model_validate_json(payload), saved=True)
+        except Exception as e:
+            logging.error(f"❌ Ошибка загрузки необработанных апдейтов бота {bot_id}: {e}")
+    failed = False
+    _last_poll[bot_id] = time.monotonic()
+
+    while not update_queue.stopping:
+        # Подтверждаем только обработанные или сохраненные в БД апдейты
+        get_updates.offset = await update_queue.advance()
+        update_queue.fetch = asyncio.ensure_future(
+            bot(get_updates, request_timeout=int(bot.session.timeout + POLLING_TIMEOUT))
+        )
+        try:
+            updates = await update_queue.fetch
+        except asyncio.CancelledError:
+            if update_queue.stopping:
+                break  # stop_worker_polling прервал ожидание апдейтов
+            update_queue.fetch.cancel()
+            raise
+        except TelegramUnauthorizedError:
+            _update_queues.pop(bot_id, None)
+            _last_poll.pop(bot_id, None)
+            raise
+        except Exception as e:
+            _last_poll[bot_id] = time.monotonic()
+            failed = True
+            logging.error(f"❌ Ошибка получения апдейтов бота {bot_id}: {type(e).__name__}: {e}")
+            await backoff.asleep()
+            continue
+        finally:
+            update_queue.fetch = None
+
+        _last_poll[bot_id] = time.monotonic()
+        if failed:
+            logging.info(f"✅ Соединение бота {bot_id} восстановлено")
+            backoff.reset()
+            failed = False
+
+        for update in updates:
+            update_queue.offer(update)
+
+
+async def stop_worker_polling(bot_id: int, timeout: float = WORKER_DRAIN_TIMEOUT,
+                              save_unfinished: bool = False):
+    """
+    Плавно останавливает polling бота: прекращает получение апдейтов, ждет
+    работающие обработчики не дольше timeout и подтверждает обработанные апдейты.
+    Необработанные апдейты Telegram доставит снова (или они уже в БД), так что их
+    обработает следующий запуск бота - в этом или другом процессе.
+
+    Args:
+        bot_id: ID бота в базе данных
+        timeout: Сколько секунд ждать работающие обработчики
+        save_unfinished: Сохранить все необработанные апдейты в БД и подтвердить их
+            (спящий режим: иначе они будят бота при каждом опросе)
+
+    Returns:
+        Подтвержденный offset (None - апдейтов не было)
+    """
+    update_queue = _update_queues.pop(bot_id, None)
+    _last_poll.pop(bot_id, None)
+    if update_queue is None:
+        return None
+
+    update_queue.stopping = True
+    if update_queue.fetch is not None:
+        update_queue.fetch.cancel()
+
+    unfinished = await update_queue.drain(timeout)
+    if unfinished:
+        logging.warning(f"⚠️ Бот {bot_id}: {unfinished} апдейтов не обработано, они будут обработаны при следующем запуске")
+        if save_unfinished:
+            update_queue.save_unfinished()
+
+    await update_queue.flush_saved()
+    offset = update_queue.offset
+    if offset is None:
+        return None
+    try:
+        await update_queue.bot(GetUpdates(offset=offset, limit=1, timeout=0))
+    except Exception as e:
+        logging.debug(f"Не удалось подтвердить апдейты бота {bot_id}: {e}")
+    return offset
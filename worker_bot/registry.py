@@ -0,0 +1,118 @@
+"""
+worker_bot/registry.py
+Реестр рабочих ботов процесса
+"""
+
+import asyncio
+
+
+class BotState:
+    """Состояния рабочего бота"""
+    STARTING = 'starting'  # идет запуск
+    RUNNING = 'running'  # polling запущен
+    STOPPING = 'stopping'  # идет остановка, итоговое состояние задает _stop_entry
+    DORMANT = 'dormant'  # спящий режим: есть только токен
+    STOPPED = 'stopped'  # остановлен, запись ждет удаления
+
+
+class BotEntry:
+    """Все, что процесс знает об одном рабочем боте"""
+    __slots__ = (
+        'bot_id', 'telegram_id', 'token', 'bot', 'dp', 'task', 'lock', 'state',
+        'last_activity', 'poll_attempt', 'stalled', 'update_offset',
+    )
+
+    def __init__(self, bot_id: int):
+        self.bot_id = bot_id  # ID в базе данных
+        self.telegram_id = None  # Telegram ID бота
+        self.token = None
+        self.bot = None  # экземпляр Bot
+        self.dp = None  # общий диспетчер
+        self.task = None  # задача _run_polling
+        self.lock = asyncio.Lock()  # защита от параллельного запуска/остановки
+        self.state = BotState.STOPPED
+        self.last_activity = 0.0  # time.monotonic() последнего апдейта
+        self.poll_attempt = None  # задача текущей попытки polling
+        self.stalled = False  # попытку polling отменил сторож
+        self.update_offset = None  # offset, подтвержденный при переходе в спящий режим
+
+
+class BotRegistry:
+    """
+    Реестр ботов с индексами по ID в базе и по Telegram ID.
+    Поиск, добавление и удаление - O(1).
+    """
+
+    def __init__(self):
+        self._by_id = {}  # {bot_id: BotEntry}
+        self._by_telegram_id = {}  # {telegram_id: BotEntry}
+
+    def __contains__(self, bot_id: int) -> bool:
+        return bot_id in self._by_id
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def get(self, bot_id: int):
+        """Запись бота по ID в базе или None"""
+        return self._by_id.get(bot_id)
+
+    def get_by_telegram_id(self, telegram_id: int):
+        """Запись бота по Telegram ID или None"""
+        return self._by_telegram_id.get(telegram_id)
+
+    def ensure(self, bot_id: int) -> BotEntry:
+        """Возвращает запись бота, создавая ее при необходимости"""
+        entry = self._by_id.get(bot_id)
+        if entry is None:
+            entry = self._by_id[bot_id] = BotEntry(bot_id)
+        return entry
+
+    def bind(self, entry: BotEntry, bot, dp):
+        """Привязывает к записи запущенный экземпляр Bot"""
+        if entry.telegram_id is not None and entry.telegram_id != bot.id:
+            self._by_telegram_id.pop(entry.telegram_id, None)
+        entry.bot = bot
+        entry.dp = dp
+        entry.token = bot.token
+        entry.telegram_id = bot.id
+        self._by_telegram_id[bot.id] = entry
+
+    def release(self, entry: BotEntry, state: str = BotState.STOPPED):
+        """
+        Освобождает Bot и задачи бота. Остановленная запись удаляется из реестра,
+        если ее лок никто не держит (иначе ее удалит владелец лока через discard).
+        """
+        if entry.telegram_id is not None and self._by_telegram_id.get(entry.telegram_id) is entry:
+            del self._by_telegram_id[entry.telegram_id]
+        entry.bot = None
+        entry.dp = None
+        entry.task = None
+        entry.poll_attempt = None
+        entry.stalled = False
+        entry.state = state
+        if state == BotState.STOPPED:
+            self.discard(entry)
+
+    def discard(self, entry: BotEntry):
+        """Удаляет остановленную запись, если ее лок свободен"""
+        if entry.state == BotState.STOPPED and not entry.lock.locked() and self._by_id.get(entry.bot_id) is entry:
+            del self._by_id[entry.bot_id]
+
+    def entries(self, state: str = None) -> list:
+        """Записи ботов (опционально только в заданном состоянии)"""
+        if state is None:
+            return list(self._by_id.values())
+        return [entry for entry in self._by_id.values() if entry.state == state]
+
+    def running_ids(self) -> list:
+        """ID ботов, у которых запущен polling"""
+        return [entry.bot_id for entry in self._by_id.values() if entry.task is not None]
+
+    def dormant_ids(self) -> list:
+        """ID спящих ботов"""
+        return [entry.bot_id for entry in self._by_id.values() if entry.state == BotState.DORMANT]
+
+
+# Единственный реестр процесса
+bot_registry = BotRegistry()
@@ -4,13 +4,65 @@ worker_bot/reminder_manager.py
 """
 
 import asyncio
+import heapq
+import itertools
+import json
 import logging
-from datetime import datetime, timedelta
+import random
+import time
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from database import (
+    save_reminders_batch, get_due_reminders, get_bot_reminder_policy, update_bot_reminder_policy,
+    add_reminder, count_reminders, get_stored_reminder_keys_sync, count_reminders_sync, update_reminder_message_id
+)
+from .registry import bot_registry
+from .reminder_policy import ReminderPolicy, validate_policy
+from .send_budget import background_sends
 
-# Глобальные переменные для управления напоминаниями
-_reminder_tasks = {}  # {(bot_id, user_id): task}
-_reminder_messages = {}  # {(bot_id, user_id): message_id}
-_reminder_intervals = {}  # {(bot_id, user_id): interval_minutes}
+# Базовый интервал между напоминаниями (секунды); расписание задает политика бота
+REMINDER_INTERVAL = 600
+# Сколько напоминаний отправляется одновременно (всего и одним ботом).
+# Темп отправки задает бюджет сообщений бота (send_budget)
+REMINDER_BATCH_SIZE = 50
+REMINDER_BOT_CONCURRENCY = 10
+# Напоминание бота, у которого заняты все слоты, откладывается на столько секунд
+REMINDER_DEFER_DELAY = 1.0
+
+# Напоминания хранятся в таблице reminders. В память загружаются только
+# напоминания ботов этого процесса со сроком в ближайшие REMINDER_LOAD_AHEAD секунд
+REMINDER_LOAD_AHEAD = 2 * REMINDER_INTERVAL
+REMINDER_LOAD_INTERVAL = 60
+REMINDER_PAGE_SIZE = 500
+# Напоминания, просроченные за время простоя, размазываются на столько секунд
+REMINDER_RESUME_JITTER = 300
+# Изменения копятся и пишутся в БД одной транзакцией раз в столько секунд
+REMINDER_FLUSH_INTERVAL = 2.0
+
+class _Reminder:
+    """Запланированное напоминание пользователю"""
+    __slots__ = ('due', 'seq', 'message_id', 'attempt')
+
+    def __init__(self, message_id: int = None, attempt: int = 0):
+        self.due = None  # time.time() следующей отправки, None - отправляется сейчас
+        self.seq = 0  # номер актуальной записи в куче
+        self.message_id = message_id  # сообщение, которое удалим при следующей отправке
+        self.attempt = attempt  # сколько напоминаний уже отправлено
+
+# Один планировщик на процесс: куча (due, seq, bot_id, user_id) и одна задача-диспетчер.
+# Записи в куче не удаляются при отмене: устаревшие пропускаются по seq
+_reminders = {}  # {(bot_id, user_id): _Reminder}
+_bot_users = {}  # {bot_id: set(user_id)}
+_heap = []
+_stale = 0  # устаревших записей в куче
+_seq = itertools.count(1)
+_wakeup = asyncio.Event()
+_dispatcher_task = None
+_in_flight = set()  # задачи отправки напоминаний
+_bot_in_flight = {}  # {bot_id: сколько напоминаний бота отправляется}
+
+_pending_writes = {}  # {(bot_id, user_id): (due_at, message_id, attempt) или None - удалить}
+_flush_task = None
+_loader_task = None
 
 async def send_reminder_message(bot_id: int, user_id: int, message_id: int = None):
     """
@@ -20,146 +72,399 @@ async def send_reminder_message(bot_id: int, user_id: int, message_id: int = Non
         bot_id: ID бота
         user_id: ID пользователя
         message_id: ID сообщения для удаления (если есть)
+        
+    Returns:
+        str: 'sent', 'stopped' (подписался или заблокировал бота), 'retry_after'
+             (уже перенесено), 'unavailable' (бот или его настройки недоступны), 'error'
     """
     try:
-        # Получаем активного бота
-        from .bot_manager import _active_dispatchers
-        if bot_id not in _active_dispatchers:
+        # Заблокировавшему бота не напоминаем (и не будим ради него спящего бота)
+        from .blocked_users import is_user_blocked, mark_user_blocked
+        if await is_user_blocked(bot_id, user_id):
+            await stop_reminders(bot_id, user_id)
+            return 'stopped'
+        
+        # Получаем активного бота (спящий бот будет пробужден)
+        from .bot_manager import get_worker_bot
+        bot = await get_worker_bot(bot_id)
+        if not bot:
             logging.info(f"⚠️ Бот {bot_id} не активен для отправки напоминания")
-            return
+            return 'unavailable'
         
-        bot_data = _active_dispatchers[bot_id]
-        bot = bot_data['bot']
+        # Настройки бота и готовые сообщения берутся из кэша (сбрасывается по config_version)
+        from .bot_config import get_bot_config
+        config = await get_bot_config(bot_id)
+        if not config:
+            logging.error(f"❌ Не удалось получить данные бота {bot_id}")
+            return 'unavailable'
         
         # Проверяем подписки пользователя
-        from .core import check_user_subscriptions, get_bot_data_for_worker
+        from .core import check_user_subscriptions
         not_subscribed_channels, channels_with_names = await check_user_subscriptions(user_id, bot_id)
         
         # Если пользователь подписался на все каналы, останавливаем напоминания
         if not not_subscribed_channels:
             logging.info(f"✅ Пользователь {user_id} подписался на все каналы, останавливаем напоминания")
             await stop_reminders(bot_id, user_id)
-            return
-        
-        # Получаем данные бота
-        bot_data_db = await get_bot_data_for_worker(bot_id)
-        if not bot_data_db:
-            logging.error(f"❌ Не удалось получить данные бота {bot_id}")
-            return
+            return 'stopped'
         
-        bot_custom_message = bot_data_db[5] if bot_data_db[5] else ""  # message
-        image_filename = bot_data_db[9] if bot_data_db[9] else ""  # image_filename
-        
-        # Формируем сообщение с напоминанием
-        from .core import get_image_caption, format_subscription_message
-        from .keyboards import create_subscription_keyboard
-        
-        caption = get_image_caption(bot_custom_message, channels_with_names)
-        keyboard = create_subscription_keyboard(not_subscribed_channels, channels_with_names)
-        
-        # Добавляем текст напоминания
-        reminder_text = "⏰ **Напоминание:** Вы еще не подписались на все каналы!\n\n"
+        payload = config.get_reminder_payload(not_subscribed_channels)
         
         # Удаляем старое сообщение если есть
         if message_id:
             try:
                 await bot.delete_message(chat_id=user_id, message_id=message_id)
+                reminder = _reminders.get((bot_id, user_id))
+                if reminder is not None:
+                    reminder.message_id = None  # при повторе (RetryAfter) удалять уже нечего
                 logging.info(f"🗑️ Удалено старое сообщение {message_id} для пользователя {user_id}")
             except Exception as e:
                 logging.warning(f"⚠️ Не удалось удалить старое сообщение: {e}")
         
         # Отправляем новое сообщение с напоминанием
         try:
-            # Если есть изображение, отправляем его
-            if image_filename:
-                from main_bot.file_utils import get_bot_image_path
-                import os
-                
-                image_path = get_bot_image_path(bot_id, image_filename)
-                if os.path.exists(image_path):
-                    from aiogram.types import FSInputFile
-                    photo = FSInputFile(image_path)
-                    sent_message = await bot.send_photo(
-                        chat_id=user_id,
-                        photo=photo,
-                        caption=f"{reminder_text}{caption}",
-                        reply_markup=keyboard,
-                        parse_mode="HTML" if bot_custom_message else None
-                    )
-                else:
-                    full_message = f"{reminder_text}{format_subscription_message(bot_custom_message, channels_with_names)}"
-                    sent_message = await bot.send_message(
+            # Если есть изображение, отправляем его (файл загружается только при первой отправке)
+            if config.image_path:
+                from .media_cache import image_media
+                async with image_media(bot_id, config.image_path, config.image_filename) as media:
+                    sent_message = await media.send(lambda file: bot.send_photo(
                         chat_id=user_id,
-                        text=full_message,
-                        reply_markup=keyboard,
-                        disable_web_page_preview=True,
-                        parse_mode="HTML" if bot_custom_message else None
-                    )
+                        photo=file,
+                        caption=payload.text,
+                        reply_markup=payload.keyboard,
+                        parse_mode=payload.parse_mode
+                    ))
             else:
-                full_message = f"{reminder_text}{format_subscription_message(bot_custom_message, channels_with_names)}"
                 sent_message = await bot.send_message(
                     chat_id=user_id,
-                    text=full_message,
-                    reply_markup=keyboard,
+                    text=payload.text,
+                    reply_markup=payload.keyboard,
                     disable_web_page_preview=True,
-                    parse_mode="HTML" if bot_custom_message else None
+                    parse_mode=payload.parse_mode
                 )
             
-            # Сохраняем ID нового сообщения
-            _reminder_messages[(bot_id, user_id)] = sent_message.message_id
-            logging.info(f"🔔 Отправлено напоминание пользователю {user_id}, следующее через 10 минут")
+            logging.info(f"🔔 Отправлено напоминание пользователю {user_id}")
+            from .rendered_messages import remember_rendered_message
+            remember_rendered_message(
+                bot_id, user_id, sent_message.message_id, payload.text, not_subscribed_channels,
+                config.image_filename if sent_message.photo else None
+            )
             
-            # Планируем следующее напоминание через 10 минут
+            # Планируем следующее напоминание по политике бота
             await schedule_next_reminder(bot_id, user_id, sent_message.message_id)
+            return 'sent'
             
+        except TelegramRetryAfter as e:
+            # Бот упирается в лимит Telegram - напоминание не теряем, а переносим
+            logging.warning(f"⏳ Лимит отправки бота {bot_id}, напоминание пользователю {user_id} перенесено на {e.retry_after} сек")
+            _retry_later(bot_id, user_id, e.retry_after)
+            return 'retry_after'
+        except TelegramForbiddenError:
+            await mark_user_blocked(bot_id, user_id)
+            return 'stopped'
         except Exception as e:
             logging.error(f"❌ Ошибка отправки напоминания пользователю {user_id}: {e}")
+            return 'error'
             
     except Exception as e:
         logging.error(f"❌ Общая ошибка в send_reminder_message: {e}")
+        return 'error'
 
-async def schedule_next_reminder(bot_id: int, user_id: int, message_id: int):
+async def get_reminder_policy(bot_id: int) -> ReminderPolicy:
+    """Политика напоминаний бота из кэша настроек (перечитывается при смене config_version)"""
+    from .bot_config import get_bot_config
+    config = await get_bot_config(bot_id)
+    if config is not None:
+        return config.reminder_policy
+    return ReminderPolicy.from_json(await get_bot_reminder_policy(bot_id))
+
+async def set_bot_reminder_policy(bot_id: int, telegram_id: int, policy: dict = None) -> bool:
     """
-    Планирует следующее напоминание через 10 минут
+    Устанавливает политику напоминаний бота. Запланированные напоминания
+    сохраняют срок, следующие планируются по новой политике. Кэш настроек бота
+    этого процесса сбрасывается сразу, другие процессы перечитают его по config_version.
     
     Args:
         bot_id: ID бота
-        user_id: ID пользователя
-        message_id: ID сообщения для удаления
+        telegram_id: Telegram ID владельца
+        policy: Поля политики поверх DEFAULT_POLICY (None - политика по умолчанию)
+        
+    Returns:
+        bool: False, если бот не найден или нет прав доступа
+        
+    Raises:
+        ValueError: Некорректная политика
+    """
+    raw = None if policy is None else json.dumps(validate_policy(policy), ensure_ascii=False)
+    if not await update_bot_reminder_policy(bot_id, telegram_id, raw):
+        return False
+    from .bot_config import invalidate_bot_config
+    invalidate_bot_config(bot_id)
+    return True
+
+def _schedule(bot_id: int, user_id: int, reminder: _Reminder, due: float):
+    """Ставит напоминание в кучу и будит диспетчер"""
+    global _dispatcher_task
+    
+    reminder.due = due
+    reminder.seq = next(_seq)
+    heapq.heappush(_heap, (reminder.due, reminder.seq, bot_id, user_id))
+    
+    _wakeup.set()
+    if _dispatcher_task is None or _dispatcher_task.done():
+        _dispatcher_task = asyncio.create_task(_dispatch_loop())
+
+def _remove(bot_id: int, user_id: int, persist: bool = True) -> bool:
+    """
+    Удаляет напоминание из памяти (запись в куче станет устаревшей)
+    
+    Args:
+        persist: Удалить и из БД (False - только выгрузить, например при остановке бота)
     """
+    global _stale
+    
+    reminder = _reminders.pop((bot_id, user_id), None)
+    if persist:
+        _queue_write(bot_id, user_id, None)
+    if reminder is None:
+        return False
+    
+    users = _bot_users.get(bot_id)
+    if users is not None:
+        users.discard(user_id)
+        if not users:
+            del _bot_users[bot_id]
+    
+    if reminder.due is not None:
+        _stale += 1
+        # Пересобираем кучу, когда устаревших записей больше половины
+        if _stale > 1000 and _stale * 2 > len(_heap):
+            _compact_heap()
+    return True
+
+def _queue_write(bot_id: int, user_id: int, reminder):
+    """Откладывает запись состояния напоминания в БД (None - удаление)"""
+    global _flush_task
+    
+    _pending_writes[(bot_id, user_id)] = (
+        None if reminder is None else (reminder.due, reminder.message_id, reminder.attempt)
+    )
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.create_task(_flush_loop())
+
+async def _flush_writes():
+    """Пишет накопленные изменения напоминаний одной транзакцией"""
+    global _pending_writes
+    
+    if not _pending_writes:
+        return
+    
+    batch, _pending_writes = _pending_writes, {}
+    upserts = [key + row for key, row in batch.items() if row is not None]
+    deletes = [key for key, row in batch.items() if row is None]
     try:
-        # Отменяем предыдущую задачу если есть
-        await stop_reminders(bot_id, user_id)
-        
-        # Создаем новую задачу на 10 минут (600 секунд)
-        task = asyncio.create_task(
-            send_reminder_after_delay(bot_id, user_id, message_id, 600)  # 10 минут = 600 секунд
-        )
+        await save_reminders_batch(upserts, deletes)
+    except Exception as e:
+        logging.error(f"❌ Ошибка сохранения напоминаний ({len(batch)} шт.): {e}")
+        # Возвращаем в очередь, не затирая более новые изменения
+        for key, row in batch.items():
+            _pending_writes.setdefault(key, row)
+
+async def _flush_loop():
+    while _pending_writes:
+        await asyncio.sleep(REMINDER_FLUSH_INTERVAL)
+        await _flush_writes()
+
+async def _load_due_reminders():
+    """
+    Загружает из БД постранично напоминания ботов этого процесса со сроком
+    в ближайшие REMINDER_LOAD_AHEAD секунд
+    """
+    now = time.time()
+    after = None
+    loaded = 0
+    
+    while True:
+        rows = await get_due_reminders(now + REMINDER_LOAD_AHEAD, after, REMINDER_PAGE_SIZE)
         
-        _reminder_tasks[(bot_id, user_id)] = task
-        logging.info(f"⏰ Запланировано следующее напоминание для пользователя {user_id} через 10 минут")
+        for bot_id, user_id, due_at, message_id, attempt in rows:
+            key = (bot_id, user_id)
+            # Уже в памяти, ждет записи в БД или бот работает в другом процессе
+            if key in _reminders or key in _pending_writes or bot_registry.get(bot_id) is None:
+                continue
+            
+            # Просроченные за время простоя напоминания размазываем, чтобы не отправить все разом
+            if due_at < now - REMINDER_LOAD_INTERVAL:
+                due_at = now + random.uniform(0, REMINDER_RESUME_JITTER)
+            
+            reminder = _reminders[key] = _Reminder(message_id, attempt)
+            _bot_users.setdefault(bot_id, set()).add(user_id)
+            _schedule(bot_id, user_id, reminder, max(due_at, now))
+            loaded += 1
         
+        if len(rows) < REMINDER_PAGE_SIZE:
+            break
+        last = rows[-1]
+        after = (last[2], last[0], last[1])
+        await asyncio.sleep(0)
+    
+    if loaded:
+        logging.info(f"⏰ Загружено напоминаний из БД: {loaded}")
+
+async def _load_loop():
+    while True:
+        try:
+            await _load_due_reminders()
+        except Exception as e:
+            logging.error(f"❌ Ошибка загрузки напоминаний: {e}")
+        await asyncio.sleep(REMINDER_LOAD_INTERVAL)
+
+def start_reminder_loader():
+    """Запускает периодическую загрузку напоминаний из БД (вызывается при запуске бота)"""
+    global _loader_task
+    if _loader_task is None or _loader_task.done():
+        _loader_task = asyncio.create_task(_load_loop())
+
+def _compact_heap():
+    global _heap, _stale
+    _heap = [
+        item for item in _heap
+        if (reminder := _reminders.get((item[2], item[3]))) is not None and reminder.seq == item[1]
+    ]
+    heapq.heapify(_heap)
+    _stale = 0
+
+def _retry_later(bot_id: int, user_id: int, delay: float):
+    """Повторяет отправку напоминания через delay секунд, не считая попытку"""
+    reminder = _reminders.get((bot_id, user_id))
+    if reminder is not None and reminder.due is None:
+        _schedule(bot_id, user_id, reminder, time.time() + delay + random.uniform(0, 1))
+
+async def _reschedule_failed(bot_id: int, user_id: int, outcome: str):
+    """
+    Переносит напоминание, которое не удалось отправить, по backoff политики бота.
+    Ошибка отправки считается попыткой (их число ограничено политикой), недоступность
+    бота - нет. Запись удаляется только при исчерпании политики.
+    """
+    reminder = _reminders.get((bot_id, user_id))
+    if reminder is None or reminder.due is not None:
+        return
+    
+    if outcome != 'unavailable':
+        reminder.attempt += 1
+    policy = await get_reminder_policy(bot_id)
+    if policy.is_exhausted(reminder.attempt):
+        logging.info(f"🛑 Напоминания пользователю {user_id} исчерпаны после ошибок отправки")
+        _remove(bot_id, user_id)
+        return
+    
+    _schedule(bot_id, user_id, reminder, policy.next_due(time.time(), reminder.attempt))
+    _queue_write(bot_id, user_id, reminder)
+    logging.info(f"🔁 Напоминание пользователю {user_id} перенесено ({outcome})")
+
+async def _fire(bot_id: int, user_id: int, message_id: int):
+    """
+    Отправляет наступившее напоминание. Если оно не отправилось и не остановлено
+    (подписка, блокировка), оно переносится, а не удаляется.
+    """
+    outcome = 'error'
+    try:
+        try:
+            with background_sends():
+                outcome = await send_reminder_message(bot_id, user_id, message_id)
+        except Exception as e:
+            logging.error(f"❌ Ошибка отправки напоминания пользователю {user_id}: {e}")
+        await _reschedule_failed(bot_id, user_id, outcome)
     except Exception as e:
-        logging.error(f"❌ Ошибка планирования напоминания: {e}")
+        # Напоминание остается в БД и будет загружено снова
+        logging.error(f"❌ Ошибка переноса напоминания пользователю {user_id}: {e}")
+        _remove(bot_id, user_id, persist=False)
+    finally:
+        count = _bot_in_flight.get(bot_id, 0) - 1
+        if count > 0:
+            _bot_in_flight[bot_id] = count
+        else:
+            _bot_in_flight.pop(bot_id, None)
+        _wakeup.set()  # освободился слот
 
-async def send_reminder_after_delay(bot_id: int, user_id: int, message_id: int, delay_seconds: int):
+async def _dispatch_loop():
+    """
+    Единственный цикл, запускающий отправку наступивших напоминаний.
+    Одновременно отправляется не больше REMINDER_BATCH_SIZE напоминаний
+    и не больше REMINDER_BOT_CONCURRENCY от одного бота, так что бот
+    с большой очередью не задерживает напоминания остальных ботов.
     """
-    Отправляет напоминание через указанное время
+    global _stale
+    
+    while _reminders or _in_flight:
+        _wakeup.clear()
+        now = time.time()
+        
+        while _heap and len(_in_flight) < REMINDER_BATCH_SIZE:
+            due, seq, bot_id, user_id = _heap[0]
+            reminder = _reminders.get((bot_id, user_id))
+            if reminder is None or reminder.seq != seq:
+                heapq.heappop(_heap)
+                _stale = max(0, _stale - 1)
+                continue
+            if due > now:
+                break
+            heapq.heappop(_heap)
+            
+            if _bot_in_flight.get(bot_id, 0) >= REMINDER_BOT_CONCURRENCY:
+                _schedule(bot_id, user_id, reminder, now + REMINDER_DEFER_DELAY)
+                continue
+            
+            reminder.due = None
+            _bot_in_flight[bot_id] = _bot_in_flight.get(bot_id, 0) + 1
+            task = asyncio.create_task(_fire(bot_id, user_id, reminder.message_id))
+            _in_flight.add(task)
+            task.add_done_callback(_in_flight.discard)
+        
+        # Ждем освобождения слота или следующего срока
+        timeout = None
+        if _heap and len(_in_flight) < REMINDER_BATCH_SIZE:
+            timeout = max(0, _heap[0][0] - now)
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+    
+    # Напоминаний не осталось - в куче только устаревшие записи
+    _heap.clear()
+    _stale = 0
+
+async def schedule_next_reminder(bot_id: int, user_id: int, message_id: int):
+    """
+    Планирует следующее напоминание по политике бота. После последнего
+    разрешенного напоминания цикл напоминаний завершается.
     
     Args:
         bot_id: ID бота
         user_id: ID пользователя
         message_id: ID сообщения для удаления
-        delay_seconds: Задержка в секундах
     """
     try:
-        await asyncio.sleep(delay_seconds)
-        await send_reminder_message(bot_id, user_id, message_id)
+        reminder = _reminders.get((bot_id, user_id))
+        if reminder is None:
+            return  # напоминания остановлены, пока отправлялось сообщение
+        
+        reminder.message_id = message_id
+        reminder.attempt += 1
+        
+        policy = await get_reminder_policy(bot_id)
+        if policy.is_exhausted(reminder.attempt):
+            logging.info(f"🛑 Пользователю {user_id} отправлено {reminder.attempt} напоминаний, больше не напоминаем")
+            _remove(bot_id, user_id)
+            return
+        
+        now = time.time()
+        _schedule(bot_id, user_id, reminder, policy.next_due(now, reminder.attempt))
+        _queue_write(bot_id, user_id, reminder)
+        logging.info(f"⏰ Запланировано следующее напоминание для пользователя {user_id} через {int(reminder.due - now) // 60} мин")
         
-    except asyncio.CancelledError:
-        logging.info(f"✅ Напоминание для пользователя {user_id} отменено")
     except Exception as e:
-        logging.error(f"❌ Ошибка в send_reminder_after_delay: {e}")
+        logging.error(f"❌ Ошибка планирования напоминания: {e}")
 
 async def start_reminders(bot_id: int, user_id: int, message_id: int = None):
     """
@@ -173,22 +478,53 @@ async def start_reminders(bot_id: int, user_id: int, message_id: int = None):
     try:
         logging.info(f"🔔 Запуск напоминаний для пользователя {user_id}")
         
-        # Проверяем, не запущены ли уже напоминания
-        if (bot_id, user_id) in _reminder_tasks:
+        # Проверяем, не запущены ли уже напоминания (в памяти только ближайшие,
+        # остальные - в БД; существующее расписание не сбрасываем)
+        key = (bot_id, user_id)
+        if key in _reminders:
+            logging.info(f"ℹ️ Напоминания для пользователя {user_id} уже запущены")
+            return
+        
+        policy = await get_reminder_policy(bot_id)
+        if policy.is_exhausted(0):
+            return
+        
+        if key in _pending_writes:
+            await _flush_writes()  # например, еще не записанное удаление
+        now = time.time()
+        due = policy.next_due(now, 0)
+        if not await add_reminder(bot_id, user_id, due, message_id) or key in _reminders:
             logging.info(f"ℹ️ Напоминания для пользователя {user_id} уже запущены")
             return
         
         # Сохраняем ID сообщения для будущего удаления
-        if message_id:
-            _reminder_messages[(bot_id, user_id)] = message_id
+        reminder = _reminders[key] = _Reminder(message_id)
+        _bot_users.setdefault(bot_id, set()).add(user_id)
         
-        # Планируем первое напоминание через 10 минут
-        await schedule_next_reminder(bot_id, user_id, message_id)
-        logging.info(f"⏰ Первое напоминание запланировано для пользователя {user_id} через 10 минут")
+        # Планируем первое напоминание по политике бота
+        _schedule(bot_id, user_id, reminder, due)
+        logging.info(f"⏰ Первое напоминание запланировано для пользователя {user_id} через {int(reminder.due - now) // 60} мин")
         
     except Exception as e:
         logging.error(f"❌ Ошибка запуска напоминаний: {e}")
 
+async def update_reminder_message(bot_id: int, user_id: int, message_id: int):
+    """
+    Меняет сообщение, которое удалит следующее напоминание
+    (сообщение с кнопками заменено новым)
+    """
+    try:
+        reminder = _reminders.get((bot_id, user_id))
+        if reminder is None:
+            await update_reminder_message_id(bot_id, user_id, message_id)
+            return
+        reminder.message_id = message_id
+        if reminder.due is not None:
+            _queue_write(bot_id, user_id, reminder)
+        
+    except Exception as e:
+        logging.error(f"❌ Ошибка обновления сообщения напоминания: {e}")
+
 async def stop_reminders(bot_id: int, user_id: int):
     """
     Останавливает напоминания для пользователя
@@ -198,66 +534,58 @@ async def stop_reminders(bot_id: int, user_id: int):
         user_id: ID пользователя
     """
     try:
-        key = (bot_id, user_id)
-        
-        # Отменяем задачу если есть
-        if key in _reminder_tasks:
-            task = _reminder_tasks[key]
-            if not task.done():
-                task.cancel()
-                try:
-                    await task
-                except asyncio.CancelledError:
-                    pass
-            del _reminder_tasks[key]
-        
-        # Очищаем сообщение
-        if key in _reminder_messages:
-            del _reminder_messages[key]
-        
-        logging.info(f"🛑 Остановлены напоминания для пользователя {user_id}")
+        if _remove(bot_id, user_id):
+            logging.info(f"🛑 Остановлены напоминания для пользователя {user_id}")
         
     except Exception as e:
         logging.error(f"❌ Ошибка остановки напоминаний: {e}")
 
 async def stop_all_reminders_for_bot(bot_id: int):
     """
-    Останавливает все напоминания для указанного бота
+    Останавливает все напоминания для указанного бота. Напоминания остаются
+    в БД и продолжатся после следующего запуска бота.
     
     Args:
         bot_id: ID бота
     """
     try:
-        keys_to_remove = []
+        user_ids = list(_bot_users.get(bot_id, ()))
         
-        for (b_id, user_id) in list(_reminder_tasks.keys()):
-            if b_id == bot_id:
-                await stop_reminders(bot_id, user_id)
-                keys_to_remove.append((b_id, user_id))
+        for user_id in user_ids:
+            _remove(bot_id, user_id, persist=False)
+        await _flush_writes()
         
-        logging.info(f"🛑 Остановлены все напоминания для бота {bot_id} ({len(keys_to_remove)} пользователей)")
+        logging.info(f"🛑 Остановлены все напоминания для бота {bot_id} ({len(user_ids)} пользователей)")
         
     except Exception as e:
         logging.error(f"❌ Ошибка остановки всех напоминаний для бота {bot_id}: {e}")
 
 async def stop_all_reminders():
     """
-    Останавливает все напоминания для всех ботов
+    Останавливает все напоминания для всех ботов (в БД они сохраняются)
     """
+    global _stale
+    
     try:
-        keys_to_remove = list(_reminder_tasks.keys())
+        count = len(_reminders)
         
-        for (bot_id, user_id) in keys_to_remove:
-            await stop_reminders(bot_id, user_id)
+        _reminders.clear()
+        _bot_users.clear()
+        _heap.clear()
+        _stale = 0
+        _wakeup.set()
+        await _flush_writes()
         
-        logging.info(f"🛑 Остановлены все напоминания ({len(keys_to_remove)} пользователей)")
+        logging.info(f"🛑 Остановлены все напоминания ({count} пользователей)")
         
     except Exception as e:
         logging.error(f"❌ Ошибка остановки всех напоминаний: {e}")
 
 def is_reminder_active(bot_id: int, user_id: int) -> bool:
     """
-    Проверяет, активны ли напоминания для пользователя
+    Проверяет, активны ли напоминания для пользователя. В памяти загружены только
+    ближайшие напоминания, остальные проверяются по БД (с учетом еще не записанных
+    изменений)
     
     Args:
         bot_id: ID бота
@@ -266,11 +594,16 @@ def is_reminder_active(bot_id: int, user_id: int) -> bool:
     Returns:
         bool: True если напоминания активны
     """
-    return (bot_id, user_id) in _reminder_tasks
+    key = (bot_id, user_id)
+    if key in _pending_writes:
+        return _pending_writes[key] is not None
+    if key in _reminders:
+        return True
+    return key in get_stored_reminder_keys_sync([key])
 
 def get_active_reminders_count(bot_id: int = None) -> int:
     """
-    Возвращает количество активных напоминаний
+    Возвращает количество активных напоминаний (по БД с учетом еще не записанных изменений)
     
     Args:
         bot_id: ID бота (опционально)
@@ -278,7 +611,26 @@ def get_active_reminders_count(bot_id: int = None) -> int:
     Returns:
         int: Количество активных напоминаний
     """
-    if bot_id:
-        return len([key for key in _reminder_tasks.keys() if key[0] == bot_id])
-    else:
-        return len(_reminder_tasks)
+    keys = [key for key in _pending_writes if not bot_id or key[0] == bot_id]
+    count = count_reminders_sync(bot_id or None)
+    stored = get_stored_reminder_keys_sync(keys)
+    for key in keys:
+        if _pending_writes[key] is None:
+            count -= key in stored
+        else:
+            count += key not in stored
+    return count
+
+async def count_stored_reminders(bot_id: int = None, due_before: float = None) -> int:
+    """
+    Возвращает количество напоминаний в БД (с учетом еще не записанных изменений)
+    
+    Args:
+        bot_id: ID бота (опционально)
+        due_before: Считать только напоминания со сроком не позже (unix-время)
+        
+    Returns:
+        int: Количество напоминаний
+    """
+    await _flush_writes()
+    return await count_reminders(bot_id, due_before)
@@ -0,0 +1,146 @@
+"""
+worker_bot/reminder_policy.py
+Политика напоминаний бота: расписание, backoff, лимит и тихие часы.
+Владелец меняет политику в настройках бота (bots.reminder_policy, JSON),
+боты без своей политики работают по DEFAULT_POLICY
+"""
+
+import json
+import logging
+import random
+import re
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Политика по умолчанию: 10 минут, час, 6 часов, дальше x2 (не больше суток) - не больше 5 напоминаний,
+# ночью (23:00-09:00 по Москве) не напоминаем
+DEFAULT_POLICY = {
+    'intervals': [600, 3600, 21600],  # задержки перед 1-м, 2-м, 3-м... напоминанием (секунды)
+    'backoff': 2.0,  # множитель задержки после окончания расписания (не меньше 1)
+    'max_interval': 86400,  # максимальная задержка (секунды)
+    'max_attempts': 5,  # сколько всего напоминаний отправить (не меньше 1)
+    'quiet_hours': [23, 9],  # [начало, конец) тихих часов, None - без тихих часов
+    'timezone': 'Europe/Moscow',  # часовой пояс тихих часов: имя IANA или смещение от UTC ("+3")
+}
+
+_OFFSET_RE = re.compile(r'^(?:UTC|GMT)?\s*([+-]\d{1,2}(?:\.\d+)?)$', re.IGNORECASE)
+
+# Напоминания, перенесенные с тихих часов, отправляются в течение стольких секунд после их конца
+QUIET_END_SPREAD = 1800
+
+
+def get_timezone(value):
+    """Часовой пояс по имени IANA ("Europe/Moscow") или смещению от UTC ("+3", "UTC-5", 3)"""
+    if isinstance(value, (int, float)):
+        offset = float(value)
+    else:
+        match = _OFFSET_RE.match(str(value).strip())
+        if not match:
+            try:
+                return ZoneInfo(str(value).strip())
+            except (ZoneInfoNotFoundError, ValueError):
+                raise ValueError(f"Неизвестный часовой пояс: {value}")
+        offset = float(match.group(1))
+    if not -14 <= offset <= 14:
+        raise ValueError(f"Неизвестный часовой пояс: {value}")
+    return timezone(timedelta(hours=offset))
+
+
+def validate_policy(overrides: dict) -> dict:
+    """
+    Проверяет политику бота: поля overrides поверх DEFAULT_POLICY
+
+    Returns:
+        dict: Полная политика
+
+    Raises:
+        ValueError: Неизвестные поля или недопустимые значения
+    """
+    if not isinstance(overrides, dict):
+        raise ValueError("Политика должна быть объектом JSON")
+    overrides = dict(overrides)
+    # Старый формат: часовой пояс смещением в часах
+    if 'utc_offset' in overrides and 'timezone' not in overrides:
+        overrides['timezone'] = overrides.pop('utc_offset')
+    unknown = set(overrides) - set(DEFAULT_POLICY)
+    if unknown:
+        raise ValueError(f"Неизвестные поля политики: {', '.join(sorted(unknown))}")
+
+    policy = {**DEFAULT_POLICY, **overrides}
+    try:
+        ReminderPolicy(**policy)
+    except (TypeError, ValueError) as e:
+        raise ValueError(str(e))
+    return policy
+
+
+class ReminderPolicy:
+    """Разобранная политика напоминаний"""
+    __slots__ = ('intervals', 'backoff', 'max_interval', 'max_attempts', 'quiet_hours', 'timezone', 'tz')
+
+    def __init__(self, intervals: list, backoff: float, max_interval: int,
+                 max_attempts: int, quiet_hours, timezone: str):
+        if int(max_attempts) < 1:
+            raise ValueError(f"max_attempts должен быть не меньше 1: {max_attempts}")
+        if float(backoff) < 1:
+            raise ValueError(f"backoff должен быть не меньше 1: {backoff}")
+        self.intervals = [max(60, int(value)) for value in intervals] or [600]
+        self.backoff = float(backoff)
+        self.max_interval = max(self.intervals[-1], int(max_interval))
+        self.max_attempts = int(max_attempts)
+        if quiet_hours and (len(quiet_hours) != 2 or not all(0 <= int(hour) <= 23 for hour in quiet_hours)):
+            raise ValueError(f"Тихие часы - два часа от 0 до 23: {quiet_hours}")
+        self.quiet_hours = tuple(int(hour) for hour in quiet_hours) if quiet_hours else None
+        if self.quiet_hours and self.quiet_hours[0] == self.quiet_hours[1]:
+            self.quiet_hours = None
+        self.timezone = str(timezone)
+        self.tz = get_timezone(timezone)
+
+    @classmethod
+    def from_json(cls, raw: str = None) -> 'ReminderPolicy':
+        """
+        Создает политику из JSON колонки bots.reminder_policy.
+        Отсутствующие поля берутся из DEFAULT_POLICY, при некорректной
+        политике используется DEFAULT_POLICY целиком.
+        """
+        if raw:
+            try:
+                return cls(**validate_policy(json.loads(raw)))
+            except Exception as e:
+                logging.warning(f"⚠️ Некорректная политика напоминаний {raw!r}: {e}")
+        return cls(**DEFAULT_POLICY)
+
+    def is_exhausted(self, attempt: int) -> bool:
+        """Отправлено ли уже максимальное число напоминаний"""
+        return attempt >= self.max_attempts
+
+    def next_delay(self, attempt: int) -> int:
+        """Задержка перед напоминанием после attempt уже отправленных (не больше max_interval)"""
+        if attempt < len(self.intervals):
+            return self.intervals[attempt]
+        # Умножаем по шагам до max_interval: степень большого attempt переполнила бы float
+        delay = self.intervals[-1]
+        for _ in range(attempt - len(self.intervals) + 1):
+            if delay >= self.max_interval or self.backoff == 1:
+                break
+            delay *= self.backoff
+        return int(min(delay, self.max_interval))
+
+    def next_due(self, now: float, attempt: int) -> float:
+        """Unix-время следующего напоминания с учетом тихих часов"""
+        due = now + self.next_delay(attempt)
+        if not self.quiet_hours:
+            return due
+
+        start, end = self.quiet_hours
+        local = datetime.fromtimestamp(due, self.tz)
+        hour = local.hour
+        in_quiet = start <= hour < end if start < end else (hour >= start or hour < end)
+        if not in_quiet:
+            return due
+
+        # Переносим на конец тихих часов, размазывая по QUIET_END_SPREAD секунд
+        quiet_end = local.replace(hour=end, minute=0, second=0, microsecond=0)
+        if quiet_end <= local:
+            quiet_end += timedelta(days=1)
+        return quiet_end.timestamp() + random.uniform(0, QUIET_END_SPREAD)
@@ -0,0 +1,58 @@
+"""
+worker_bot/rendered_messages.py
+Что показано в последнем сообщении с кнопками подписки у пользователя
+"""
+
+import hashlib
+from collections import OrderedDict
+
+# Сколько сообщений помнить на процесс; после перезапуска первая проверка
+# просто редактирует подпись и кнопки целиком
+RENDERED_MESSAGES_LIMIT = 50000
+
+_rendered = OrderedDict()  # {(bot_id, user_id): RenderedMessage}
+
+
+class RenderedMessage:
+    """Подпись (хэш), изображение и набор неподписанных каналов сообщения с кнопками"""
+    __slots__ = ('message_id', 'text_hash', 'not_subscribed', 'image')
+
+    def __init__(self, message_id: int, text_hash: str, not_subscribed: tuple, image: str = None):
+        self.message_id = message_id
+        self.text_hash = text_hash
+        self.not_subscribed = not_subscribed
+        self.image = image  # имя файла показанного изображения (None - текстовое сообщение)
+
+
+def get_text_hash(text: str) -> str:
+    """Хэш подписи или текста сообщения"""
+    return hashlib.sha256((text or "").encode()).hexdigest()
+
+
+def remember_rendered_message(bot_id: int, user_id: int, message_id: int,
+                              text: str, not_subscribed_channels: list, image: str = None):
+    """
+    Запоминает, что показано в отправленном или отредактированном сообщении
+
+    Args:
+        image: Имя файла изображения в сообщении (имена файлов - хэши содержимого)
+    """
+    key = (bot_id, user_id)
+    _rendered[key] = RenderedMessage(message_id, get_text_hash(text), tuple(not_subscribed_channels), image)
+    _rendered.move_to_end(key)
+    if len(_rendered) > RENDERED_MESSAGES_LIMIT:
+        _rendered.popitem(last=False)
+
+
+def get_rendered_message(bot_id: int, user_id: int, message_id: int):
+    """Последнее известное состояние сообщения или None, если оно неизвестно"""
+    rendered = _rendered.get((bot_id, user_id))
+    if rendered is None or rendered.message_id != message_id:
+        return None
+    return rendered
+
+
+def forget_rendered_messages(bot_id: int):
+    """Выгружает состояния сообщений бота из памяти (при остановке бота)"""
+    for key in [key for key in _rendered if key[0] == bot_id]:
+        del _rendered[key]
@@ -1,24 +1,38 @@
 """
 worker_bot/router.py
-Создание и настройка роутера для рабочих ботов
+Общий диспетчер и роутер для всех рабочих ботов
 """
 
-from aiogram import Router
-from .handlers import setup_handlers
+from aiogram import Dispatcher
+from .handlers import router as worker_router
+from .middlewares import BotContextMiddleware, ThrottlingMiddleware, ActivityMiddleware, BotConfigMiddleware
 
-def create_worker_router(bot_id: int):
+# Один диспетчер на все рабочие боты: добавление бота не создает новых обработчиков
+_worker_dispatcher = None
+
+def get_worker_dispatcher() -> Dispatcher:
     """
-    Создает роутер для рабочего бота с привязанными каналами
+    Возвращает общий диспетчер рабочих ботов (создается при первом обращении)
     
-    Args:
-        bot_id: ID бота для которого создается роутер
-        
     Returns:
-        Router: Настроенный роутер с обработчиками
+        Dispatcher: Диспетчер с подключенным роутером и middleware
     """
-    router = Router()
+    global _worker_dispatcher
     
-    # Настраиваем все обработчики для этого роутера
-    setup_handlers(router, bot_id)
+    if _worker_dispatcher is None:
+        dp = Dispatcher()
+        
+        # Порядок важен: сначала определяем bot_id, затем отсекаем флуд
+        # (до любых запросов к БД и Telegram), затем отмечаем активность
+        dp.update.outer_middleware(BotContextMiddleware())
+        dp.update.outer_middleware(ThrottlingMiddleware())
+        dp.update.outer_middleware(ActivityMiddleware())
+        
+        # Настройки бота грузим только для апдейтов, которые дошли до обработчика
+        worker_router.message.middleware(BotConfigMiddleware())
+        worker_router.callback_query.middleware(BotConfigMiddleware())
+        
+        dp.include_router(worker_router)
+        _worker_dispatcher = dp
     
-    return router
+    return _worker_dispatcher
@@ -0,0 +1,112 @@
+"""
+worker_bot/send_budget.py
+Бюджет исходящих сообщений на токен бота с приоритетом ответов пользователям
+"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from aiogram.methods import (
+    SendMessage, SendPhoto, SendVideo, SendDocument, SendAnimation, SendAudio, SendVoice,
+    SendVideoNote, SendSticker, SendMediaGroup, CopyMessage, ForwardMessage,
+    EditMessageText, EditMessageCaption, EditMessageMedia, EditMessageReplyMarkup, DeleteMessage
+)
+from config import WORKER_SEND_RATE, WORKER_SEND_RESERVE
+
+# Методы, расходующие бюджет: все, что пишет в чат пользователя
+BUDGETED_METHODS = (
+    SendMessage, SendPhoto, SendVideo, SendDocument, SendAnimation, SendAudio, SendVoice,
+    SendVideoNote, SendSticker, SendMediaGroup, CopyMessage, ForwardMessage,
+    EditMessageText, EditMessageCaption, EditMessageMedia, EditMessageReplyMarkup, DeleteMessage
+)
+
+# Отправки фоновых рассылок (напоминаний) идут с низким приоритетом
+_background = ContextVar('send_background', default=False)
+
+_budgets = {}  # {telegram_bot_id: SendBudget}
+
+
+class SendBudget:
+    """
+    Token bucket исходящих сообщений одного бота.
+    Фоновые отправки не трогают последние WORKER_SEND_RESERVE токенов и ждут,
+    пока есть ожидающие ответы пользователям.
+    """
+    __slots__ = ('rate', 'capacity', 'reserve', 'tokens', 'updated', 'paused_until', 'interactive_waiting')
+
+    def __init__(self, rate: float, reserve: int):
+        self.rate = rate
+        # Пачка - секунда отправок, но не меньше одного сообщения (иначе при rate < 1
+        # токенов никогда не хватит на отправку)
+        self.capacity = max(rate, 1)
+        self.reserve = min(reserve, max(0, int(rate) - 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0  # до этого времени Telegram просил не отправлять (RetryAfter)
+        self.interactive_waiting = 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, background: bool = False):
+        """Ждет, пока бюджет позволит отправить сообщение"""
+        if not background:
+            self.interactive_waiting += 1
+        try:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self._refill(now)
+                need = 1 + self.reserve if background else 1
+                if self.tokens >= need and not (background and self.interactive_waiting):
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((need - self.tokens if self.tokens < need else 1) / self.rate)
+        finally:
+            if not background:
+                self.interactive_waiting -= 1
+
+    def pause(self, seconds: float):
+        """Останавливает отправки бота после RetryAfter от Telegram"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+        self.updated = self.paused_until
+
+
+def get_send_budget(telegram_bot_id: int):
+    """
+    Бюджет отправок бота
+
+    Returns:
+        SendBudget или None, если ограничение отключено
+    """
+    if WORKER_SEND_RATE <= 0:
+        return None
+    budget = _budgets.get(telegram_bot_id)
+    if budget is None:
+        budget = _budgets[telegram_bot_id] = SendBudget(WORKER_SEND_RATE, WORKER_SEND_RESERVE)
+    return budget
+
+
+def drop_send_budget(telegram_bot_id: int):
+    """Удаляет бюджет остановленного бота"""
+    _budgets.pop(telegram_bot_id, None)
+
+
+def is_background_send() -> bool:
+    return _background.get()
+
+
+@contextmanager
+def background_sends():
+    """Отправки внутри блока идут с фоновым (низким) приоритетом"""
+    token = _background.set(True)
+    try:
+        yield
+    finally:
+        _background.reset(token)
@@ -0,0 +1,72 @@
+"""
+worker_bot/token_validation.py
+Фоновая перепроверка токенов рабочих ботов
+"""
+
+import asyncio
+import logging
+from aiogram import Bot
+from aiogram.exceptions import TelegramUnauthorizedError
+from config import TOKEN_REVALIDATE_HOURS
+from database import get_bots_for_token_validation, update_bot_identity, deactivate_bot
+from .http_session import get_shared_session
+
+# Задача низкоприоритетная: стартует после запуска ботов и делает паузы между проверками
+VALIDATION_START_DELAY = 300
+VALIDATION_PAUSE = 1.0
+
+_validation_task = None
+
+
+async def revalidate_bot_token(bot_id: int, bot_token: str) -> bool:
+    """
+    Проверяет токен через getMe: обновляет данные бота в БД или выключает бота,
+    если токен отозван
+
+    Returns:
+        bool: False, если токен отозван
+    """
+    bot = Bot(token=bot_token, session=get_shared_session())
+    try:
+        bot_info = await bot.get_me()
+    except TelegramUnauthorizedError:
+        logging.error(f"❌ Токен бота {bot_id} отозван, бот выключен")
+        await deactivate_bot(bot_id)
+        from .bot_manager import stop_worker_bot
+        await stop_worker_bot(bot_id)
+        return False
+
+    await update_bot_identity(bot_id, bot_info.id, bot_info.username, bot_info.first_name)
+    return True
+
+
+async def _validation_loop():
+    """Раз в час проверяет токены, которые не проверялись дольше TOKEN_REVALIDATE_HOURS"""
+    await asyncio.sleep(VALIDATION_START_DELAY)
+
+    while True:
+        try:
+            bots = await get_bots_for_token_validation(TOKEN_REVALIDATE_HOURS)
+            for bot_id, bot_token, bot_username in bots:
+                try:
+                    await revalidate_bot_token(bot_id, bot_token)
+                except Exception as e:
+                    # Сетевая ошибка: проверим на следующем проходе
+                    logging.warning(f"⚠️ Не удалось проверить токен бота @{bot_username} (ID: {bot_id}): {e}")
+                await asyncio.sleep(VALIDATION_PAUSE)
+
+            if bots:
+                logging.info(f"🔐 Перепроверено токенов ботов: {len(bots)}")
+        except Exception as e:
+            logging.error(f"❌ Ошибка фоновой проверки токенов: {e}")
+
+        await asyncio.sleep(3600)
+
+
+def start_token_validation():
+    """Запускает фоновую перепроверку токенов (если она включена)"""
+    global _validation_task
+    if TOKEN_REVALIDATE_HOURS <= 0:
+        return
+    if _validation_task is None or _validation_task.done():
+        _validation_task = asyncio.create_task(_validation_loop())